@@ -0,0 +1,112 @@
+# app/circuit_breaker.py
+import time
+import threading
+from typing import Dict, Optional
+
+CLOSED = "fechado"
+OPEN = "aberto"
+HALF_OPEN = "meio_aberto"
+
+
+class CircuitOpenError(Exception):
+    """Chamada recusada sem ir à rede: o circuito está aberto"""
+
+
+class CircuitBreaker:
+    """
+    Disjuntor para uma dependência externa (Gemini)
+    - fechado: chamadas liberadas; falhas consecutivas acima do limite abrem o circuito
+    - aberto: chamadas recusadas até passar reset_timeout
+    - meio_aberto: libera poucas chamadas de teste; sucesso fecha, falha reabre
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._half_open_calls = 0
+        self.total_opens = 0
+        self.rejected = 0
+        self.degraded_responses = 0
+
+    def _refresh(self, now: float):
+        """Aberto há mais de reset_timeout passa a meio aberto (chamado com o lock)"""
+        if self._state == OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._half_open_calls = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh(time.monotonic())
+            return self._state
+
+    def available(self) -> bool:
+        """Indica se uma chamada seria liberada agora (sem reservar a vaga de teste)"""
+        with self._lock:
+            self._refresh(time.monotonic())
+            if self._state == HALF_OPEN:
+                return self._half_open_calls < self.half_open_max_calls
+            return self._state == CLOSED
+
+    def acquire(self):
+        """Reserva a chamada; levanta CircuitOpenError se ela não for permitida"""
+        with self._lock:
+            self._refresh(time.monotonic())
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return
+            self.rejected += 1
+        raise CircuitOpenError("Circuito do Gemini aberto")
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._consecutive_failures = 0
+            self._half_open_calls = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.total_opens += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._half_open_calls = 0
+
+    def release(self):
+        """Devolve a vaga de teste de uma chamada que não chegou a um resultado conclusivo"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_degraded(self):
+        """Conta uma resposta servida só com NLP + templates enquanto o circuito estava aberto"""
+        with self._lock:
+            self.degraded_responses += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            reopens_in = None
+            if self._state == OPEN:
+                reopens_in = round(max(0.0, self.reset_timeout - (now - self._opened_at)), 1)
+            return {
+                "estado": self._state,
+                "falhas_consecutivas": self._consecutive_failures,
+                "limite_falhas": self.failure_threshold,
+                "tempo_reabertura": self.reset_timeout,
+                "teste_em": reopens_in,
+                "aberturas": self.total_opens,
+                "chamadas_recusadas": self.rejected,
+                "respostas_degradadas": self.degraded_responses
+            }
@@ -0,0 +1,99 @@
+# app/cli.py
+"""
+Linha de comando do classificador
+
+Uso:
+    python -m app.cli classify caminho/caixa.mbox > resultados.ndjson
+    python -m app.cli classify caminho/diretorio_eml --concurrency 32 --output resultados.ndjson
+    python -m app.cli nltk-download    # no build: dados do NLTK em disco, sem rede em produção
+    python -m app.cli train-local-model rotulos.ndjson --output models/local_model.npz
+"""
+import sys
+import json
+import asyncio
+import argparse
+from dotenv import load_dotenv
+from .gemini_classifier import GeminiEmailClassifier, STREAM_MAX_PENDING
+from .mailbox_reader import iter_mailbox
+from .nlp_preprocessor import NLTK_DATA_DIR, EmailNLPPreprocessor, download_nltk_data
+from .local_model import DEFAULT_DIM, LOCAL_MODEL_PATH, load_labeled_examples, train_local_model
+
+
+async def _classify_mailbox(path: str, concurrency: int, output) -> int:
+    """Classifica a exportação em streaming, escrevendo uma linha NDJSON por mensagem"""
+    classifier = GeminiEmailClassifier()
+    count = 0
+    async for result in classifier.classify_stream_async(iter_mailbox(path), max_pending=concurrency):
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        output.flush()
+        count += 1
+    return count
+
+
+def _cmd_classify(args) -> int:
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        # Os logs estruturados vão para stderr, sem misturar com o NDJSON
+        count = asyncio.run(_classify_mailbox(args.path, args.concurrency, output))
+    finally:
+        if args.output:
+            output.close()
+    print(f"✅ {count} mensagens classificadas", file=sys.stderr)
+    return 0
+
+
+def _cmd_nltk_download(args) -> int:
+    ok = download_nltk_data(args.dir)
+    print(f"{'✅' if ok else '❌'} Dados do NLTK em {args.dir}", file=sys.stderr)
+    return 0 if ok else 1
+
+
+def _cmd_train_local_model(args) -> int:
+    examples = load_labeled_examples(args.data, min_confidence=args.min_confidence)
+    print(f"📚 {len(examples)} exemplos rotulados", file=sys.stderr)
+    try:
+        model = train_local_model(examples, EmailNLPPreprocessor().clean_text, dim=2 ** args.bits,
+                                  epochs=args.epochs, l2=args.l2, target_accuracy=args.target_accuracy)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    model.save(args.output)
+    print(json.dumps(model.info(), ensure_ascii=False, indent=2), file=sys.stderr)
+    print(f"✅ Modelo versão {model.version} em {args.output}", file=sys.stderr)
+    return 0
+
+
+def main(argv=None) -> int:
+    load_dotenv()
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Email Classifier - linha de comando")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    classify = subparsers.add_parser("classify", help="Classifica uma exportação (mbox ou diretório de .eml/.txt) em NDJSON")
+    classify.add_argument("path", help="Arquivo mbox, arquivo .eml/.txt ou diretório")
+    classify.add_argument("--concurrency", type=int, default=STREAM_MAX_PENDING,
+                          help=f"Mensagens em processamento simultâneo (padrão: {STREAM_MAX_PENDING})")
+    classify.add_argument("--output", "-o", help="Arquivo de saída (padrão: stdout)")
+    classify.set_defaults(func=_cmd_classify)
+
+    nltk_download = subparsers.add_parser("nltk-download", help="Baixa os dados do NLTK para o diretório local (build)")
+    nltk_download.add_argument("--dir", default=NLTK_DATA_DIR, help=f"Diretório de destino (padrão: {NLTK_DATA_DIR})")
+    nltk_download.set_defaults(func=_cmd_nltk_download)
+
+    train = subparsers.add_parser("train-local-model",
+                                  help="Treina o modelo local com os rótulos gravados (LOCAL_MODEL_LABEL_LOG) e exporta")
+    train.add_argument("data", nargs="+", help="Arquivos NDJSON com {\"texto\", \"categoria\", \"confianca\"}")
+    train.add_argument("--output", "-o", default=LOCAL_MODEL_PATH, help=f"Arquivo do modelo (padrão: {LOCAL_MODEL_PATH})")
+    train.add_argument("--min-confidence", type=float, default=0.8, help="Ignora rótulos com confiança menor")
+    train.add_argument("--target-accuracy", type=float, default=0.97,
+                       help="Precisão mínima na validação para calibrar o limite de confiança")
+    train.add_argument("--bits", type=int, default=DEFAULT_DIM.bit_length() - 1, help="Dimensão = 2^bits")
+    train.add_argument("--epochs", type=int, default=300)
+    train.add_argument("--l2", type=float, default=1e-4)
+    train.set_defaults(func=_cmd_train_local_model)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,78 @@
 # app/gemini_classifier.py
 import os
-import google.generativeai as genai
-from typing import Dict
-import json
+import asyncio
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+import copy
+import functools
 import time
-from .nlp_preprocessor import EmailNLPPreprocessor
+import random
+import threading
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .gemini_transport import (
+    GEMINI_POOL_SIZE, GeminiConnectionPool, PooledAsyncClient, PooledClient, sdk_supports_pool
+)
+from .shared_state import get_shared_store
+from .rate_limiter import GeminiRateLimiter, LANE_BULK, current_lane
+from .nlp_preprocessor import EmailNLPPreprocessor, nltk_resources
+from .local_model import LOCAL_MODEL_LABEL_LOG, LOCAL_MODEL_PATH, LOCAL_MODEL_THRESHOLD, LabelLog, load_local_model
+from .result_cache import ResultCache, create_result_cache
+from .reply_cache import contains_digits, create_reply_cache
+from .prompt_budget import apply_prompt_budget, estimate_tokens
+from .prompt_templates import (BATCH, CLASSIFICATION, COMBINED, OUTPUT_SCHEMAS, PROMPT_VERSION, REPAIR_TEMPLATE, REPLY,
+                               RenderedPrompt, get_prompt_set)
+from .structured_output import (
+    PARSE_FAILED, generation_config, parse_json_output, required_fields, valid_classification
+)
+from .metrics import metrics
+from .structured_logging import get_logger, redact_text
+
+logger = get_logger(__name__)
+
+# Limite de chamadas Gemini simultâneas (caminho assíncrono) por worker
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "32"))
+
+# Prazo de cada tentativa de chamada ao Gemini (segundos) e retentativas para erros transitórios
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "20"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+GEMINI_RETRY_BASE_DELAY = float(os.getenv("GEMINI_RETRY_BASE_DELAY", "0.5"))
+GEMINI_RETRY_MAX_DELAY = float(os.getenv("GEMINI_RETRY_MAX_DELAY", "8"))
+# Disjuntor: falhas consecutivas para abrir e segundos aberto antes da chamada de teste
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_RESET = float(os.getenv("GEMINI_BREAKER_RESET", "30"))
+
+# Cotas do projeto Gemini (0 desativa): requisições e tokens estimados por minuto
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "1000"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+# Tokens de saída estimados por chamada (somados ao prompt na reserva de cota)
+GEMINI_OUTPUT_TOKENS_ESTIMATE = int(os.getenv("GEMINI_OUTPUT_TOKENS_ESTIMATE", "300"))
+
+# Modo combinado: classificação + resposta sugerida em uma única chamada ao Gemini
+GEMINI_COMBINED_MODE = os.getenv("GEMINI_COMBINED_MODE", "false").lower() in ("1", "true", "yes")
+
+# Resposta especulativa: gera a resposta (categoria prevista pelo NLP) junto com a classificação do Gemini
+GEMINI_SPECULATIVE_REPLY = os.getenv("GEMINI_SPECULATIVE_REPLY", "false").lower() in ("1", "true", "yes")
+
+# JSON inválido na resposta: uma nova chamada barata que só converte a saída para o esquema
+GEMINI_JSON_REPAIR = os.getenv("GEMINI_JSON_REPAIR", "true").lower() in ("1", "true", "yes")
+# Caracteres da saída inválida enviados no reparo
+GEMINI_JSON_REPAIR_MAX_CHARS = int(os.getenv("GEMINI_JSON_REPAIR_MAX_CHARS", "8000"))
+
+# Atalho NLP: responde sem Gemini quando as regras têm alta confiança ou a mensagem é trivial
+NLP_SHORT_CIRCUIT = os.getenv("NLP_SHORT_CIRCUIT", "false").lower() in ("1", "true", "yes")
+NLP_SHORT_CIRCUIT_THRESHOLD = float(os.getenv("NLP_SHORT_CIRCUIT_THRESHOLD", "0.85"))
+
+# Orçamento do texto do e-mail enviado em cada prompt (tokens estimados)
+PROMPT_MAX_EMAIL_TOKENS = int(os.getenv("PROMPT_MAX_EMAIL_TOKENS", "1500"))
+PROMPT_STRIP_QUOTES = os.getenv("PROMPT_STRIP_QUOTES", "true").lower() in ("1", "true", "yes")
+
+# Lote: orçamento estimado de tokens de entrada por prompt e máximo de e-mails por prompt
+BATCH_TOKEN_BUDGET = int(os.getenv("BATCH_TOKEN_BUDGET", "6000"))
+BATCH_MAX_ITEMS_PER_PROMPT = int(os.getenv("BATCH_MAX_ITEMS_PER_PROMPT", "20"))
+# Streaming: máximo de mensagens em processamento simultâneo (memória constante)
+STREAM_MAX_PENDING = int(os.getenv("STREAM_MAX_PENDING", "16"))
+BATCH_ITEM_OVERHEAD_TOKENS = 40  # id, dica NLP e entrada correspondente na resposta JSON
+# Caracteres de uma resposta inválida do Gemini mantidos no log (pode citar o e-mail)
+LOG_RESPONSE_CHARS = 200
 
 class GeminiEmailClassifier:
     """
@@ -12,9 +80,49 @@ class GeminiEmailClassifier:
     NLP faz pré-processamento, Gemini faz classificação final
     """
     
-    def __init__(self):
-        self.gemini_model = None
+    def __init__(self, max_concurrency: int = GEMINI_MAX_CONCURRENCY, combined_mode: bool = GEMINI_COMBINED_MODE,
+                 short_circuit: bool = NLP_SHORT_CIRCUIT,
+                 short_circuit_threshold: float = NLP_SHORT_CIRCUIT_THRESHOLD,
+                 speculative_reply: bool = GEMINI_SPECULATIVE_REPLY, json_repair: bool = GEMINI_JSON_REPAIR):
+        self.model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
         self.nlp_preprocessor = EmailNLPPreprocessor()
+        self.combined_mode = combined_mode
+        self.speculative_reply = speculative_reply
+        self.speculative_hits = 0
+        self.speculative_misses = 0
+        self.json_repair = json_repair
+        # Como cada resposta JSON foi lida (direto, tolerante, parcial, reparado, falha)
+        self.json_outcomes: Dict[str, int] = {}
+        self.short_circuit = short_circuit
+        self.short_circuit_threshold = short_circuit_threshold
+        self.short_circuit_count = 0
+        # Modelo local treinado (entre as regras e o Gemini); None = camada desativada
+        with metrics.timer("init_local_model"):
+            self.local_model = load_local_model(LOCAL_MODEL_PATH)
+        self.local_model_threshold = (float(LOCAL_MODEL_THRESHOLD) if LOCAL_MODEL_THRESHOLD
+                                      else self.local_model.threshold if self.local_model else None)
+        self.local_model_count = 0
+        self.label_log = LabelLog(LOCAL_MODEL_LABEL_LOG) if LOCAL_MODEL_LABEL_LOG else None
+        # Templates versionados; a parte fixa de cada um vira instrução de sistema do modelo
+        self.prompts = get_prompt_set(PROMPT_VERSION)
+        self.prompt_version = self.prompts[CLASSIFICATION].version
+        self.prompt_max_email_tokens = PROMPT_MAX_EMAIL_TOKENS
+        self.prompt_strip_quotes = PROMPT_STRIP_QUOTES
+        self._fit_prompt_text = functools.lru_cache(maxsize=256)(self._fit_prompt_text_uncached)
+        self.batch_token_budget = BATCH_TOKEN_BUDGET
+        self.batch_max_items = max(1, BATCH_MAX_ITEMS_PER_PROMPT)
+        self.result_cache = create_result_cache()
+        self.reply_cache = create_reply_cache()
+        self.max_concurrency = max(1, max_concurrency)
+        # Semáforo limita as chamadas assíncronas em voo (criado sem loop associado)
+        self._gemini_semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._in_flight = 0
+        self.timeout = GEMINI_TIMEOUT
+        self.max_retries = max(0, GEMINI_MAX_RETRIES)
+        self.circuit_breaker = CircuitBreaker(GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_RESET)
+        # Multi-worker: baldes no SQLite compartilhado (a cota não se multiplica por worker)
+        self.rate_limiter = GeminiRateLimiter(GEMINI_RPM, GEMINI_TPM, store=get_shared_store())
+        metrics.register_gauge("fila_gemini", "faixa", lambda: dict(self.rate_limiter.depth))
         self._setup_gemini()
         
         # Templates de fallback (caso Gemini falhe)
@@ -24,27 +132,115 @@ class GeminiEmailClassifier:
         }
 
     def _setup_gemini(self):
-        """Configura API do Gemini"""
+        """
+        Valida a configuração do Gemini. O SDK (google.generativeai) só é importado e
+        configurado no primeiro uso de gemini_model, fora do caminho de importação
+        """
         api_key = os.getenv("GEMINI_API_KEY")
-        model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
         
         if not api_key:
-            print("❌ GEMINI_API_KEY não encontrada")
+            logger.error("GEMINI_API_KEY não encontrada")
             raise Exception("Gemini API é obrigatório. Configure GEMINI_API_KEY no arquivo .env")
             
         if api_key == "sua_chave_do_gemini_aqui":
-            print("❌ GEMINI_API_KEY não foi configurada corretamente")
+            logger.error("GEMINI_API_KEY não foi configurada corretamente")
             raise Exception("Configure sua chave real do Gemini no arquivo .env")
         
+        self._api_key = api_key
+        self.connection_pool: Optional[GeminiConnectionPool] = None
+        self._gemini_model = None
+        self._template_models: Dict[str, object] = {}
+        self._gemini_failed = False
+        self._gemini_lock = threading.Lock()
+
+    @property
+    def gemini_model(self):
+        """Modelo Gemini criado sob demanda, uma única vez (None se a configuração falhar)"""
+        if self._gemini_model is None and not self._gemini_failed:
+            with self._gemini_lock:
+                if self._gemini_model is None and not self._gemini_failed:
+                    self._gemini_model = self._create_gemini_model()
+        return self._gemini_model
+
+    def _create_gemini_model(self):
+        try:
+            with metrics.timer("init_gemini_sdk"):
+                import google.generativeai as genai
+                
+                genai.configure(api_key=self._api_key)
+                model = genai.GenerativeModel(self.model_name)
+                self._attach_connection_pool(model)
+                # Um modelo por template: a parte fixa é registrada uma vez como instrução de sistema
+                # e, com response_schema, a saída fica restrita ao JSON do esquema
+                for template in [*self.prompts.values(), REPAIR_TEMPLATE]:
+                    if template.system or template.response_schema:
+                        template_model = genai.GenerativeModel(
+                            self.model_name, system_instruction=template.system,
+                            generation_config=(generation_config(template.response_schema)
+                                               if template.response_schema else None))
+                        self._use_connection_pool(template_model)
+                        self._template_models[template.key] = template_model
+            logger.info("Gemini classificador configurado", modelo=self.model_name, versao_prompt=self.prompt_version)
+            return model
+        except Exception as e:
+            logger.error("Erro ao configurar Gemini", erro=str(e))
+            self._gemini_failed = True
+            return None
+
+    def _attach_connection_pool(self, model):
+        """
+        Troca os clientes padrão do SDK (criados por chamada ao primeiro uso) pelo pool de
+        canais persistentes com keepalive. Em caso de erro mantém o cliente padrão
+        """
+        if GEMINI_POOL_SIZE <= 0:
+            return
+        if not sdk_supports_pool(model):
+            logger.warning("Versão do google-generativeai não verificada para o pool; usando cliente padrão")
+            return
         try:
-            genai.configure(api_key=api_key)
-            self.gemini_model = genai.GenerativeModel(model_name)
-            print(f"✅ Gemini classificador configurado (modelo: {model_name})")
-            print("✅ NLP preprocessor ativado (nltk + regras)")
+            pool = GeminiConnectionPool(self._api_key)
+            pool._sync_slots()
         except Exception as e:
-            print(f"❌ Erro ao configurar Gemini: {e}")
-            self.gemini_model = None
-            raise Exception("Gemini API é obrigatório para este classificador. Verifique GEMINI_API_KEY.")
+            logger.warning("Pool de conexões do Gemini indisponível; usando cliente padrão", erro=str(e))
+            return
+        self.connection_pool = pool
+        self._use_connection_pool(model)
+
+    def _use_connection_pool(self, model):
+        if self.connection_pool:
+            model._client = PooledClient(self.connection_pool)
+            model._async_client = PooledAsyncClient(self.connection_pool)
+
+    def _model_for(self, prompt: RenderedPrompt):
+        """Modelo com a instrução de sistema do template (sem parte fixa: o modelo base)"""
+        model = self.gemini_model
+        return self._template_models.get(prompt.template.key, model) if model is not None else None
+
+    def prewarm(self):
+        """Inicializa NLTK, SDK do Gemini e caches de regex/análise antes do primeiro pedido"""
+        with metrics.timer("init_prewarm"):
+            self.nlp_preprocessor.warm_up()
+            self._retryable_errors()
+            ready = self.gemini_model is not None
+            if self.connection_pool:
+                self.connection_pool.connect()
+            return ready
+
+    async def prewarm_async(self):
+        """Abre as conexões assíncronas no event loop do servidor (depois de prewarm)"""
+        if self.gemini_model is not None and self.connection_pool:
+            await self.connection_pool.connect_async()
+
+    def close(self):
+        """Fecha as conexões persistentes com o Gemini"""
+        if self.connection_pool:
+            self.connection_pool.close()
+
+    async def close_async(self):
+        """Fecha também as conexões assíncronas (chamado no event loop do servidor)"""
+        if self.connection_pool:
+            await self.connection_pool.close_async()
+        self.close()
 
     def classify(self, text: str) -> Dict:
         """
@@ -53,24 +249,126 @@ class GeminiEmailClassifier:
         Retorna informações completas de ambos os métodos
         """
         if not text or not text.strip():
-            return {
-                "categoria": "Improdutivo",
-                "confianca": 0.5,
-                "justificativa": "Texto vazio",
-                "metodo_usado": "default"
-            }
+            return self._empty_classification()
         
         if not self.gemini_model:
             raise Exception("Gemini não está configurado. Verifique GEMINI_API_KEY.")
         
         # ETAPA 1: Classificação NLP completa
+        nlp_result, features = self._run_nlp(text)
+        
+        # Atalhos: regras NLP ou modelo local com alta confiança dispensam o Gemini
+        shortcut = (self._short_circuit_decision(text, nlp_result) or self._local_model_decision(text, nlp_result)
+                    or self._degraded_decision(text, nlp_result))
+        if shortcut is not None:
+            return shortcut
+        
+        # ETAPA 2: Classificação Gemini com contexto NLP
+        try:
+            gemini_result = self._classify_with_gemini(text, nlp_result, features)
+        except CircuitOpenError:
+            return self._degraded_decision(text, nlp_result, force=True)
+        
+        # ETAPA 3: Comparar e decidir qual usar
+        decision_result = self._compare_and_decide(nlp_result, gemini_result, text)
+        
+        return decision_result
+
+    async def classify_async(self, text: str) -> Dict:
+        """
+        Versão assíncrona de classify: a chamada ao Gemini não bloqueia o event loop
+        """
+        if not text or not text.strip():
+            return self._empty_classification()
+        
+        if not self.gemini_model:
+            raise Exception("Gemini não está configurado. Verifique GEMINI_API_KEY.")
+        
+        nlp_result, features = self._run_nlp(text)
+        shortcut = (self._short_circuit_decision(text, nlp_result) or self._local_model_decision(text, nlp_result)
+                    or self._degraded_decision(text, nlp_result))
+        if shortcut is not None:
+            return shortcut
+        
+        try:
+            gemini_result = await self._classify_with_gemini_async(text, nlp_result, features)
+        except CircuitOpenError:
+            return self._degraded_decision(text, nlp_result, force=True)
+        return self._compare_and_decide(nlp_result, gemini_result, text)
+
+    def _empty_classification(self) -> Dict:
+        """Resultado padrão para texto vazio"""
+        return {
+            "categoria": "Improdutivo",
+            "confianca": 0.5,
+            "justificativa": "Texto vazio",
+            "metodo_usado": "default"
+        }
+
+    def _short_circuit_decision(self, text: str, nlp_result: Dict) -> Optional[Dict]:
+        """
+        Decide se o atalho NLP pode ser usado (confiança acima do limite ou mensagem trivial)
+        Retorna a decisão final (sem consultar o Gemini) ou None
+        """
+        if not self.short_circuit or nlp_result['nlp_classification'] not in ("Produtivo", "Improdutivo"):
+            return None
+        
+        if self.nlp_preprocessor.is_trivial_message(text):
+            nlp_result = dict(nlp_result)
+            nlp_result['nlp_classification'] = "Improdutivo"
+            nlp_result['nlp_confidence'] = max(nlp_result['nlp_confidence'], 0.95)
+            nlp_result['nlp_reasoning'] = "NLP identificou mensagem trivial de cortesia"
+            motivo = "mensagem_trivial"
+        elif nlp_result['nlp_confidence'] >= self.short_circuit_threshold:
+            motivo = "confianca_nlp"
+        else:
+            return None
+        
+        self.short_circuit_count += 1
+        return self._compare_and_decide(nlp_result, None, text, atalho=motivo)
+
+    def _local_model_decision(self, text: str, nlp_result: Dict) -> Optional[Dict]:
+        """
+        Consulta o modelo local (etapa "modelo_local"); decide sem o Gemini quando a confiança
+        atinge o limite. Emails ambíguos (abaixo do limite) seguem para o Gemini
+        """
+        if self.local_model is None:
+            return None
+        with metrics.timer("modelo_local"):
+            categoria, confianca = self.local_model.predict(self.nlp_preprocessor.analyze(text).cleaned)
+        if confianca < self.local_model_threshold:
+            metrics.inc("modelo_local_total", {"resultado": "ambiguo"})
+            return None
+        metrics.inc("modelo_local_total", {"resultado": "decidido"})
+        self.local_model_count += 1
+        local_result = {
+            "classificacao": categoria,
+            "confianca": round(confianca, 3),
+            "raciocinio": f"Modelo local (versão {self.local_model.version}) classificou como {categoria}",
+            "versao": self.local_model.version,
+            "limite": self.local_model_threshold
+        }
+        return self._compare_and_decide(nlp_result, None, text, atalho="modelo_local", local_result=local_result)
+
+    def _degraded_decision(self, text: str, nlp_result: Dict, force: bool = False) -> Optional[Dict]:
+        """
+        Com o circuito do Gemini aberto, a decisão fica com o NLP imediatamente
+        (sem esperar prazos de uma API indisponível). Retorna None se o Gemini está liberado
+        force: a chamada já foi recusada pelo disjuntor (ex.: vaga de teste do meio aberto ocupada)
+        """
+        if not force and self.circuit_breaker.available():
+            return None
+        self.circuit_breaker.record_degraded()
+        return self._compare_and_decide(nlp_result, None, text, atalho="circuito_aberto")
+
+    def _run_nlp(self, text: str) -> Tuple[Dict, Dict]:
+        """Executa o pré-processamento NLP, com fallback caso falhe"""
         try:
             nlp_analysis = self.nlp_preprocessor.preprocess_for_gemini(text)
             nlp_result = nlp_analysis['nlp_classification']
             features = nlp_analysis['features']
-            cleaned_text = nlp_analysis['cleaned_text']
         except Exception as e:
-            print(f"⚠️ Erro no NLP preprocessor: {e}")
+            logger.warning("Erro no NLP preprocessor", erro=str(e))
             # Fallback sem NLP
             nlp_result = {
                 'nlp_classification': "Incerto", 
@@ -78,126 +376,399 @@ class GeminiEmailClassifier:
                 'nlp_reasoning': "Erro no processamento NLP"
             }
             features = {"word_count": len(text.split())}
-            cleaned_text = text
+        return nlp_result, features
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def _retryable_errors() -> Tuple[tuple, tuple]:
+        """
+        (erros transitórios que valem nova tentativa, erros de cota 429)
+        As exceções do google.api_core são importadas só quando necessárias
+        """
+        from google.api_core import exceptions as google_exceptions
         
-        # ETAPA 2: Classificação Gemini com contexto NLP
-        gemini_result = self._classify_with_gemini(text, nlp_result, features)
+        quota = (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted)
+        retryable = quota + (
+            asyncio.TimeoutError,
+            TimeoutError,
+            ConnectionError,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.InternalServerError,
+            google_exceptions.DeadlineExceeded,
+        )
+        return retryable, quota
+
+    def _retry_delay(self, attempt: int) -> float:
+        """Backoff exponencial com jitter completo (evita retentativas sincronizadas)"""
+        return random.uniform(0, min(GEMINI_RETRY_MAX_DELAY, GEMINI_RETRY_BASE_DELAY * (2 ** attempt)))
+
+    def _should_retry(self, error: Exception, attempt: int, stage: str) -> bool:
+        """Registra a falha no disjuntor e decide se há nova tentativa"""
+        metrics.inc("gemini_erros_total", {"etapa": stage})
+        retryable, quota = self._retryable_errors()
+        if not isinstance(error, retryable):
+            # Erro da requisição (ex.: prompt inválido): não indica indisponibilidade do serviço
+            self.circuit_breaker.release()
+            return False
+        self.circuit_breaker.record_failure()
+        if isinstance(error, quota):
+            self.rate_limiter.throttle()
+        if attempt >= self.max_retries or not self.circuit_breaker.available():
+            return False
+        metrics.inc("gemini_retentativas_total", {"etapa": stage})
+        logger.warning("Erro transitório no Gemini, nova tentativa", etapa=stage, tentativa=attempt + 1,
+                       erro=str(error), tipo=type(error).__name__)
+        return True
+
+    def _estimate_call_tokens(self, prompt: str) -> int:
+        """Tokens reservados na cota por chamada: prompt estimado + saída esperada"""
+        return estimate_tokens(prompt) + GEMINI_OUTPUT_TOKENS_ESTIMATE
+
+    @staticmethod
+    def _usage_tokens(response) -> Optional[int]:
+        """Total de tokens informado pela API (None se a resposta não trouxer usage_metadata)"""
+        usage = getattr(response, "usage_metadata", None)
+        return getattr(usage, "total_token_count", None) or None
+
+    def _acquire_circuit(self, stage: str):
+        try:
+            self.circuit_breaker.acquire()
+        except CircuitOpenError:
+            metrics.inc("gemini_recusadas_total", {"etapa": stage})
+            raise
+
+    async def _acquire_call_async(self, stage: str, estimated: int):
+        """
+        Reserva o circuito e só então espera pela cota (RPM/TPM) na fila da faixa corrente:
+        chamadas recusadas pelo circuito aberto não gastam cota
+        """
+        self._acquire_circuit(stage)
+        try:
+            metrics.observe("rate_limit_wait", await self.rate_limiter.acquire(estimated))
+        except BaseException:
+            # Cancelada (ou limitador falhou) na espera: devolve a vaga de teste do meio aberto
+            self.circuit_breaker.release()
+            raise
+
+    def _generate_content(self, prompt: RenderedPrompt, stage: str, config: Optional[Dict] = None):
+        """
+        Chamada síncrona ao Gemini, medida como etapa (gemini_classify, gemini_respond...)
+        Cada tentativa tem prazo próprio; erros transitórios são repetidos com backoff
+        config: generation_config desta chamada (além do configurado no modelo)
+        """
+        options = {"generation_config": config} if config else {}
+        attempt = 0
+        estimated = self._estimate_call_tokens(prompt.full_text)
+        while True:
+            self._acquire_circuit(stage)
+            metrics.observe("rate_limit_wait", self.rate_limiter.acquire_blocking(estimated))
+            metrics.inc("gemini_chamadas_total", {"etapa": stage})
+            try:
+                with metrics.timer(stage):
+                    response = self._model_for(prompt).generate_content(
+                        prompt.text, request_options={"timeout": self.timeout}, **options)
+            except Exception as e:
+                if not self._should_retry(e, attempt, stage):
+                    raise
+                time.sleep(self._retry_delay(attempt))
+                attempt += 1
+                continue
+            self.circuit_breaker.record_success()
+            self.rate_limiter.settle(estimated, self._usage_tokens(response))
+            return response
+
+    async def _generate_content_async(self, prompt: RenderedPrompt, stage: str, config: Optional[Dict] = None):
+        """
+        Chamada assíncrona ao Gemini, limitada pelo semáforo de concorrência
+        O prazo é garantido também no event loop (wait_for); a espera entre tentativas libera o semáforo
+        """
+        options = {"generation_config": config} if config else {}
+        attempt = 0
+        estimated = self._estimate_call_tokens(prompt.full_text)
+        while True:
+            # Circuito e cota antes do semáforo
+            await self._acquire_call_async(stage, estimated)
+            metrics.inc("gemini_chamadas_total", {"etapa": stage})
+            try:
+                async with self._gemini_semaphore:
+                    self._in_flight += 1
+                    try:
+                        with metrics.timer(stage):
+                            response = await asyncio.wait_for(
+                                self._model_for(prompt).generate_content_async(
+                                    prompt.text, request_options={"timeout": self.timeout}, **options),
+                                self.timeout
+                            )
+                    finally:
+                        self._in_flight -= 1
+            except asyncio.CancelledError:
+                self.circuit_breaker.release()
+                raise
+            except Exception as e:
+                if not self._should_retry(e, attempt, stage):
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt))
+                attempt += 1
+                continue
+            self.circuit_breaker.record_success()
+            await self.rate_limiter.settle_async(estimated, self._usage_tokens(response))
+            return response
+
+    def _build_classification_prompt(self, text: str, nlp_result: Dict, features: Dict,
+                                     kind: str = CLASSIFICATION) -> RenderedPrompt:
+        """Monta o prompt de classificação com contexto NLP (kind=COMBINED pede também a resposta)"""
+        return self.prompts[kind].render(
+            text=self._prompt_text(text),
+            nlp_classification=nlp_result['nlp_classification'],
+            nlp_confidence=f"{nlp_result['nlp_confidence']:.2f}",
+            nlp_reasoning=nlp_result['nlp_reasoning'],
+            word_count=features.get('word_count', 0),
+            has_urgent=features.get('has_urgent_indicators', False),
+            has_questions=features.get('has_question_marks', False)
+        )
+
+    def _fit_prompt_text_uncached(self, text: str) -> Tuple[str, Dict]:
+        """Remove citações/assinatura e aplica o orçamento de tokens ao texto do e-mail"""
+        return apply_prompt_budget(
+            text,
+            self.prompt_max_email_tokens,
+            self.nlp_preprocessor.has_keyword,
+            strip_quotes=self.prompt_strip_quotes
+        )
+
+    def _prompt_text(self, text: str) -> str:
+        """Texto do e-mail que vai para o prompt (memoizado por texto)"""
+        return self._fit_prompt_text(text)[0]
+
+    def _extract_json(self, response_text: str, kind: str, stage: str):
+        """
+        Decodifica o JSON (objeto ou array) de uma resposta do Gemini (None se não for utilizável)
+        Registra como a resposta foi lida em gemini_json_total{etapa,resultado}
+        """
+        with metrics.timer("parse"):
+            value, outcome = self._parse_output(response_text, kind)
+        if not self._json_usable(value, kind):
+            value, outcome = None, PARSE_FAILED
+            logger.warning("Resposta Gemini inválida", etapa=stage,
+                           resposta=redact_text(response_text, LOG_RESPONSE_CHARS))
+        self._count_json(stage, outcome)
+        return value
+
+    @staticmethod
+    def _parse_output(response_text: str, kind: str):
+        """parse_json_output com o formato e os campos obrigatórios do esquema do template"""
+        return parse_json_output(response_text, '[' if kind == BATCH else '{',
+                                 required_fields(OUTPUT_SCHEMAS[kind]))
+
+    @staticmethod
+    def _json_usable(value, kind: str) -> bool:
+        """Objeto com categoria válida (e resposta, no combinado) ou array de lote com alguma entrada"""
+        if kind == BATCH:
+            return isinstance(value, list) and any(isinstance(entry, dict) for entry in value)
+        return valid_classification(value, with_reply=kind == COMBINED)
+
+    def _count_json(self, stage: str, outcome: str):
+        metrics.inc("gemini_json_total", {"etapa": stage, "resultado": outcome})
+        self.json_outcomes[outcome] = self.json_outcomes.get(outcome, 0) + 1
+
+    def _repair_request(self, response_text: str, prompt: RenderedPrompt) -> Optional[Tuple[RenderedPrompt, Dict]]:
+        """Prompt de reparo (só a saída inválida) e o esquema do prompt original; None se não houver o que reparar"""
+        if not self.json_repair or not response_text.strip():
+            return None
+        schema = prompt.template.response_schema or OUTPUT_SCHEMAS[prompt.template.kind]
+        return REPAIR_TEMPLATE.render(saida=response_text[:GEMINI_JSON_REPAIR_MAX_CHARS]), generation_config(schema)
+
+    def _repair_outcome(self, repaired_text: Optional[str], prompt: RenderedPrompt, stage: str,
+                        error: Optional[Exception] = None):
+        """Lê a saída do reparo e registra o resultado em gemini_json_reparo_total{etapa,resultado}"""
+        value = None
+        if repaired_text is not None:
+            kind = prompt.template.kind
+            value, _ = self._parse_output(repaired_text, kind)
+            value = value if self._json_usable(value, kind) else None
+        outcome = "reparado" if value is not None else "reparo_falhou"
+        metrics.inc("gemini_json_reparo_total", {"etapa": stage, "resultado": outcome})
+        self.json_outcomes[outcome] = self.json_outcomes.get(outcome, 0) + 1
+        if value is None:
+            logger.warning("Reparo do JSON do Gemini falhou", etapa=stage, erro=str(error) if error else None)
+        return value
+
+    def _read_json(self, response_text: str, prompt: RenderedPrompt, stage: str):
+        """JSON utilizável da resposta; se não houver, uma única chamada de reparo (None se também falhar)"""
+        value = self._extract_json(response_text, prompt.template.kind, stage)
+        repair = self._repair_request(response_text, prompt) if value is None else None
+        if repair is None:
+            return value
+        try:
+            response = self._generate_content(repair[0], "gemini_reparo", repair[1])
+            return self._repair_outcome(response.text, prompt, stage)
+        except Exception as e:
+            return self._repair_outcome(None, prompt, stage, e)
+
+    async def _read_json_async(self, response_text: str, prompt: RenderedPrompt, stage: str):
+        """Versão assíncrona de _read_json"""
+        value = self._extract_json(response_text, prompt.template.kind, stage)
+        repair = self._repair_request(response_text, prompt) if value is None else None
+        if repair is None:
+            return value
+        try:
+            response = await self._generate_content_async(repair[0], "gemini_reparo", repair[1])
+            return self._repair_outcome(response.text, prompt, stage)
+        except Exception as e:
+            return self._repair_outcome(None, prompt, stage, e)
+
+    def _normalize_classification(self, result: Dict, processing_time: float) -> Dict:
+        """Valida categoria/confiança vindas do Gemini"""
+        categoria = result.get("categoria", "Improdutivo")
+        confianca = float(result.get("confianca", 0.5))
+        justificativa = result.get("justificativa", "Análise do Gemini")
         
-        # ETAPA 3: Comparar e decidir qual usar
-        decision_result = self._compare_and_decide(nlp_result, gemini_result, text)
+        # Validar categoria
+        if categoria not in ["Produtivo", "Improdutivo"]:
+            categoria = "Improdutivo"
         
-        return decision_result
+        # Validar confiança (0-1)
+        confianca = max(0.0, min(1.0, confianca))
+        
+        return {
+            "gemini_classification": categoria,
+            "gemini_confidence": confianca,
+            "gemini_reasoning": justificativa,
+            "processing_time": round(processing_time, 3)
+        }
+
+    def _parse_classification_response(self, result: Optional[Dict], processing_time: float) -> Dict:
+        """
+        Classificação a partir do JSON lido da resposta do Gemini
+        Sem JSON utilizável, confiança zero: a decisão fica com o NLP em vez de um rótulo inventado
+        """
+        if result is not None:
+            return self._normalize_classification(result, processing_time)
+        return {
+            "gemini_classification": "Improdutivo",
+            "gemini_confidence": 0.0,
+            "gemini_reasoning": "Resposta do Gemini fora do formato JSON",
+            "processing_time": round(processing_time, 3),
+            "gemini_error": True
+        }
+
+    def _parse_combined_entry(self, result: Dict, processing_time: float) -> Tuple[Dict, str]:
+        """Valida um objeto {categoria, confianca, justificativa, resposta_sugerida}"""
+        if not isinstance(result, dict):
+            raise ValueError("Entrada ausente na resposta combinada")
+        if result.get("categoria") not in ("Produtivo", "Improdutivo"):
+            raise ValueError(f"Categoria inválida na resposta combinada: {result.get('categoria')!r}")
+        resposta = str(result.get("resposta_sugerida") or "").strip()
+        if not resposta:
+            raise ValueError("Resposta sugerida ausente na resposta combinada")
+        return self._normalize_classification(result, processing_time), resposta
+
+    def _gemini_error_result(self, error: Exception) -> Dict:
+        """Resultado de classificação quando a chamada ao Gemini falha"""
+        logger.error("Erro no Gemini", erro=str(error), tipo=type(error).__name__)
+        return {
+            "gemini_classification": "Improdutivo",
+            "gemini_confidence": 0.3,
+            "gemini_reasoning": f"Erro técnico: {str(error)}",
+            "processing_time": 0.0,
+            "gemini_error": True
+        }
     
     def _classify_with_gemini(self, text: str, nlp_result: Dict, features: Dict) -> Dict:
         """Classificação Gemini com contexto NLP"""
-        prompt = f"""
-        Você é um especialista em classificação de e-mails corporativos brasileiros. 
-        Analise o e-mail abaixo e classifique-o como "Produtivo" ou "Improdutivo".
-
-        INFORMAÇÕES COMPLEMENTARES (análise NLP prévia):
-        • Classificação NLP: {nlp_result['nlp_classification']} (confiança: {nlp_result['nlp_confidence']:.2f})
-        • Raciocínio NLP: {nlp_result['nlp_reasoning']}
-        • Palavras: {features.get('word_count', 0)}
-        • Indicadores urgentes: {features.get('has_urgent_indicators', False)}
-        • Contém perguntas: {features.get('has_question_marks', False)}
-        
-        IMPORTANTE: Analise independentemente. Sua decisão pode concordar ou discordar completamente do NLP.
-
-        DEFINIÇÕES PRECISAS:
-        
-        📧 PRODUTIVO (requer ação/resposta):
-        • Solicitações de informação, relatórios, documentos
-        • Problemas técnicos que precisam ser resolvidos
-        • Pedidos de reunião, aprovação, autorização
-        • Perguntas que necessitam resposta
-        • Confirmações de recebimento necessárias
-        • Cobranças, prazos, urgências
-        • Solicitações de suporte ou ajuda
-
-        💬 IMPRODUTIVO (cortesia/social):
-        • Agradecimentos simples sem solicitação
-        • Cumprimentos (aniversário, festas, feriados)
-        • Elogios e parabéns
-        • Saudações e votos de bem-estar
-        • Felicitações sem pedido de resposta
-        • Mensagens de motivação
-
-        E-MAIL PARA ANÁLISE:
-        "{text}"
-
-        INSTRUÇÕES:
-        - Analise o contexto e intenção principal
-        - Se há PERGUNTA ou SOLICITAÇÃO = Produtivo
-        - Se é apenas CORTESIA/AGRADECIMENTO = Improdutivo
-        - Seja preciso na confiança: alta (0.9-1.0) para casos claros, média (0.7-0.8) para ambíguos
-
-        Responda EXATAMENTE neste formato JSON (sem formatação markdown):
-        {{"categoria": "Produtivo", "confianca": 0.95, "justificativa": "breve explicação do motivo"}}
-        """
+        prompt = self._build_classification_prompt(text, nlp_result, features)
         
         try:
             start_time = time.time()
-            response = self.gemini_model.generate_content(prompt)
+            response = self._generate_content(prompt, "gemini_classify")
+            result = self._read_json(response.text, prompt, "gemini_classify")
             end_time = time.time()
-            
-            # Extrair JSON da resposta
-            response_text = response.text.strip()
-            
-            # Remover possíveis marcadores de código
-            if response_text.startswith('```'):
-                lines = response_text.split('\n')
-                response_text = '\n'.join(lines[1:-1])
-            
-            # Encontrar JSON na resposta
-            start_idx = response_text.find('{')
-            end_idx = response_text.rfind('}') + 1
-            
-            if start_idx >= 0 and end_idx > start_idx:
-                json_str = response_text[start_idx:end_idx]
-                result = json.loads(json_str)
-                
-                categoria = result.get("categoria", "Improdutivo")
-                confianca = float(result.get("confianca", 0.5))
-                justificativa = result.get("justificativa", "Análise do Gemini")
-                
-                # Validar categoria
-                if categoria not in ["Produtivo", "Improdutivo"]:
-                    categoria = "Improdutivo"
-                
-                # Validar confiança (0-1)
-                confianca = max(0.0, min(1.0, confianca))
-                
-                return {
-                    "gemini_classification": categoria,
-                    "gemini_confidence": confianca,
-                    "gemini_reasoning": justificativa,
-                    "processing_time": round(end_time - start_time, 3)
-                }
-            else:
-                print(f"⚠️ Resposta Gemini inválida: {response_text}")
-                return {
-                    "gemini_classification": "Improdutivo",
-                    "gemini_confidence": 0.5,
-                    "gemini_reasoning": "Erro no processamento da resposta",
-                    "processing_time": 0.0
-                }
-                
+            return self._parse_classification_response(result, end_time - start_time)
+        except CircuitOpenError:
+            # Recusada sem ir à rede: quem chamou decide só com o NLP
+            raise
         except Exception as e:
-            print(f"❌ Erro no Gemini: {e}")
-            return {
-                "gemini_classification": "Improdutivo",
-                "gemini_confidence": 0.3,
-                "gemini_reasoning": f"Erro técnico: {str(e)}",
-                "processing_time": 0.0
-            }
+            return self._gemini_error_result(e)
+
+    async def _classify_with_gemini_async(self, text: str, nlp_result: Dict, features: Dict) -> Dict:
+        """Classificação Gemini assíncrona com contexto NLP"""
+        prompt = self._build_classification_prompt(text, nlp_result, features)
+        
+        try:
+            start_time = time.time()
+            response = await self._generate_content_async(prompt, "gemini_classify")
+            result = await self._read_json_async(response.text, prompt, "gemini_classify")
+            end_time = time.time()
+            return self._parse_classification_response(result, end_time - start_time)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            return self._gemini_error_result(e)
     
-    def _compare_and_decide(self, nlp_result: Dict, gemini_result: Dict, original_text: str) -> Dict:
+    def _compare_and_decide(self, nlp_result: Dict, gemini_result: Optional[Dict], original_text: str,
+                            atalho: Optional[str] = None, local_result: Optional[Dict] = None) -> Dict:
+        """Decide entre NLP e Gemini (etapa "decide"), contabilizando método e caminho escolhidos"""
+        with metrics.timer("decide"):
+            decision = self._decide(nlp_result, gemini_result, original_text, atalho, local_result)
+        metrics.inc("decisoes_total", {
+            "metodo": decision["metodo_usado"],
+            "caminho": decision["analise_comparativa"]["concordancia"]["caminho"]
+        })
+        return decision
+
+    def _decide(self, nlp_result: Dict, gemini_result: Optional[Dict], original_text: str,
+                atalho: Optional[str] = None, local_result: Optional[Dict] = None) -> Dict:
         """
         Compara NLP vs Gemini e decide qual usar baseado na confiança
         Retorna resultado completo com informações de ambos
+        Sem gemini_result (atalho), registra a decisão direta das regras ou do modelo local
         """
         nlp_class = nlp_result['nlp_classification']
         nlp_conf = nlp_result['nlp_confidence']
+        
+        if gemini_result is None:
+            if local_result is not None:
+                chosen_method, caminho = "modelo_local", "modelo_local"
+                final_class = local_result['classificacao']
+                final_conf = local_result['confianca']
+                final_reasoning = local_result['raciocinio']
+                status = f"⚡ MODELO LOCAL (v{local_result['versao']})"
+            else:
+                chosen_method, caminho = "nlp", "atalho_nlp"
+                final_class, final_conf, final_reasoning = nlp_class, nlp_conf, nlp_result['nlp_reasoning']
+                status = f"⚡ ATALHO NLP ({atalho})"
+            logger.info("Decisão NLP x Gemini", nlp_categoria=nlp_class, nlp_confianca=round(nlp_conf, 3),
+                        gemini_categoria=None, status=status, metodo=chosen_method, categoria=final_class,
+                        caminho=caminho, atalho=atalho)
+            analise = {
+                "nlp_resultado": {
+                    "classificacao": nlp_class,
+                    "confianca": nlp_conf,
+                    "raciocinio": nlp_result['nlp_reasoning'],
+                    "features": nlp_result.get('features_detected', {})
+                },
+                "gemini_resultado": None,
+                "concordancia": {
+                    "concordam": local_result is None or final_class == nlp_class,
+                    "status": status,
+                    "metodo_escolhido": chosen_method,
+                    "criterio_decisao": atalho,
+                    "caminho": caminho
+                }
+            }
+            if local_result is not None:
+                analise["modelo_local_resultado"] = local_result
+            return {
+                "categoria": final_class,
+                "confianca": final_conf,
+                "justificativa": final_reasoning,
+                "metodo_usado": chosen_method,
+                "tempo_processamento": 0.0,
+                "falha_gemini": False,
+                "atalho_nlp": atalho,
+                "analise_comparativa": analise
+            }
+        
         gemini_class = gemini_result['gemini_classification']
         gemini_conf = gemini_result['gemini_confidence']
         
@@ -241,8 +812,10 @@ class GeminiEmailClassifier:
                 status = f"⚠️ DIVERGEM - Gemini prevalece (padrão)"
         
         # Log detalhado
-        print(f"🧠 NLP: {nlp_class} ({nlp_conf:.3f}) | 🤖 Gemini: {gemini_class} ({gemini_conf:.3f})")
-        print(f"📊 {status} | ✅ Escolhido: {chosen_method.upper()} - {final_class}")
+        logger.info("Decisão NLP x Gemini", nlp_categoria=nlp_class, nlp_confianca=round(nlp_conf, 3),
+                    gemini_categoria=gemini_class, gemini_confianca=round(gemini_conf, 3), status=status,
+                    metodo=chosen_method, categoria=final_class, caminho="gemini",
+                    falha_gemini=bool(gemini_result.get('gemini_error')))
         
         return {
             "categoria": final_class,
@@ -250,6 +823,7 @@ class GeminiEmailClassifier:
             "justificativa": final_reasoning,
             "metodo_usado": chosen_method,
             "tempo_processamento": gemini_result.get('processing_time', 0.0),
+            "falha_gemini": gemini_result.get('gemini_error', False),
             "analise_comparativa": {
                 "nlp_resultado": {
                     "classificacao": nlp_class,
@@ -266,39 +840,237 @@ class GeminiEmailClassifier:
                     "concordam": concordam,
                     "status": status,
                     "metodo_escolhido": chosen_method,
-                    "criterio_decisao": "maior_confiança" if concordam else "gemini_prevalence_or_confidence"
+                    "criterio_decisao": "maior_confiança" if concordam else "gemini_prevalence_or_confidence",
+                    "caminho": "gemini"
                 }
             }
         }
 
+    def _build_response_prompt(self, text: str, categoria: str) -> RenderedPrompt:
+        """Monta o prompt de geração de resposta"""
+        return self.prompts[REPLY].render(text=self._prompt_text(text), categoria=categoria)
+
     def generate_response(self, text: str, categoria: str) -> str:
         """Gera resposta personalizada usando Gemini"""
+        return self._generate_reply(text, categoria) or self.fallback_templates.get(categoria, "Obrigado pelo contato.")
+
+    async def generate_response_async(self, text: str, categoria: str) -> str:
+        """Versão assíncrona de generate_response"""
+        return (await self._generate_reply_async(text, categoria)
+                or self.fallback_templates.get(categoria, "Obrigado pelo contato."))
+
+    def _generate_reply(self, text: str, categoria: str) -> Optional[str]:
+        """Resposta escrita pelo Gemini, ou None se ele não estiver disponível ou falhar"""
         if not self.gemini_model:
-            return self.fallback_templates.get(categoria, "Obrigado pelo contato.")
+            return None
         
         try:
-            prompt = f"""
-            Gere uma resposta profissional em português brasileiro para este e-mail classificado como "{categoria}".
-            
-            E-mail original: "{text}"
-            
-            DIRETRIZES:
-            - Se PRODUTIVO: Confirme recebimento e indique próximos passos
-            - Se IMPRODUTIVO: Agradeça cordialmente sem prometer ações
-            - Máximo 2-3 frases
-            - Tom profissional e amigável
-            - Use português brasileiro
-            - NÃO explique a classificação
-            
-            Resposta:
-            """
+            prompt = self._build_response_prompt(text, categoria)
+            response = self._generate_content(prompt, "gemini_respond")
+            return response.text.strip()
             
-            response = self.gemini_model.generate_content(prompt)
+        except Exception as e:
+            logger.warning("Erro ao gerar resposta", erro=str(e))
+            return None
+
+    async def _generate_reply_async(self, text: str, categoria: str) -> Optional[str]:
+        """Versão assíncrona de _generate_reply"""
+        if not self.gemini_model:
+            return None
+        
+        try:
+            prompt = self._build_response_prompt(text, categoria)
+            response = await self._generate_content_async(prompt, "gemini_respond")
             return response.text.strip()
             
         except Exception as e:
-            print(f"⚠️ Erro ao gerar resposta: {e}")
-            return self.fallback_templates.get(categoria, "Obrigado pelo contato.")
+            logger.warning("Erro ao gerar resposta", erro=str(e))
+            return None
+
+    def _reuse_reply(self, text: str, categoria: str) -> Tuple[Optional[str], Dict]:
+        """
+        Procura um email quase igual já respondido na mesma categoria (etapa "cache_respostas")
+        Retorna (resposta guardada ou None, informações de reuso para os detalhes)
+        """
+        if self.reply_cache is None or contains_digits(text):
+            # Email com números (protocolo, data, valor) sempre recebe resposta própria
+            return None, {"usada": False, "similaridade": None}
+        with metrics.timer("cache_respostas"):
+            words = self.nlp_preprocessor.analyze(text).meaningful_words
+            resposta, similaridade = self.reply_cache.lookup(words, categoria)
+        metrics.inc("cache_respostas_total", {"resultado": "miss" if resposta is None else "hit"})
+        if resposta is None:
+            return None, {"usada": False, "similaridade": similaridade}
+        return resposta, {"usada": True, "similaridade": similaridade, "origem": "cache_semantico"}
+
+    def _reply(self, text: str, categoria: str) -> Tuple[str, Dict]:
+        """Resposta reaproveitada de um email parecido ou, se não houver, gerada pelo Gemini"""
+        resposta, reuso = self._reuse_reply(text, categoria)
+        if resposta is not None:
+            return resposta, reuso
+        resposta = self._generate_reply(text, categoria)
+        if resposta is None:
+            return self.fallback_templates.get(categoria, "Obrigado pelo contato."), {**reuso, "origem": "template"}
+        return resposta, {**reuso, "origem": "gemini"}
+
+    async def _reply_async(self, text: str, categoria: str) -> Tuple[str, Dict]:
+        """Versão assíncrona de _reply"""
+        resposta, reuso = self._reuse_reply(text, categoria)
+        if resposta is not None:
+            return resposta, reuso
+        resposta = await self._generate_reply_async(text, categoria)
+        if resposta is None:
+            return self.fallback_templates.get(categoria, "Obrigado pelo contato."), {**reuso, "origem": "template"}
+        return resposta, {**reuso, "origem": "gemini"}
+
+    def _offline_reply(self, text: str, categoria: str) -> Tuple[str, Dict]:
+        """Resposta sem chamar o Gemini (atalhos): reaproveitada se houver, senão o template"""
+        resposta, reuso = self._reuse_reply(text, categoria)
+        if resposta is not None:
+            return resposta, reuso
+        return self.fallback_templates.get(categoria, "Obrigado pelo contato."), {**reuso, "origem": "template"}
+
+    async def _stream_reply_async(self, text: str, categoria: str) -> AsyncIterator[str]:
+        """
+        Resposta do Gemini em trechos, à medida que são gerados (modo stream do SDK)
+        Falhas antes do primeiro trecho são repetidas como nas demais chamadas; depois dele, propagadas
+        """
+        stage = "gemini_respond"
+        prompt = self._build_response_prompt(text, categoria)
+        attempt = 0
+        estimated = self._estimate_call_tokens(prompt.full_text)
+        while True:
+            await self._acquire_call_async(stage, estimated)
+            metrics.inc("gemini_chamadas_total", {"etapa": stage})
+            started = False
+            usage = None
+            try:
+                async with self._gemini_semaphore:
+                    self._in_flight += 1
+                    try:
+                        with metrics.timer(stage):
+                            start_time = time.perf_counter()
+                            response = await asyncio.wait_for(
+                                self._model_for(prompt).generate_content_async(
+                                    prompt.text, stream=True, request_options={"timeout": self.timeout}),
+                                self.timeout
+                            )
+                            chunks = response.__aiter__()
+                            while True:
+                                try:
+                                    chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                                except StopAsyncIteration:
+                                    break
+                                usage = self._usage_tokens(chunk) or usage
+                                if not chunk.text:
+                                    continue
+                                if not started:
+                                    started = True
+                                    metrics.observe("gemini_respond_primeiro_trecho", time.perf_counter() - start_time)
+                                yield chunk.text
+                    finally:
+                        self._in_flight -= 1
+            except (asyncio.CancelledError, GeneratorExit):
+                # Cliente desconectou no meio da geração
+                self.circuit_breaker.release()
+                raise
+            except Exception as e:
+                # Com trechos já enviados não há como repetir: só registra a falha
+                if not self._should_retry(e, self.max_retries if started else attempt, stage) or started:
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt))
+                attempt += 1
+                continue
+            self.circuit_breaker.record_success()
+            await self.rate_limiter.settle_async(estimated, usage)
+            return
+
+    async def classify_and_respond_events_async(self, text: str) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        Mesmo fluxo de classify_and_respond_async, entregue em eventos (Server-Sent Events):
+        - "nlp": classificação NLP, logo após o pré-processamento
+        - "classificacao": decisão final (após o Gemini ou um atalho)
+        - "resposta": trecho da resposta sugerida (vários, conforme o Gemini gera)
+        - "resposta_reiniciada": a geração falhou no meio; descartar os trechos recebidos
+        - "resultado": JSON completo, igual ao de /process_email
+        A classificação usa sempre duas chamadas (no modo combinado ela só chegaria junto com a resposta)
+        """
+        if not text or not text.strip():
+            yield "resultado", self._empty_response()
+            return
+        
+        cache_key = self._cache_key(text)
+        cached = await self._cache_lookup_async(cache_key)
+        if cached is not None:
+            yield "classificacao", {
+                "categoria": cached["categoria"],
+                "confianca": cached["confidence"],
+                "metodo_usado": cached["metodo_usado"],
+                "justificativa": cached["detalhes"].get("justificativa", "")
+            }
+            yield "resposta", {"texto": cached["resposta_sugerida"]}
+            yield "resultado", cached
+            return
+        
+        if not self.gemini_model:
+            raise Exception("Gemini não está configurado. Verifique GEMINI_API_KEY.")
+        
+        nlp_result, features = self._run_nlp(text)
+        yield "nlp", {
+            "categoria": nlp_result["nlp_classification"],
+            "confianca": round(nlp_result["nlp_confidence"], 3),
+            "raciocinio": nlp_result.get("nlp_reasoning", "")
+        }
+        
+        resultado = (self._short_circuit_decision(text, nlp_result) or self._local_model_decision(text, nlp_result)
+                     or self._degraded_decision(text, nlp_result))
+        modo = "duas_chamadas"
+        if resultado is not None:
+            modo = "modelo_local" if resultado["metodo_usado"] == "modelo_local" else "atalho_nlp"
+        else:
+            try:
+                gemini_result = await self._classify_with_gemini_async(text, nlp_result, features)
+                resultado = self._compare_and_decide(nlp_result, gemini_result, text)
+            except CircuitOpenError:
+                resultado = self._degraded_decision(text, nlp_result, force=True)
+                modo = "atalho_nlp"
+        categoria = resultado["categoria"]
+        yield "classificacao", {
+            "categoria": categoria,
+            "confianca": round(resultado["confianca"], 3),
+            "metodo_usado": resultado["metodo_usado"],
+            "justificativa": resultado.get("justificativa", "")
+        }
+        
+        if modo != "duas_chamadas":
+            resposta, reuso = self._offline_reply(text, categoria)
+            yield "resposta", {"texto": resposta}
+        else:
+            resposta, reuso = self._reuse_reply(text, categoria)
+            if resposta is not None:
+                yield "resposta", {"texto": resposta}
+            else:
+                pieces = []
+                try:
+                    async for piece in self._stream_reply_async(text, categoria):
+                        pieces.append(piece)
+                        yield "resposta", {"texto": piece}
+                except Exception as e:
+                    logger.warning("Erro ao gerar resposta", erro=str(e))
+                    if pieces:
+                        yield "resposta_reiniciada", {"motivo": str(e)}
+                    pieces = []
+                resposta = "".join(pieces).strip()
+                if resposta:
+                    reuso = {**reuso, "origem": "gemini"}
+                else:
+                    resposta = self.fallback_templates.get(categoria, "Obrigado pelo contato.")
+                    reuso = {**reuso, "origem": "template"}
+                    yield "resposta", {"texto": resposta}
+        
+        result = self._build_response(resultado, resposta, modo=modo, text=text, reuso=reuso)
+        self._learn_from_result(text, result)
+        yield "resultado", await self._cache_store_async(cache_key, result)
 
     def classify_and_respond(self, text: str) -> Dict:
         """
@@ -306,48 +1078,619 @@ class GeminiEmailClassifier:
         Retorna análise completa com comparação NLP vs Gemini
         """
         if not text or not text.strip():
-            return {
-                "categoria": "Improdutivo",
-                "confidence": 0.5,
-                "resposta_sugerida": "Obrigado pelo contato.",
-                "metodo_usado": "default",
-                "detalhes": {
-                    "justificativa": "Texto vazio",
-                    "tempo_processamento": 0.0,
-                    "modelo": "gemini-2.5-flash + nlp",
-                    "versao": "4.0-hybrid-comparative"
-                }
-            }
+            return self._empty_response()
+        
+        cache_key = self._cache_key(text)
+        cached = self._cache_lookup(cache_key)
+        if cached is not None:
+            return cached
+        
+        result = self._classify_and_respond_uncached(text)
+        self._learn_from_result(text, result)
+        return self._cache_store(cache_key, result)
+
+    async def classify_and_respond_async(self, text: str) -> Dict:
+        """
+        Versão assíncrona de classify_and_respond, para uso dentro do event loop
+        """
+        if not text or not text.strip():
+            return self._empty_response()
+        
+        cache_key = self._cache_key(text)
+        cached = await self._cache_lookup_async(cache_key)
+        if cached is not None:
+            return cached
+        
+        result = await self._classify_and_respond_uncached_async(text)
+        self._learn_from_result(text, result)
+        return await self._cache_store_async(cache_key, result)
+
+    def _classify_and_respond_uncached(self, text: str) -> Dict:
+        """Classificação + resposta sem consultar o cache"""
+        shortcut = (self._short_circuit_response(text) or self._local_model_response(text)
+                    or self._degraded_response(text))
+        if shortcut is not None:
+            return shortcut
+        
+        # Modo combinado: uma única chamada (volta para duas chamadas se não for possível interpretar)
+        if self.combined_mode and self.gemini_model:
+            try:
+                combined = self._classify_and_respond_combined(text)
+            except CircuitOpenError:
+                return self._degraded_response(text, force=True)
+            if combined is not None:
+                return combined
         
         # Classificar com ambos métodos
         resultado = self.classify(text)
-        categoria = resultado["categoria"]
-        confianca = resultado["confianca"]
-        metodo_usado = resultado["metodo_usado"]
+        if self._is_degraded(resultado):
+            resposta, reuso = self._offline_reply(text, resultado["categoria"])
+            return self._build_response(resultado, resposta, modo="atalho_nlp", text=text, reuso=reuso)
+        
+        # Gerar resposta (ou reaproveitar a de um email quase igual)
+        resposta, reuso = self._reply(text, resultado["categoria"])
         
-        # Gerar resposta
-        resposta = self.generate_response(text, categoria)
+        return self._build_response(resultado, resposta, text=text, reuso=reuso)
+
+    async def _classify_and_respond_uncached_async(self, text: str) -> Dict:
+        """Versão assíncrona de _classify_and_respond_uncached"""
+        shortcut = (self._short_circuit_response(text) or self._local_model_response(text)
+                    or self._degraded_response(text))
+        if shortcut is not None:
+            return shortcut
+        
+        try:
+            if self.combined_mode and self.gemini_model:
+                combined = await self._classify_and_respond_combined_async(text)
+                if combined is not None:
+                    return combined
+            
+            if self.speculative_reply and self.gemini_model:
+                speculative = await self._classify_and_respond_speculative_async(text)
+                if speculative is not None:
+                    return speculative
+        except CircuitOpenError:
+            return self._degraded_response(text, force=True)
+        
+        resultado = await self.classify_async(text)
+        if self._is_degraded(resultado):
+            resposta, reuso = self._offline_reply(text, resultado["categoria"])
+            return self._build_response(resultado, resposta, modo="atalho_nlp", text=text, reuso=reuso)
+        resposta, reuso = await self._reply_async(text, resultado["categoria"])
+        
+        return self._build_response(resultado, resposta, text=text, reuso=reuso)
+
+    async def _classify_and_respond_speculative_async(self, text: str) -> Optional[Dict]:
+        """
+        Duas chamadas em paralelo: a resposta começa a ser gerada com a categoria prevista pelo
+        NLP enquanto o Gemini classifica. Se a decisão final for outra categoria, a resposta
+        especulativa é descartada e gerada de novo. None quando o NLP não tem palpite
+        """
+        nlp_result, features = self._run_nlp(text)
+        palpite = nlp_result["nlp_classification"]
+        if palpite not in ("Produtivo", "Improdutivo"):
+            metrics.inc("resposta_especulativa_total", {"resultado": "sem_palpite"})
+            return None
+        
+        reply_task = asyncio.create_task(self._reply_async(text, palpite))
+        try:
+            gemini_result = await self._classify_with_gemini_async(text, nlp_result, features)
+            resultado = self._compare_and_decide(nlp_result, gemini_result, text)
+        except BaseException:
+            reply_task.cancel()
+            raise
+        
+        acerto = resultado["categoria"] == palpite
+        if resultado.get("falha_gemini"):
+            # Sem classificação do Gemini a decisão segue o NLP: não conta como acerto nem erro
+            metrics.inc("resposta_especulativa_total", {"resultado": "falha_gemini"})
+        else:
+            metrics.inc("resposta_especulativa_total", {"resultado": "acerto" if acerto else "erro"})
+            if acerto:
+                self.speculative_hits += 1
+            else:
+                self.speculative_misses += 1
+        if acerto:
+            resposta, reuso = await reply_task
+        else:
+            reply_task.cancel()
+            resposta, reuso = await self._reply_async(text, resultado["categoria"])
+        
+        response = self._build_response(resultado, resposta, text=text, reuso=reuso)
+        response["detalhes"]["resposta_especulativa"] = {"palpite": palpite, "aproveitada": acerto}
+        return response
+
+    def _short_circuit_response(self, text: str) -> Optional[Dict]:
+        """Resposta completa pelo atalho NLP (template de fallback, sem rede) ou None"""
+        if not self.short_circuit:
+            return None
+        nlp_result, _ = self._run_nlp(text)
+        resultado = self._short_circuit_decision(text, nlp_result)
+        if resultado is None:
+            return None
+        resposta, reuso = self._offline_reply(text, resultado["categoria"])
+        return self._build_response(resultado, resposta, modo="atalho_nlp", text=text, reuso=reuso)
+
+    def _local_model_response(self, text: str) -> Optional[Dict]:
+        """Resposta completa pelo modelo local (template de fallback, sem rede) ou None"""
+        if self.local_model is None:
+            return None
+        nlp_result, _ = self._run_nlp(text)
+        resultado = self._local_model_decision(text, nlp_result)
+        if resultado is None:
+            return None
+        resposta, reuso = self._offline_reply(text, resultado["categoria"])
+        return self._build_response(resultado, resposta, modo="modelo_local", text=text, reuso=reuso)
+
+    def _learn_from_result(self, text: str, result: Dict):
+        """
+        Com o Gemini consultado com sucesso: grava o exemplo rotulado (modelo local) e
+        indexa a resposta escrita por ele para emails quase iguais
+        """
+        detalhes = result.get("detalhes", {})
+        if detalhes.get("falha_gemini") or detalhes.get("atalho_nlp", {}).get("usado"):
+            return
+        if self.label_log is not None:
+            self.label_log.append(text, result["categoria"], result.get("confidence", 0.0),
+                                  result.get("metodo_usado", "?"))
+        if (self.reply_cache is not None and detalhes.get("reuso_resposta", {}).get("origem") == "gemini"
+                and not contains_digits(text, result["resposta_sugerida"])):
+            words = self.nlp_preprocessor.analyze(text).meaningful_words
+            self.reply_cache.add(words, result["categoria"], result["resposta_sugerida"])
+
+    def _degraded_response(self, text: str, force: bool = False) -> Optional[Dict]:
+        """Resposta completa só com NLP + template enquanto o circuito do Gemini está aberto, ou None"""
+        if not force and self.circuit_breaker.available():
+            return None
+        nlp_result, _ = self._run_nlp(text)
+        resultado = self._degraded_decision(text, nlp_result, force)
+        if resultado is None:
+            return None
+        resposta, reuso = self._offline_reply(text, resultado["categoria"])
+        return self._build_response(resultado, resposta, modo="atalho_nlp", text=text, reuso=reuso)
+
+    @staticmethod
+    def _is_degraded(resultado: Dict) -> bool:
+        """Decisão tomada só com o NLP porque o disjuntor recusou a chamada ao Gemini"""
+        return resultado.get("atalho_nlp") == "circuito_aberto"
+
+    def _prompt_version(self) -> str:
+        """Versão efetiva do prompt (o modo combinado usa outro prompt)"""
+        return f"{self.prompt_version}-{'combinado' if self.combined_mode else 'duas_chamadas'}"
+
+    def _cache_key(self, text: str) -> Optional[str]:
+        """Chave do cache: texto normalizado + modelo + versão do prompt"""
+        if not self.result_cache:
+            return None
+        return self._cache_key_from_normalized(self.nlp_preprocessor.analyze(text).cleaned)
+
+    def _cache_key_from_normalized(self, normalized: str) -> Optional[str]:
+        """Chave do cache para um texto já normalizado por clean_text"""
+        if not self.result_cache:
+            return None
+        return ResultCache.make_key(normalized, self.model_name, self._prompt_version())
+
+    def _cache_lookup(self, cache_key: Optional[str]) -> Optional[Dict]:
+        """Retorna cópia do resultado em cache (marcada como hit) ou None"""
+        if cache_key is None:
+            return None
+        return self._cache_hit(self.result_cache.get(cache_key))
+
+    async def _cache_lookup_async(self, cache_key: Optional[str]) -> Optional[Dict]:
+        """_cache_lookup sem bloquear o event loop (cache SQLite em thread)"""
+        if cache_key is None:
+            return None
+        return self._cache_hit(await self.result_cache.get_async(cache_key))
+
+    def _cache_hit(self, cached: Optional[Dict]) -> Optional[Dict]:
+        if cached is None:
+            return None
+        result = copy.deepcopy(cached)
+        result["detalhes"]["cache"] = {"hit": True}
+        if "atalho_nlp" in result["detalhes"]:
+            result["detalhes"]["atalho_nlp"]["total_atalhos"] = self.short_circuit_count
+        return result
+
+    @staticmethod
+    def _cacheable(cache_key: Optional[str], result: Dict) -> bool:
+        """Só entram no cache respostas do Gemini (não falhas nem atalhos)"""
+        atalho = result["detalhes"].get("atalho_nlp", {}).get("usado", False)
+        return cache_key is not None and not result["detalhes"].get("falha_gemini") and not atalho
+
+    def _cache_store(self, cache_key: Optional[str], result: Dict) -> Dict:
+        """Grava o resultado no cache, exceto quando o Gemini falhou ou não foi consultado"""
+        if self._cacheable(cache_key, result):
+            self.result_cache.set(cache_key, copy.deepcopy(result))
+        if cache_key is not None:
+            result["detalhes"]["cache"] = {"hit": False}
+        return result
+
+    async def _cache_store_async(self, cache_key: Optional[str], result: Dict) -> Dict:
+        """_cache_store sem bloquear o event loop (cache SQLite em thread)"""
+        if self._cacheable(cache_key, result):
+            await self.result_cache.set_async(cache_key, copy.deepcopy(result))
+        if cache_key is not None:
+            result["detalhes"]["cache"] = {"hit": False}
+        return result
+
+    def _classify_and_respond_combined(self, text: str):
+        """
+        Classificação + resposta em uma única chamada ao Gemini
+        Retorna None quando a resposta combinada não pode ser interpretada
+        """
+        nlp_result, features = self._run_nlp(text)
+        prompt = self._build_classification_prompt(text, nlp_result, features, COMBINED)
+        
+        try:
+            start_time = time.time()
+            response = self._generate_content(prompt, "gemini_combined")
+            result = self._read_json(response.text, prompt, "gemini_combined")
+            processing_time = time.time() - start_time
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            gemini_result = self._gemini_error_result(e)
+            resultado = self._compare_and_decide(nlp_result, gemini_result, text)
+            resposta = self.fallback_templates.get(resultado["categoria"], "Obrigado pelo contato.")
+            return self._build_response(resultado, resposta, modo="combinado", text=text,
+                                        reuso={"usada": False, "similaridade": None, "origem": "template"})
+        
+        if result is None:
+            logger.warning("Resposta combinada inválida, usando duas chamadas")
+            return None
+        gemini_result, resposta = self._parse_combined_entry(result, processing_time)
+        
+        resultado = self._compare_and_decide(nlp_result, gemini_result, text)
+        # A resposta sugerida foi escrita para a categoria do Gemini; se a decisão final divergir, gerar outra
+        reuso = {"usada": False, "similaridade": None, "origem": "gemini"}
+        if resultado["categoria"] != gemini_result["gemini_classification"]:
+            resposta, reuso = self._reply(text, resultado["categoria"])
+        return self._build_response(resultado, resposta, modo="combinado", text=text, reuso=reuso)
+
+    async def _classify_and_respond_combined_async(self, text: str):
+        """Versão assíncrona de _classify_and_respond_combined"""
+        nlp_result, features = self._run_nlp(text)
+        prompt = self._build_classification_prompt(text, nlp_result, features, COMBINED)
+        
+        try:
+            start_time = time.time()
+            response = await self._generate_content_async(prompt, "gemini_combined")
+            result = await self._read_json_async(response.text, prompt, "gemini_combined")
+            processing_time = time.time() - start_time
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            gemini_result = self._gemini_error_result(e)
+            resultado = self._compare_and_decide(nlp_result, gemini_result, text)
+            resposta = self.fallback_templates.get(resultado["categoria"], "Obrigado pelo contato.")
+            return self._build_response(resultado, resposta, modo="combinado", text=text,
+                                        reuso={"usada": False, "similaridade": None, "origem": "template"})
+        
+        if result is None:
+            logger.warning("Resposta combinada inválida, usando duas chamadas")
+            return None
+        gemini_result, resposta = self._parse_combined_entry(result, processing_time)
+        
+        resultado = self._compare_and_decide(nlp_result, gemini_result, text)
+        reuso = {"usada": False, "similaridade": None, "origem": "gemini"}
+        if resultado["categoria"] != gemini_result["gemini_classification"]:
+            resposta, reuso = await self._reply_async(text, resultado["categoria"])
+        return self._build_response(resultado, resposta, modo="combinado", text=text, reuso=reuso)
+
+    def _build_batch_prompt(self, items: List[Tuple[int, str, Dict]]) -> RenderedPrompt:
+        """Monta um único prompt com vários e-mails (id, dica NLP e texto)"""
+        emails = "\n\n".join(
+            f'[id={item_id}] (NLP: {nlp_result["nlp_classification"]}, confiança {nlp_result["nlp_confidence"]:.2f})\n'
+            f'"{self._prompt_text(text)}"'
+            for item_id, text, nlp_result in items
+        )
+        return self.prompts[BATCH].render(emails=emails)
+
+    def _pack_batch(self, items: List[Tuple[int, str, Dict]]) -> List[List[Tuple[int, str, Dict]]]:
+        """Agrupa os e-mails em pacotes que respeitam o orçamento de tokens por prompt"""
+        budget = self.batch_token_budget - estimate_tokens(self._build_batch_prompt([]).full_text)
+        chunks, current, current_tokens = [], [], 0
+        for item in items:
+            cost = estimate_tokens(self._prompt_text(item[1])) + BATCH_ITEM_OVERHEAD_TOKENS
+            if current and (current_tokens + cost > budget or len(current) >= self.batch_max_items):
+                chunks.append(current)
+                current, current_tokens = [], 0
+            current.append(item)
+            current_tokens += cost
+        if current:
+            chunks.append(current)
+        return chunks
+
+    async def _classify_batch_chunk_async(self, chunk: List[Tuple[int, str, Dict]]) -> Dict[int, Dict]:
+        """
+        Classifica um pacote de e-mails em uma única chamada ao Gemini
+        Retorna id -> resposta apenas para as entradas válidas (as demais seguem o caminho individual)
+        """
+        prompt = self._build_batch_prompt(chunk)
+        try:
+            start_time = time.time()
+            response = await self._generate_content_async(prompt, "gemini_batch")
+            parsed = await self._read_json_async(response.text, prompt, "gemini_batch")
+            processing_time = time.time() - start_time
+        except Exception as e:
+            logger.warning("Erro no lote Gemini", emails=len(chunk), erro=str(e))
+            return {}
+        
+        if parsed is None:
+            logger.warning("Resposta de lote inválida", emails=len(chunk))
+            return {}
+        
+        entries = {}
+        for entry in parsed:
+            if isinstance(entry, dict):
+                entries[str(entry.get("id"))] = entry
+        
+        results = {}
+        for item_id, text, nlp_result in chunk:
+            try:
+                gemini_result, resposta = self._parse_combined_entry(entries.get(str(item_id)), processing_time)
+            except Exception:
+                continue
+            resultado = self._compare_and_decide(nlp_result, gemini_result, text)
+            reuso = {"usada": False, "similaridade": None, "origem": "gemini"}
+            if resultado["categoria"] != gemini_result["gemini_classification"]:
+                resposta, reuso = await self._reply_async(text, resultado["categoria"])
+            results[item_id] = self._build_response(resultado, resposta, modo="lote", text=text, reuso=reuso)
+        return results
+
+    async def classify_batch_async(self, texts: List[str]) -> Dict:
+        """
+        Classifica vários e-mails de uma vez
+        - remove duplicados (mesmo texto normalizado) dentro do lote
+        - agrupa vários e-mails por prompt até BATCH_TOKEN_BUDGET
+        - devolve os resultados na mesma ordem da entrada
+        As chamadas ao Gemini usam a faixa de lote (cedem a vez às requisições interativas)
+        """
+        lane_token = current_lane.set(LANE_BULK)
+        try:
+            return await self._classify_batch_async(texts)
+        finally:
+            current_lane.reset(lane_token)
+
+    async def _classify_batch_async(self, texts: List[str]) -> Dict:
+        """Implementação de classify_batch_async"""
+        responses: List[Optional[Dict]] = [None] * len(texts)
+        positions: Dict[str, List[int]] = {}
+        unique: List[Tuple[str, str]] = []
+        
+        for pos, text in enumerate(texts):
+            if not text or not text.strip():
+                responses[pos] = self._empty_response()
+                continue
+            normalized = self.nlp_preprocessor.analyze(text).cleaned
+            if normalized not in positions:
+                positions[normalized] = []
+                unique.append((normalized, text))
+            positions[normalized].append(pos)
+        
+        unique_results: Dict[str, Dict] = {}
+        pending: List[Tuple[int, str, Dict]] = []
+        cache_keys: Dict[int, Optional[str]] = {}
+        cache_hits = shortcuts = local_count = degraded_count = 0
+        
+        for item_id, (normalized, text) in enumerate(unique):
+            cache_key = self._cache_key_from_normalized(normalized)
+            cached = await self._cache_lookup_async(cache_key)
+            if cached is not None:
+                unique_results[normalized] = cached
+                cache_hits += 1
+                continue
+            shortcut = self._short_circuit_response(text)
+            if shortcut is not None:
+                unique_results[normalized] = shortcut
+                shortcuts += 1
+                continue
+            local = self._local_model_response(text)
+            if local is not None:
+                unique_results[normalized] = local
+                local_count += 1
+                continue
+            degraded = self._degraded_response(text)
+            if degraded is not None:
+                unique_results[normalized] = degraded
+                degraded_count += 1
+                continue
+            nlp_result, _ = self._run_nlp(text)
+            pending.append((item_id, text, nlp_result))
+            cache_keys[item_id] = cache_key
+        
+        chunks = self._pack_batch(pending) if self.gemini_model else []
+        chunk_results = await asyncio.gather(*(self._classify_batch_chunk_async(chunk) for chunk in chunks))
+        batch_results: Dict[int, Dict] = {}
+        for partial in chunk_results:
+            batch_results.update(partial)
+        
+        # Entradas ausentes/inválidas na resposta do lote seguem o caminho individual
+        missing = [(item_id, text) for item_id, text, _ in pending if item_id not in batch_results]
+        fallback_results = await asyncio.gather(
+            *(self._classify_and_respond_uncached_async(text) for _, text in missing)
+        )
+        for (item_id, _), result in zip(missing, fallback_results):
+            batch_results[item_id] = result
+        
+        for item_id, text, _ in pending:
+            normalized = unique[item_id][0]
+            self._learn_from_result(text, batch_results[item_id])
+            unique_results[normalized] = await self._cache_store_async(cache_keys[item_id], batch_results[item_id])
+        
+        for normalized, pos_list in positions.items():
+            result = unique_results[normalized]
+            for i, pos in enumerate(pos_list):
+                item = result if i == 0 else copy.deepcopy(result)
+                item["detalhes"]["lote"] = {"duplicado": i > 0}
+                responses[pos] = item
         
         return {
-            "categoria": categoria,
-            "confidence": round(confianca, 3),
+            "total": len(texts),
+            "resultados": responses,
+            "estatisticas": {
+                "unicos": len(unique),
+                "duplicados": sum(len(p) - 1 for p in positions.values()),
+                "cache_hits": cache_hits,
+                "atalhos_nlp": shortcuts,
+                "modelo_local": local_count,
+                "degradados": degraded_count,
+                "prompts_gemini": len(chunks),
+                "fallback_individual": len(missing)
+            }
+        }
+
+    async def classify_stream_async(self, messages: Union[Iterable[Dict], AsyncIterable[Dict]],
+                                    max_pending: int = STREAM_MAX_PENDING) -> AsyncIterator[Dict]:
+        """
+        Classifica um fluxo de mensagens {"id", "text"} com concorrência limitada
+        As mensagens são lidas sob demanda e os resultados saem na ordem em que terminam,
+        então a memória usada não depende do tamanho da exportação
+        """
+        if hasattr(messages, "__aiter__"):
+            source = messages.__aiter__()
+        else:
+            source = _aiter_sync(messages)
+        
+        async def run(index: int, message: Dict) -> Dict:
+            # Cada tarefa tem o próprio contexto: a faixa de lote não vaza para quem consome o fluxo
+            current_lane.set(LANE_BULK)
+            try:
+                result = await self.classify_and_respond_async(message.get("text") or "")
+            except Exception as e:
+                return {"indice": index, "id": message.get("id"), "erro": str(e)}
+            return {"indice": index, "id": message.get("id"), **result}
+        
+        pending = set()
+        index = 0
+        exhausted = False
+        max_pending = max(1, max_pending)
+        try:
+            while True:
+                # Completar a janela antes de esperar pelo próximo resultado
+                while not exhausted and len(pending) < max_pending:
+                    try:
+                        message = await source.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    pending.add(asyncio.ensure_future(run(index, message)))
+                    index += 1
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            # Cliente desconectou ou consumidor parou: não deixar tarefas órfãs
+            for task in pending:
+                task.cancel()
+
+    def _empty_response(self) -> Dict:
+        """Resposta padrão para texto vazio"""
+        return {
+            "categoria": "Improdutivo",
+            "confidence": 0.5,
+            "resposta_sugerida": "Obrigado pelo contato.",
+            "metodo_usado": "default",
+            "detalhes": {
+                "justificativa": "Texto vazio",
+                "tempo_processamento": 0.0,
+                "modelo": f"{self.model_name} + nlp",
+                "versao": "4.0-hybrid-comparative"
+            }
+        }
+
+    def _build_response(self, resultado: Dict, resposta: str, modo: str = "duas_chamadas",
+                        text: Optional[str] = None, reuso: Optional[Dict] = None) -> Dict:
+        """Monta o JSON final a partir da classificação e da resposta sugerida"""
+        # Tamanhos original/enviado só fazem sentido quando o Gemini foi consultado
+        orcamento = self._fit_prompt_text(text)[1] if text and modo not in ("atalho_nlp", "modelo_local") else None
+        return {
+            "categoria": resultado["categoria"],
+            "confidence": round(resultado["confianca"], 3),
             "resposta_sugerida": resposta,
-            "metodo_usado": metodo_usado,
+            "metodo_usado": resultado["metodo_usado"],
             "detalhes": {
                 "justificativa": resultado.get("justificativa", ""),
                 "tempo_processamento": resultado.get("tempo_processamento", 0.0),
-                "modelo": "gemini-2.5-flash + nlp-preprocessor",
+                "modelo": f"{self.model_name} + nlp-preprocessor",
                 "versao": "4.0-hybrid-comparative",
+                "modo_gemini": modo,
+                "versao_prompt": self._prompt_version(),
+                "falha_gemini": resultado.get("falha_gemini", False),
+                "orcamento_prompt": orcamento,
+                "atalho_nlp": {
+                    "usado": resultado.get("atalho_nlp") is not None,
+                    "motivo": resultado.get("atalho_nlp"),
+                    "total_atalhos": self.short_circuit_count
+                },
+                "reuso_resposta": reuso or {"usada": False, "similaridade": None},
                 "analise_comparativa": resultado.get("analise_comparativa", {})
             }
         }
 
+    def _json_stats(self) -> Dict:
+        """Leitura das respostas JSON do Gemini: contagens, taxa de falha e de reparo"""
+        counts = dict(self.json_outcomes)
+        read = sum(counts.get(outcome, 0) for outcome in ("direto", "tolerante", "parcial", PARSE_FAILED))
+        failed = counts.get(PARSE_FAILED, 0)
+        return {
+            "reparo_ativo": self.json_repair,
+            **counts,
+            "taxa_falha": round(failed / read, 3) if read else 0.0,
+            "taxa_reparo": round(counts.get("reparado", 0) / failed, 3) if failed else 0.0
+        }
+
     def get_status(self) -> Dict:
         """Retorna status do classificador"""
         return {
-            "status": "ativo" if self.gemini_model else "inativo",
-            "modelo": "gemini-2.5-flash + nlp-preprocessor",
+            "status": "inativo" if self._gemini_failed else "ativo",
+            "inicializacao": {
+                "sdk_gemini_carregado": self._gemini_model is not None,
+                "nltk": nltk_resources.available
+            },
+            "modelo": f"{self.model_name} + nlp-preprocessor",
             "versao": "4.0-hybrid-comparative",
+            "concorrencia": {
+                "limite": self.max_concurrency,
+                "em_andamento": self._in_flight
+            },
+            "circuito": self.circuit_breaker.stats(),
+            "conexoes": self.connection_pool.stats() if self.connection_pool else {"ativo": False},
+            "limite_taxa": self.rate_limiter.stats(),
+            "chamadas": {
+                "prazo": self.timeout,
+                "retentativas": self.max_retries
+            },
+            "modo_gemini": "combinado" if self.combined_mode else "duas_chamadas",
+            "versao_prompt": self._prompt_version(),
+            "orcamento_prompt": {
+                "max_tokens_email": self.prompt_max_email_tokens,
+                "remover_citacoes": self.prompt_strip_quotes
+            },
+            "modelo_local": {
+                "ativo": self.local_model is not None,
+                **(self.local_model.info() if self.local_model else {}),
+                "limite_confianca": self.local_model_threshold,
+                "total_decisoes": self.local_model_count,
+                "registro_rotulos": self.label_log.path if self.label_log else None
+            },
+            "atalho_nlp": {
+                "ativo": self.short_circuit,
+                "limite_confianca": self.short_circuit_threshold,
+                "total_atalhos": self.short_circuit_count
+            },
+            "resposta_especulativa": {
+                "ativo": self.speculative_reply,
+                "acertos": self.speculative_hits,
+                "erros": self.speculative_misses,
+                "taxa_acerto": (round(self.speculative_hits / (self.speculative_hits + self.speculative_misses), 3)
+                                if self.speculative_hits + self.speculative_misses else 0.0)
+            },
+            "saida_json": self._json_stats(),
+            "cache": self.result_cache.stats() if self.result_cache else {"backend": "off"},
+            "cache_respostas": self.reply_cache.stats() if self.reply_cache else {"ativo": False},
             "recursos": [
                 "🧠 Classificação NLP independente",
                 "🤖 Classificação Gemini independente", 
@@ -355,7 +1698,8 @@ class GeminiEmailClassifier:
                 "📊 Análise detalhada de concordância/divergência",
                 "✅ Fallback automático entre métodos",
                 "🎯 Alta precisão combinada (95-100%)",
-                "⚡ Processamento otimizado"
+                "⚡ Processamento otimizado",
+                "🔀 Chamadas assíncronas ao Gemini (não bloqueiam o servidor)"
             ],
             "decision_logic": [
                 "Se concordam: usar método com maior confiança",
@@ -363,4 +1707,9 @@ class GeminiEmailClassifier:
                 "Se divergem + NLP > Gemini confiança: usar NLP",
                 "Caso contrário: usar Gemini (padrão)"
             ]
-        }
\ No newline at end of file
+        }
+
+async def _aiter_sync(items: Iterable) -> AsyncIterator:
+    """Adapta um iterável síncrono para uso com async for"""
+    for item in items:
+        yield item
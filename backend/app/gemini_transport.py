@@ -0,0 +1,324 @@
+# app/gemini_transport.py
+import os
+import time
+import asyncio
+import itertools
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import metrics
+from .structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Pool de conexões gRPC (HTTP/2) com o Gemini, abertas uma vez e reutilizadas entre requisições
+# Número de canais independentes usados em rodízio (0 = cliente padrão do SDK, um canal)
+GEMINI_POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", "2"))
+# Intervalo dos pings de keepalive (segundos; 0 desativa) e prazo para a resposta do ping
+GEMINI_KEEPALIVE_SECONDS = float(os.getenv("GEMINI_KEEPALIVE_SECONDS", "60"))
+GEMINI_KEEPALIVE_TIMEOUT = float(os.getenv("GEMINI_KEEPALIVE_TIMEOUT", "10"))
+# Prazo para estabelecer a conexão (TCP + TLS + HTTP/2) antes de enviar a chamada
+GEMINI_CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "10"))
+# Endpoint alternativo, ex.: stub local "http://localhost:50051" (http:// = sem TLS)
+GEMINI_ENDPOINT = os.getenv("GEMINI_ENDPOINT", "")
+
+DEFAULT_HOST = "generativelanguage.googleapis.com"
+
+# Versões do google-generativeai em que os clientes do GenerativeModel (_client/_async_client)
+# foram verificados; em outras o pool fica desligado e vale o cliente padrão do SDK
+SUPPORTED_SDK_VERSIONS = ("0.8.",)
+
+
+def sdk_supports_pool(model) -> bool:
+    """O pool só substitui os clientes de um GenerativeModel de versão verificada do SDK"""
+    from google.generativeai import __version__
+
+    return (__version__.startswith(SUPPORTED_SDK_VERSIONS)
+            and hasattr(model, "_client") and hasattr(model, "_async_client"))
+
+
+def parse_endpoint(endpoint: str) -> Tuple[str, bool]:
+    """Retorna (host:porta, inseguro) a partir de GEMINI_ENDPOINT"""
+    endpoint = endpoint.strip()
+    if not endpoint:
+        return DEFAULT_HOST, False
+    insecure = endpoint.startswith("http://")
+    host = endpoint.split("://", 1)[-1].rstrip("/")
+    if ":" not in host:
+        host += ":80" if insecure else ":443"
+    return host, insecure
+
+
+class _Slot:
+    """Um canal do pool com o cliente gapic que o usa"""
+    __slots__ = ("channel", "client", "ready")
+
+    def __init__(self):
+        self.channel = None
+        self.client = None
+        self.ready = False
+
+
+class GeminiConnectionPool:
+    """
+    Canais gRPC de longa duração para o GenerativeService, compartilhados por todas as requisições
+    - `size` canais independentes (conexões HTTP/2 próprias), escolhidos em rodízio
+    - pings de keepalive mantêm as conexões ociosas abertas (sem novo handshake TLS)
+    - cada chamada mede separadamente a conexão (gemini_connect, só quando o canal não está
+      pronto) e, com a conexão pronta, a chamada inteira (gemini_rpc) ou, em stream, o tempo
+      até o primeiro trecho (gemini_ttfb)
+    Canais assíncronos (grpc.aio) pertencem a um event loop: se o loop mudar são recriados
+    e os anteriores, fechados
+    """
+
+    def __init__(self, api_key: str, size: int = GEMINI_POOL_SIZE,
+                 keepalive: float = GEMINI_KEEPALIVE_SECONDS,
+                 keepalive_timeout: float = GEMINI_KEEPALIVE_TIMEOUT,
+                 connect_timeout: float = GEMINI_CONNECT_TIMEOUT,
+                 endpoint: str = GEMINI_ENDPOINT):
+        self.size = max(1, size)
+        self.keepalive = keepalive
+        self.keepalive_timeout = keepalive_timeout
+        self.connect_timeout = connect_timeout
+        self.host, self.insecure = parse_endpoint(endpoint)
+        self._api_key = api_key
+        self._lock = threading.Lock()
+        self._sync: List[_Slot] = []
+        self._async: List[_Slot] = []
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._next = itertools.count()
+        self.connects = 0
+        self.connect_failures = 0
+
+    def _channel_options(self) -> List[Tuple[str, int]]:
+        options = [
+            # Subcanal próprio: sem isso canais com os mesmos argumentos dividiriam a conexão
+            ("grpc.use_local_subchannel_pool", 1),
+            # Sem limite de ociosidade do canal (o keepalive cuida da conexão)
+            ("grpc.client_idle_timeout_ms", 2 ** 31 - 1),
+        ]
+        if self.keepalive > 0:
+            options += [
+                ("grpc.keepalive_time_ms", int(self.keepalive * 1000)),
+                ("grpc.keepalive_timeout_ms", int(self.keepalive_timeout * 1000)),
+                ("grpc.keepalive_permit_without_calls", 1),
+                ("grpc.http2.max_pings_without_data", 0),
+            ]
+        return options
+
+    def _client_parts(self):
+        """Credenciais da chave de API e client_info (mesmo user agent do SDK)"""
+        from google.api_core import gapic_v1
+        from google.auth import api_key
+        from google.generativeai import __version__
+        from google.generativeai.client import USER_AGENT
+
+        client_info = gapic_v1.client_info.ClientInfo(user_agent=f"{USER_AGENT}/{__version__}")
+        return api_key.Credentials(self._api_key), client_info
+
+    def _build_slot(self, asynchronous: bool) -> _Slot:
+        import grpc
+        from google.ai import generativelanguage as glm
+        from google.ai.generativelanguage_v1beta.services.generative_service import transports
+
+        slot = _Slot()
+        transport_cls = (transports.GenerativeServiceGrpcAsyncIOTransport if asynchronous
+                         else transports.GenerativeServiceGrpcTransport)
+        insecure_channel = grpc.aio.insecure_channel if asynchronous else grpc.insecure_channel
+
+        def create_channel(host, **kwargs):
+            options = list(kwargs.pop("options", None) or []) + self._channel_options()
+            if self.insecure:
+                slot.channel = insecure_channel(host, options=options)
+            else:
+                slot.channel = transport_cls.create_channel(host, options=options, **kwargs)
+            return slot.channel
+
+        credentials, client_info = self._client_parts()
+        transport = transport_cls(host=self.host, credentials=credentials, channel=create_channel,
+                                  client_info=client_info)
+        client_cls = glm.GenerativeServiceAsyncClient if asynchronous else glm.GenerativeServiceClient
+        slot.client = client_cls(transport=transport, client_info=client_info)
+        if not asynchronous:
+            # Estado do canal acompanhado por callback (sem consultar a cada chamada)
+            slot.channel.subscribe(lambda state: setattr(slot, "ready", state == grpc.ChannelConnectivity.READY))
+        return slot
+
+    def _sync_slots(self) -> List[_Slot]:
+        if not self._sync:
+            with self._lock:
+                if not self._sync:
+                    self._sync = [self._build_slot(asynchronous=False) for _ in range(self.size)]
+        return self._sync
+
+    def _async_slots(self) -> List[_Slot]:
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            old_slots, old_loop = self._async, self._async_loop
+            self._async = [self._build_slot(asynchronous=True) for _ in range(self.size)]
+            self._async_loop = loop
+            self._close_async_slots(old_slots, old_loop)
+        return self._async
+
+    @staticmethod
+    def _close_async_slots(slots: List[_Slot], loop: Optional[asyncio.AbstractEventLoop]):
+        """
+        Fecha canais grpc.aio no event loop a que pertencem, se ele ainda estiver rodando
+        (com o loop encerrado não há onde executar o fechamento)
+        """
+        if not slots or loop is None or loop.is_closed() or not loop.is_running():
+            return
+        for slot in slots:
+            asyncio.run_coroutine_threadsafe(slot.channel.close(), loop)
+
+    def _pick(self, slots: List[_Slot]) -> _Slot:
+        return slots[next(self._next) % len(slots)]
+
+    def _record_connect(self, elapsed: float, ok: bool):
+        metrics.observe("gemini_connect", elapsed)
+        with self._lock:
+            self.connects += 1
+            if not ok:
+                self.connect_failures += 1
+        if not ok:
+            logger.warning("Conexão com o Gemini não ficou pronta no prazo", host=self.host,
+                           prazo=self.connect_timeout)
+
+    def _ensure_ready(self, slot: _Slot):
+        """Abre a conexão do canal se necessário (falha no prazo segue para a chamada, que reporta o erro)"""
+        if slot.ready:
+            return
+        import grpc
+
+        start = time.perf_counter()
+        try:
+            grpc.channel_ready_future(slot.channel).result(timeout=self.connect_timeout)
+            slot.ready = True
+            ok = True
+        except grpc.FutureTimeoutError:
+            ok = False
+        self._record_connect(time.perf_counter() - start, ok)
+
+    async def _ensure_ready_async(self, slot: _Slot):
+        import grpc
+
+        if slot.channel.get_state(try_to_connect=True) == grpc.ChannelConnectivity.READY:
+            return
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(slot.channel.channel_ready(), self.connect_timeout)
+            ok = True
+        except asyncio.TimeoutError:
+            ok = False
+        self._record_connect(time.perf_counter() - start, ok)
+
+    def connect(self):
+        """Abre todas as conexões síncronas em paralelo (prewarm)"""
+        import grpc
+
+        start = time.perf_counter()
+        pending = [(slot, grpc.channel_ready_future(slot.channel)) for slot in self._sync_slots() if not slot.ready]
+        for slot, future in pending:
+            try:
+                future.result(timeout=max(0.0, self.connect_timeout - (time.perf_counter() - start)))
+                slot.ready = True
+                ok = True
+            except grpc.FutureTimeoutError:
+                future.cancel()
+                ok = False
+            self._record_connect(time.perf_counter() - start, ok)
+
+    async def connect_async(self):
+        """Abre as conexões assíncronas no event loop corrente (prewarm)"""
+        await asyncio.gather(*(self._ensure_ready_async(slot) for slot in self._async_slots()))
+
+    def close(self):
+        """Fecha os canais síncronos (os assíncronos: close_async)"""
+        with self._lock:
+            slots, self._sync = self._sync, []
+        for slot in slots:
+            slot.channel.close()
+
+    async def close_async(self):
+        """Fecha os canais assíncronos do event loop corrente (desligamento do servidor)"""
+        slots, loop = self._async, self._async_loop
+        self._async, self._async_loop = [], None
+        if loop is asyncio.get_running_loop():
+            await asyncio.gather(*(slot.channel.close() for slot in slots), return_exceptions=True)
+        else:
+            self._close_async_slots(slots, loop)
+
+    def stats(self) -> Dict:
+        return {
+            "ativo": True,
+            "host": self.host,
+            "tls": not self.insecure,
+            "canais": self.size,
+            "keepalive": self.keepalive,
+            "canais_prontos": sum(1 for slot in self._sync if slot.ready),
+            "conexoes": self.connects,
+            "conexoes_falhas": self.connect_failures
+        }
+
+
+class PooledClient:
+    """Substitui GenerativeModel._client: cada chamada usa o próximo canal do pool"""
+
+    def __init__(self, pool: GeminiConnectionPool):
+        self._pool = pool
+
+    def generate_content(self, request, **kwargs):
+        slot = self._pool._pick(self._pool._sync_slots())
+        self._pool._ensure_ready(slot)
+        # Chamada unária: a resposta chega inteira, mede-se a chamada toda
+        with metrics.timer("gemini_rpc"):
+            return slot.client.generate_content(request, **kwargs)
+
+    def stream_generate_content(self, request, **kwargs):
+        slot = self._pool._pick(self._pool._sync_slots())
+        self._pool._ensure_ready(slot)
+        start = time.perf_counter()
+        stream = slot.client.stream_generate_content(request, **kwargs)
+
+        def chunks():
+            first = True
+            for chunk in stream:
+                if first:
+                    metrics.observe("gemini_ttfb", time.perf_counter() - start)
+                    first = False
+                yield chunk
+        return chunks()
+
+    def __getattr__(self, name):
+        return getattr(self._pool._pick(self._pool._sync_slots()).client, name)
+
+
+class PooledAsyncClient:
+    """Substitui GenerativeModel._async_client (canais do event loop corrente)"""
+
+    def __init__(self, pool: GeminiConnectionPool):
+        self._pool = pool
+
+    async def generate_content(self, request, **kwargs):
+        slot = self._pool._pick(self._pool._async_slots())
+        await self._pool._ensure_ready_async(slot)
+        with metrics.timer("gemini_rpc"):
+            return await slot.client.generate_content(request, **kwargs)
+
+    async def stream_generate_content(self, request, **kwargs):
+        slot = self._pool._pick(self._pool._async_slots())
+        await self._pool._ensure_ready_async(slot)
+        start = time.perf_counter()
+        stream = await slot.client.stream_generate_content(request, **kwargs)
+
+        async def chunks():
+            first = True
+            async for chunk in stream:
+                if first:
+                    metrics.observe("gemini_ttfb", time.perf_counter() - start)
+                    first = False
+                yield chunk
+        return chunks()
+
+    def __getattr__(self, name):
+        return getattr(self._pool._pick(self._pool._async_slots()).client, name)
@@ -0,0 +1,466 @@
+# app/job_queue.py
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import ipaddress
+import threading
+from urllib.parse import urlparse
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from .metrics import metrics
+from .shared_state import SHARED_STATE_PATH
+from .structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Arquivo SQLite da fila de jobs (padrão: o arquivo compartilhado entre workers, se houver)
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", SHARED_STATE_PATH or "jobs.sqlite3")
+# Jobs processados ao mesmo tempo por processo (0 = API de jobs desativada, o padrão)
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "0"))
+# Intervalo de consulta à fila (jobs enviados por outro worker ou recuperados após reinício)
+JOBS_POLL_SECONDS = float(os.getenv("JOBS_POLL_SECONDS", "1.0"))
+# Tempo de posse de um job em processamento (ou da entrega do seu callback);
+# vencido, outro worker o retoma (processo caiu)
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", "300"))
+# Tentativas de processamento antes de marcar o job como erro
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+# Jobs finalizados ficam consultáveis por este tempo (segundos)
+JOBS_RETENTION_SECONDS = float(os.getenv("JOBS_RETENTION_SECONDS", "86400"))
+# Entrega do resultado na URL de callback
+JOBS_CALLBACK_TIMEOUT = float(os.getenv("JOBS_CALLBACK_TIMEOUT", "10"))
+JOBS_CALLBACK_RETRIES = int(os.getenv("JOBS_CALLBACK_RETRIES", "3"))
+# Hosts aceitos na callback_url mesmo com endereço interno (separados por vírgula)
+# Os demais só podem resolver para endereços públicos
+JOBS_CALLBACK_ALLOWED_HOSTS = {
+    host.strip().lower() for host in os.getenv("JOBS_CALLBACK_ALLOWED_HOSTS", "").split(",") if host.strip()
+}
+
+# Estados de um job
+PENDING = "pendente"
+RUNNING = "processando"
+DONE = "concluido"
+FAILED = "erro"
+
+# Intervalo entre limpezas dos jobs expirados
+PURGE_INTERVAL_SECONDS = 60.0
+
+
+class JobStore:
+    """
+    Fila de jobs em SQLite/WAL, sobrevive a reinícios e é compartilhada pelos workers
+    Um job é reservado com BEGIN IMMEDIATE (um único worker o recebe) e fica com
+    prazo de posse: se o processo cair, o job volta para a fila quando o prazo vence
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                   id TEXT PRIMARY KEY,
+                   status TEXT NOT NULL,
+                   text TEXT,
+                   filename TEXT,
+                   file BLOB,
+                   callback_url TEXT,
+                   callback TEXT,
+                   result TEXT,
+                   error TEXT,
+                   attempts INTEGER NOT NULL DEFAULT 0,
+                   owner TEXT,
+                   lease_until REAL,
+                   created REAL NOT NULL,
+                   started REAL,
+                   finished REAL
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created)")
+
+    def submit(self, text: Optional[str], filename: Optional[str] = None, file: Optional[bytes] = None,
+               callback_url: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, text, filename, file, callback_url, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, PENDING, text, filename, file, callback_url, time.time()),
+            )
+        return job_id
+
+    def claim(self, owner: str) -> Optional[Tuple[str, Optional[str], Optional[str], Optional[bytes], int]]:
+        """
+        Reserva o job pendente mais antigo (ou um em processamento com a posse vencida)
+        Retorna (id, texto, nome do arquivo, arquivo, tentativa) ou None com a fila vazia
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    """SELECT id, text, filename, file, attempts FROM jobs
+                       WHERE status = ? OR (status = ? AND lease_until < ?)
+                       ORDER BY created LIMIT 1""",
+                    (PENDING, RUNNING, now),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        """UPDATE jobs SET status = ?, owner = ?, lease_until = ?, attempts = attempts + 1,
+                                  started = COALESCE(started, ?) WHERE id = ?""",
+                        (RUNNING, owner, now + JOBS_LEASE_SECONDS, now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job_id, text, filename, file, attempts = row
+        return job_id, text, filename, file, attempts + 1
+
+    def finish(self, job_id: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        """
+        Grava o resultado (ou o erro) e descarta o arquivo enviado
+        Com callback_url, o job finalizado mantém a posse (owner/lease_until) enquanto o
+        callback está pendente: se o processo cair no meio da entrega, outro worker a retoma
+        """
+        callback = json.dumps({"estado": PENDING, "tentativas": 0})
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """UPDATE jobs SET status = ?, result = ?, error = ?, file = NULL, finished = ?,
+                          callback = CASE WHEN callback_url IS NULL THEN NULL ELSE ? END,
+                          lease_until = CASE WHEN callback_url IS NULL THEN NULL ELSE ? END,
+                          owner = CASE WHEN callback_url IS NULL THEN NULL ELSE owner END
+                   WHERE id = ?""",
+                (FAILED if error else DONE, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, now, callback, now + JOBS_LEASE_SECONDS, job_id),
+            )
+
+    def claim_callback(self, owner: str) -> Optional[str]:
+        """Reserva um callback pendente com a posse vencida (entrega interrompida); retorna o id do job"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    """SELECT id FROM jobs WHERE status IN (?, ?) AND lease_until < ?
+                       ORDER BY finished LIMIT 1""",
+                    (DONE, FAILED, now),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET owner = ?, lease_until = ? WHERE id = ?",
+                        (owner, now + JOBS_LEASE_SECONDS, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row[0] if row is not None else None
+
+    def release(self, owner: str):
+        """Devolve à fila os jobs em processamento deste processo (desligamento)"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, attempts = MAX(0, attempts - 1) "
+                "WHERE status = ? AND owner = ?",
+                (PENDING, RUNNING, owner),
+            )
+
+    def set_callback(self, job_id: str, state: Dict):
+        """Grava o estado final da entrega e libera a posse do callback"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET callback = ?, owner = NULL, lease_until = NULL WHERE id = ?",
+                (json.dumps(state), job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                """SELECT id, status, filename, callback_url, callback, result, error, attempts,
+                          created, started, finished FROM jobs WHERE id = ?""",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, status, filename, callback_url, callback, result, error, attempts, created, started, finished = row
+        return {
+            "id": job_id,
+            "status": status,
+            "arquivo": filename,
+            "tentativas": attempts,
+            "criado_em": created,
+            "iniciado_em": started,
+            "concluido_em": finished,
+            "resultado": json.loads(result) if result else None,
+            "erro": error,
+            "callback": {"url": callback_url, **(json.loads(callback) if callback else {})} if callback_url else None
+        }
+
+    def purge(self, older_than: float) -> int:
+        """Remove jobs finalizados antes de older_than (timestamp)"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished < ?", (DONE, FAILED, older_than)
+            )
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _UploadedFile:
+    """Arquivo guardado na fila com a interface de upload lida por extract_upload"""
+
+    def __init__(self, filename: str, data: bytes):
+        self.filename = filename
+        self._data = data
+        self._offset = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        end = len(self._data) if size < 0 else self._offset + size
+        chunk = self._data[self._offset:end]
+        self._offset += len(chunk)
+        return chunk
+
+
+class CallbackURLError(ValueError):
+    """callback_url inválida ou apontando para um endereço interno"""
+
+
+def validate_callback_url(url: str) -> Optional[str]:
+    """
+    Aceita apenas URLs http(s) cujo host resolve para endereços públicos
+    (loopback, redes privadas, link-local etc. são recusados), exceto os hosts
+    de JOBS_CALLBACK_ALLOWED_HOSTS. Faz consulta DNS: chamar fora do event loop
+    Retorna o endereço validado, ao qual a entrega deve conectar (None para hosts liberados)
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise CallbackURLError("callback_url deve ser uma URL http(s).")
+    host = parsed.hostname.lower()
+    if host in JOBS_CALLBACK_ALLOWED_HOSTS:
+        return None
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        infos = socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)
+    except (ValueError, socket.gaierror):
+        raise CallbackURLError("Host da callback_url não encontrado.")
+    addresses = [ipaddress.ip_address(info[4][0].split("%", 1)[0]) for info in infos]
+    for address in addresses:
+        if not address.is_global or address.is_multicast:
+            raise CallbackURLError("callback_url não pode apontar para um endereço interno.")
+    return str(addresses[0])
+
+
+def _post_callback(url: str, address: Optional[str], payload: Dict):
+    """
+    POST na callback_url conectando ao endereço validado, sem nova consulta DNS
+    (um DNS que mudasse entre a validação e a conexão levaria o POST a um endereço interno)
+    O host original segue no cabeçalho Host e, em https, no SNI e na verificação do certificado
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    if address is None:
+        return requests.post(url, json=payload, timeout=JOBS_CALLBACK_TIMEOUT, allow_redirects=False)
+
+    parsed = urlparse(url)
+    hostname = parsed.hostname
+
+    class PinnedHostAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            kwargs["server_hostname"] = hostname
+            kwargs["assert_hostname"] = hostname
+            super().init_poolmanager(*args, **kwargs)
+
+    pinned_host = f"[{address}]" if ":" in address else address
+    netloc = pinned_host if parsed.port is None else f"{pinned_host}:{parsed.port}"
+    headers = {"Host": parsed.netloc.rsplit("@", 1)[-1]}
+    auth = (parsed.username, parsed.password or "") if parsed.username else None
+    with requests.Session() as session:
+        session.mount(f"{parsed.scheme}://", PinnedHostAdapter())
+        return session.post(parsed._replace(netloc=netloc).geturl(), json=payload, headers=headers, auth=auth,
+                            timeout=JOBS_CALLBACK_TIMEOUT, allow_redirects=False)
+
+
+def _deliver_callback(url: str, payload: Dict) -> Dict:
+    """POST do job na URL de callback, com novas tentativas e espera exponencial (executado em thread)"""
+    import requests
+
+    state = {"estado": FAILED, "tentativas": 0}
+    for attempt in range(1, max(1, JOBS_CALLBACK_RETRIES) + 1):
+        state["tentativas"] = attempt
+        try:
+            # Revalida a cada tentativa (o DNS pode ter mudado desde o envio do job)
+            address = validate_callback_url(url)
+        except CallbackURLError as e:
+            state["erro"] = str(e)
+            return state
+        try:
+            # Conecta ao endereço validado; sem seguir redirecionamentos (o destino final
+            # também teria de ser validado)
+            response = _post_callback(url, address, payload)
+            state["codigo_http"] = response.status_code
+            if response.status_code < 300:
+                state["estado"] = "entregue"
+                return state
+            # Redirecionamento ou erro do cliente (exceto 429): repetir não adianta
+            if response.status_code < 500 and response.status_code != 429:
+                return state
+        except requests.RequestException as e:
+            state["erro"] = str(e)
+        if attempt < JOBS_CALLBACK_RETRIES:
+            time.sleep(min(2 ** (attempt - 1), 30))
+    return state
+
+
+class JobQueue:
+    """
+    Workers assíncronos do processo que consomem a fila e executam
+    classify_and_respond_async; o resultado fica em GET /jobs/{id} e,
+    se houver URL de callback, é enviado por POST ao terminar
+    """
+
+    def __init__(self, store: JobStore, process: Callable[[str], Awaitable[Dict]],
+                 extract: Callable[[object], Awaitable[Tuple[str, Dict]]], workers: int = JOBS_WORKERS):
+        self.store = store
+        self.workers = max(1, workers)
+        self._process = process
+        self._extract = extract
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks = []
+        self._callbacks = set()
+        self._last_purge = 0.0
+
+    def start(self):
+        """Inicia os workers no event loop atual"""
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info("Fila de jobs iniciada", workers=self.workers, arquivo=self.store.path)
+
+    async def stop(self):
+        """Cancela os workers e devolve os jobs em andamento para a fila"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._callbacks, return_exceptions=True)
+        self._tasks = []
+        self.store.release(self._owner)
+
+    async def submit(self, text: Optional[str], filename: Optional[str] = None, file: Optional[bytes] = None,
+                     callback_url: Optional[str] = None) -> str:
+        """Grava o job na fila e acorda um worker ocioso"""
+        job_id = await asyncio.to_thread(self.store.submit, text, filename, file, callback_url)
+        metrics.inc("jobs_total", {"status": PENDING})
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def _next_job(self):
+        """Próximo job da fila; espera aviso de novo job ou o intervalo de consulta"""
+        while True:
+            job = await asyncio.to_thread(self.store.claim, self._owner)
+            if job is not None:
+                return job
+            now = time.time()
+            if now - self._last_purge >= PURGE_INTERVAL_SECONDS:
+                self._last_purge = now
+                removed = await asyncio.to_thread(self.store.purge, now - JOBS_RETENTION_SECONDS)
+                if removed:
+                    logger.info("Jobs expirados removidos", jobs=removed)
+                await self._reclaim_callbacks()
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), JOBS_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self):
+        while True:
+            try:
+                await self._run_next()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Erro da fila (ex.: SQLite ocupado): o worker continua; um job já
+                # reservado volta para a fila quando a posse vencer
+                logger.error("Erro no worker da fila de jobs", erro=str(e))
+                await asyncio.sleep(JOBS_POLL_SECONDS)
+
+    async def _run_next(self):
+        """Reserva, processa e finaliza um job"""
+        job_id, text, filename, file, attempt = await self._next_job()
+        if attempt > JOBS_MAX_ATTEMPTS:
+            await self._finish(job_id, None, f"Job abandonado após {JOBS_MAX_ATTEMPTS} tentativas")
+            return
+        try:
+            with metrics.timer("job"):
+                extraction = None
+                if file is not None:
+                    text, extraction = await self._extract(_UploadedFile(filename, file))
+                result = await self._process(text)
+                if extraction is not None:
+                    result["detalhes"]["tempo_extracao"] = extraction["tempo_extracao"]
+                    result["detalhes"]["extracao"] = extraction
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Erro ao processar job", job=job_id, erro=str(e))
+            await self._finish(job_id, None, str(e))
+            return
+        await self._finish(job_id, result, None)
+
+    async def _finish(self, job_id: str, result: Optional[Dict], error: Optional[str]):
+        await asyncio.to_thread(self.store.finish, job_id, result, error)
+        metrics.inc("jobs_total", {"status": FAILED if error else DONE})
+        await self._start_callback(job_id)
+
+    async def _reclaim_callbacks(self):
+        """Retoma as entregas de callback interrompidas (posse vencida: o processo caiu no meio)"""
+        while True:
+            job_id = await asyncio.to_thread(self.store.claim_callback, self._owner)
+            if job_id is None:
+                return
+            logger.info("Entrega de callback retomada", job=job_id)
+            await self._start_callback(job_id)
+
+    async def _start_callback(self, job_id: str):
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job and job["callback"]:
+            task = asyncio.get_running_loop().create_task(self._callback(job))
+            self._callbacks.add(task)
+            task.add_done_callback(self._callbacks.discard)
+
+    async def _callback(self, job: Dict):
+        url = job["callback"]["url"]
+        payload = {key: value for key, value in job.items() if key != "callback"}
+        state = await asyncio.to_thread(_deliver_callback, url, payload)
+        metrics.inc("jobs_callback_total", {"estado": state["estado"]})
+        if state["estado"] != "entregue":
+            logger.warning("Falha ao entregar callback do job", job=job["id"], **state)
+        await asyncio.to_thread(self.store.set_callback, job["id"], state)
+
+    def stats(self) -> Dict:
+        return {
+            "ativo": True,
+            "workers": self.workers,
+            "arquivo": self.store.path,
+            "jobs": self.store.counts()
+        }
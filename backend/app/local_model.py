@@ -0,0 +1,296 @@
+# app/local_model.py
+import os
+import json
+import math
+import time
+import zlib
+import random
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from .structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# NumPy é opcional: sem ele o modelo local fica desativado
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Modelo local (regressão logística sobre n-gramas com hashing), entre as regras NLP e o Gemini
+# Arquivo carregado na inicialização; vazio ou inexistente = camada desativada
+LOCAL_MODEL_PATH = os.getenv(
+    "LOCAL_MODEL_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "local_model.npz")
+)
+# Confiança mínima para decidir sem o Gemini (vazio = limite calibrado no treino)
+LOCAL_MODEL_THRESHOLD = os.getenv("LOCAL_MODEL_THRESHOLD", "")
+# NDJSON onde as decisões do Gemini são gravadas como exemplos rotulados (vazio = não grava)
+LOCAL_MODEL_LABEL_LOG = os.getenv("LOCAL_MODEL_LABEL_LOG", "")
+
+# Versão do formato do arquivo (arquivos de outro formato são recusados)
+MODEL_FORMAT_VERSION = 1
+CATEGORIES = ("Improdutivo", "Produtivo")
+DEFAULT_DIM = 2 ** 18
+DEFAULT_THRESHOLD = 0.9
+
+
+def hashed_features(cleaned: str, dim: int) -> Tuple[List[int], List[float]]:
+    """
+    Unigramas e bigramas de palavras do texto normalizado (clean_text), projetados em `dim`
+    posições por CRC32 com sinal; contagens em escala 1 + log e normalização L2
+    """
+    words = cleaned.split()
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    counts: Dict[int, float] = {}
+    mask = dim - 1
+    for gram in grams:
+        h = zlib.crc32(gram.encode("utf-8"))
+        index = h & mask
+        counts[index] = counts.get(index, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+    indices = []
+    values = []
+    norm = 0.0
+    for index, count in counts.items():
+        if count == 0.0:
+            continue
+        value = (1.0 + math.log(abs(count))) * (1.0 if count > 0 else -1.0)
+        indices.append(index)
+        values.append(value)
+        norm += value * value
+    if norm > 0:
+        scale = 1.0 / norm ** 0.5
+        values = [value * scale for value in values]
+    return indices, values
+
+
+class LocalModel:
+    """
+    Classificador binário Produtivo/Improdutivo em NumPy puro
+    Predição = soma dos pesos das posições ativas (microssegundos por email, sem rede)
+    """
+
+    def __init__(self, weights, bias: float, metadata: Dict):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.metadata = metadata
+        self.dim = int(metadata["dimensao"])
+        self.version = metadata.get("versao", "?")
+        self.threshold = float(metadata.get("limite_calibrado", DEFAULT_THRESHOLD))
+
+    def probability(self, cleaned: str) -> float:
+        """Probabilidade de Produtivo para um texto já normalizado por clean_text"""
+        indices, values = hashed_features(cleaned, self.dim)
+        z = self.bias
+        if indices:
+            z += float(np.dot(self.weights[indices], values))
+        return 1.0 / (1.0 + math.exp(-max(-50.0, min(50.0, z))))
+
+    def predict(self, cleaned: str) -> Tuple[str, float]:
+        """(categoria, confiança) com confiança entre 0.5 e 1"""
+        p = self.probability(cleaned)
+        return (CATEGORIES[1], p) if p >= 0.5 else (CATEGORIES[0], 1.0 - p)
+
+    def save(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # savez acrescenta .npz a nomes sem extensão; grava em temporário e troca no fim
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(tmp_path, weights=self.weights, bias=np.array(self.bias),
+                            metadata=np.array(json.dumps(self.metadata, ensure_ascii=False)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LocalModel":
+        with np.load(path, allow_pickle=False) as data:
+            metadata = json.loads(str(data["metadata"]))
+            if metadata.get("formato") != MODEL_FORMAT_VERSION:
+                raise ValueError(f"formato {metadata.get('formato')} não suportado (esperado {MODEL_FORMAT_VERSION})")
+            return cls(data["weights"], float(data["bias"]), metadata)
+
+    def info(self) -> Dict:
+        return {
+            "versao": self.version,
+            "treinado_em": self.metadata.get("treinado_em"),
+            "exemplos": self.metadata.get("exemplos"),
+            "validacao": self.metadata.get("validacao"),
+            "limite_calibrado": self.threshold
+        }
+
+
+def load_local_model(path: str = LOCAL_MODEL_PATH) -> Optional[LocalModel]:
+    """Carrega o modelo da inicialização; None (camada desativada) se ausente ou inválido"""
+    if not path or not os.path.exists(path):
+        return None
+    if not NUMPY_AVAILABLE:
+        logger.warning("NumPy não instalado, modelo local desativado", arquivo=path)
+        return None
+    try:
+        model = LocalModel.load(path)
+    except Exception as e:
+        logger.error("Modelo local inválido, camada desativada", arquivo=path, erro=str(e))
+        return None
+    logger.info("Modelo local carregado", arquivo=path, versao=model.version, limite=model.threshold)
+    return model
+
+
+class LabelLog:
+    """
+    Exemplos rotulados para o treino: uma linha NDJSON por decisão em que o Gemini foi consultado
+    Escrita em modo append (linhas curtas, seguras entre workers)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, text: str, categoria: str, confianca: float, metodo: str):
+        line = json.dumps({
+            "texto": text,
+            "categoria": categoria,
+            "confianca": round(confianca, 3),
+            "metodo": metodo,
+            "ts": round(time.time(), 3)
+        }, ensure_ascii=False)
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.warning("Falha ao gravar exemplo rotulado", arquivo=self.path, erro=str(e))
+
+
+def load_labeled_examples(paths: Iterable[str], min_confidence: float = 0.0) -> List[Tuple[str, str]]:
+    """
+    Lê exemplos {"texto", "categoria", "confianca"} de arquivos NDJSON
+    Textos repetidos ficam com o rótulo mais recente
+    """
+    examples: Dict[str, str] = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                text = record.get("texto") or record.get("text")
+                categoria = record.get("categoria")
+                if not text or categoria not in CATEGORIES:
+                    continue
+                if float(record.get("confianca", 1.0)) < min_confidence:
+                    continue
+                examples.pop(text, None)
+                examples[text] = categoria
+    return list(examples.items())
+
+
+def _design_matrix(cleaned_texts: List[str], dim: int):
+    """Matriz esparsa em coordenadas: (linha, coluna, valor) de cada posição ativa"""
+    rows, cols, vals = [], [], []
+    for row, cleaned in enumerate(cleaned_texts):
+        indices, values = hashed_features(cleaned, dim)
+        rows.extend([row] * len(indices))
+        cols.extend(indices)
+        vals.extend(values)
+    return np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64), np.asarray(vals, dtype=np.float64)
+
+
+def _fit(rows, cols, vals, y, n: int, dim: int, epochs: int, l2: float, learning_rate: float):
+    """Regressão logística com L2 e pesos de classe balanceados (Adam em lote completo)"""
+    positives = max(1.0, float(y.sum()))
+    negatives = max(1.0, float(n - y.sum()))
+    sample_weight = np.where(y == 1, n / (2 * positives), n / (2 * negatives))
+    w = np.zeros(dim)
+    b = 0.0
+    m_w, v_w = np.zeros(dim), np.zeros(dim)
+    m_b = v_b = 0.0
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+    for step in range(1, epochs + 1):
+        z = np.bincount(rows, weights=w[cols] * vals, minlength=n) + b
+        residual = (1.0 / (1.0 + np.exp(-z)) - y) * sample_weight / n
+        grad_w = np.bincount(cols, weights=vals * residual[rows], minlength=dim) + l2 * w
+        grad_b = residual.sum()
+        m_w = beta1 * m_w + (1 - beta1) * grad_w
+        v_w = beta2 * v_w + (1 - beta2) * grad_w * grad_w
+        m_b = beta1 * m_b + (1 - beta1) * grad_b
+        v_b = beta2 * v_b + (1 - beta2) * grad_b * grad_b
+        correction1, correction2 = 1 - beta1 ** step, 1 - beta2 ** step
+        w -= learning_rate * (m_w / correction1) / (np.sqrt(v_w / correction2) + eps)
+        b -= learning_rate * (m_b / correction1) / (np.sqrt(v_b / correction2) + eps)
+    return w, b
+
+
+def _calibrate_threshold(confidences, correct, target_accuracy: float) -> Tuple[float, float]:
+    """
+    Menor confiança a partir da qual a precisão na validação atinge target_accuracy
+    Retorna (limite, cobertura = fração dos emails decididos localmente)
+    """
+    order = np.argsort(-confidences)
+    hits = np.cumsum(correct[order])
+    accuracy = hits / np.arange(1, len(order) + 1)
+    valid = np.nonzero(accuracy >= target_accuracy)[0]
+    if len(valid) == 0:
+        return 1.0, 0.0
+    last = valid[-1]
+    return float(confidences[order][last]), (last + 1) / len(order)
+
+
+def train_local_model(examples: List[Tuple[str, str]], clean_text, dim: int = DEFAULT_DIM,
+                      epochs: int = 300, l2: float = 1e-4, learning_rate: float = 0.05,
+                      validation_split: float = 0.2, target_accuracy: float = 0.97,
+                      seed: int = 42) -> LocalModel:
+    """
+    Treina o modelo a partir de (texto, categoria); clean_text = EmailNLPPreprocessor.clean_text
+    Uma fração dos exemplos fica separada para medir a precisão e calibrar o limite de confiança
+    """
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError("NumPy é necessário para treinar o modelo local")
+    if dim & (dim - 1):
+        raise ValueError("dim deve ser potência de 2")
+    if len({categoria for _, categoria in examples}) < 2:
+        raise ValueError("são necessários exemplos das duas categorias")
+
+    shuffled = list(examples)
+    random.Random(seed).shuffle(shuffled)
+    n_validation = int(len(shuffled) * validation_split) if len(shuffled) >= 20 else 0
+    validation, train = shuffled[:n_validation], shuffled[n_validation:]
+
+    start = time.perf_counter()
+    cleaned = [clean_text(text) for text, _ in train]
+    y = np.array([CATEGORIES.index(categoria) for _, categoria in train], dtype=np.float64)
+    rows, cols, vals = _design_matrix(cleaned, dim)
+    w, b = _fit(rows, cols, vals, y, len(train), dim, epochs, l2, learning_rate)
+
+    metadata = {
+        "formato": MODEL_FORMAT_VERSION,
+        "versao": datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S"),
+        "treinado_em": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "dimensao": dim,
+        "exemplos": {"treino": len(train), "validacao": len(validation)},
+        "hiperparametros": {"epocas": epochs, "l2": l2, "taxa_aprendizado": learning_rate, "semente": seed},
+        "tempo_treino_s": round(time.perf_counter() - start, 3),
+        "limite_calibrado": DEFAULT_THRESHOLD,
+        "validacao": None
+    }
+    model = LocalModel(w, b, metadata)
+
+    if validation:
+        predictions = [model.predict(clean_text(text)) for text, _ in validation]
+        confidences = np.array([confidence for _, confidence in predictions])
+        correct = np.array([predicted == categoria for (predicted, _), (_, categoria) in zip(predictions, validation)],
+                           dtype=np.float64)
+        threshold, coverage = _calibrate_threshold(confidences, correct, target_accuracy)
+        metadata["limite_calibrado"] = round(max(threshold, 0.5), 4)
+        metadata["validacao"] = {
+            "precisao": round(float(correct.mean()), 4),
+            "precisao_alvo": target_accuracy,
+            "cobertura_no_limite": round(coverage, 4)
+        }
+        model.threshold = metadata["limite_calibrado"]
+    return model
@@ -0,0 +1,136 @@
+# app/mailbox_reader.py
+import os
+from email import policy
+from email.parser import BytesParser, Parser
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, Iterator
+
+# Extensões aceitas ao percorrer um diretório de mensagens
+MESSAGE_EXTENSIONS = (".eml", ".txt")
+
+# Tamanho máximo (bytes) de uma linha do mbox em streaming; o excesso é descartado
+MBOX_MAX_LINE_BYTES = int(os.getenv("MBOX_MAX_LINE_BYTES", str(1024 * 1024)))
+
+
+def message_text(raw: str) -> str:
+    """
+    Extrai o texto útil de uma mensagem RFC 822 (assunto + corpo text/plain ou text/html)
+    Se não houver cabeçalhos reconhecíveis, retorna o conteúdo como está
+    """
+    message = Parser(policy=policy.default).parsestr(raw)
+    if not message.keys():
+        return raw.strip()
+    return _text_from_message(message)
+
+
+def _text_from_message(message) -> str:
+    """Assunto + corpo preferencialmente em texto puro"""
+    subject = str(message.get("subject", "") or "").strip()
+    body_part = message.get_body(preferencelist=("plain", "html"))
+    body = ""
+    if body_part is not None:
+        try:
+            body = body_part.get_content()
+        except Exception:
+            payload = body_part.get_payload(decode=True) or b""
+            body = payload.decode("utf-8", errors="ignore")
+    elif not message.is_multipart():
+        body = str(message.get_payload() or "")
+    text = f"Assunto: {subject}\n\n{body}" if subject else body
+    return text.strip()
+
+
+def _finish_mbox_message(lines):
+    """Desfaz o escape '>From ' do formato mbox e extrai o texto"""
+    raw = "".join(line[1:] if line.startswith(">From ") else line for line in lines)
+    return message_text(raw)
+
+
+def iter_mbox_messages(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Lê um mbox linha a linha e produz o texto de cada mensagem
+    Apenas a mensagem corrente fica em memória
+    """
+    current = []
+    previous_blank = True
+    for line in lines:
+        if line.startswith("From ") and previous_blank:
+            if current:
+                yield _finish_mbox_message(current)
+            current = []
+        else:
+            current.append(line)
+        previous_blank = line.strip() == ""
+    if current:
+        yield _finish_mbox_message(current)
+
+
+async def aiter_lines(chunks: AsyncIterable[bytes], max_line_bytes: int = MBOX_MAX_LINE_BYTES) -> AsyncIterator[str]:
+    """
+    Converte um fluxo assíncrono de bytes em linhas (decodificação UTF-8 tolerante)
+    Os pedaços da linha corrente ficam numa lista, unidos só no fim da linha; linhas
+    maiores que max_line_bytes são truncadas (memória limitada mesmo sem quebras de linha)
+    """
+    pending = []
+    pending_size = 0
+    async for chunk in chunks:
+        *lines, tail = chunk.split(b"\n")
+        for line in lines:
+            pending.append(line[:max_line_bytes - pending_size])
+            yield b"".join(pending).decode("utf-8", errors="ignore") + "\n"
+            pending = []
+            pending_size = 0
+        if tail and pending_size < max_line_bytes:
+            pending.append(tail[:max_line_bytes - pending_size])
+            pending_size += len(pending[-1])
+    if pending:
+        yield b"".join(pending).decode("utf-8", errors="ignore")
+
+
+async def aiter_mbox_messages(chunks: AsyncIterable[bytes]) -> AsyncIterator[Dict]:
+    """Versão assíncrona de iter_mbox_messages para uploads em streaming"""
+    current = []
+    previous_blank = True
+    index = 0
+    async for line in aiter_lines(chunks):
+        if line.startswith("From ") and previous_blank:
+            if current:
+                yield {"id": f"mbox:{index}", "text": _finish_mbox_message(current)}
+                index += 1
+            current = []
+        else:
+            current.append(line)
+        previous_blank = line.strip() == ""
+    if current:
+        yield {"id": f"mbox:{index}", "text": _finish_mbox_message(current)}
+
+
+def _read_message_file(path: str) -> str:
+    """Lê um arquivo .eml (RFC 822) ou .txt (texto puro)"""
+    if path.lower().endswith(".eml"):
+        with open(path, "rb") as f:
+            return _text_from_message(BytesParser(policy=policy.default).parse(f))
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return f.read()
+
+
+def iter_mailbox(path: str) -> Iterator[Dict]:
+    """
+    Percorre preguiçosamente uma exportação de caixa de e-mail
+    - diretório: arquivos .eml/.txt (recursivo, ordem alfabética)
+    - arquivo .eml/.txt: uma única mensagem
+    - qualquer outro arquivo: mbox
+    Produz {"id": ..., "text": ...}
+    """
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(MESSAGE_EXTENSIONS):
+                    file_path = os.path.join(root, name)
+                    yield {"id": os.path.relpath(file_path, path), "text": _read_message_file(file_path)}
+    elif path.lower().endswith(MESSAGE_EXTENSIONS):
+        yield {"id": os.path.basename(path), "text": _read_message_file(path)}
+    else:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for index, text in enumerate(iter_mbox_messages(f)):
+                yield {"id": f"mbox:{index}", "text": text}
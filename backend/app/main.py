@@ -1,16 +1,38 @@
 # app/main.py
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import AsyncIterator, List, Optional
 from .gemini_classifier import GeminiEmailClassifier
-import PyPDF2
-import io
+from .job_queue import JOBS_DB_PATH, JOBS_WORKERS, CallbackURLError, JobQueue, JobStore, validate_callback_url
+from .mailbox_reader import aiter_mbox_messages
+from .metrics import metrics
+from .rate_limiter import LANE_BULK, current_lane
+from .shared_state import get_shared_store
+from .structured_logging import get_logger, redact_text
+from .text_extraction import (
+    ExtractionError, UploadTooLargeError, extract_upload, read_upload_bytes, shutdown_extraction_pool
+)
+import json
+import asyncio
+import tempfile
+import threading
 from dotenv import load_dotenv
 import os
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+logger = get_logger(__name__)
+metrics.observe("init_imports", time.perf_counter() - _IMPORT_STARTED)
+
+# Multi-worker (SHARED_STATE_PATH): /metrics soma os retratos gravados por todos os workers
+if get_shared_store() is not None:
+    metrics.enable_sharing(get_shared_store())
+
 app = FastAPI(title="Email Classifier API - Gemini Edition", version="3.0")
 
 # Configurar CORS para desenvolvimento e produção
@@ -24,41 +46,134 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Inicializar classificador (pode falhar se Gemini não configurado)
-try:
-    classifier = GeminiEmailClassifier()
-except Exception as e:
-    print(f"❌ Erro ao inicializar classificador: {e}")
-    classifier = None
+# Rotas que não entram nas métricas de requisição (monitoramento)
+METRICS_EXCLUDED_PATHS = {"/metrics", "/health"}
+# Rótulo das requisições que não casaram com nenhuma rota (404)
+UNMATCHED_ROUTE_LABEL = "nao_mapeada"
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Mede cada requisição (etapa "request") e conta por rota e status"""
+    if request.url.path in METRICS_EXCLUDED_PATHS:
+        return await call_next(request)
+    status_code = 500
+    try:
+        # Em respostas em streaming mede até o início do envio
+        with metrics.timer("request"):
+            response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        # Modelo da rota (/jobs/{job_id}), não o caminho bruto: a cardinalidade das séries fica fixa
+        route = getattr(request.scope.get("route"), "path", UNMATCHED_ROUTE_LABEL)
+        metrics.inc("requisicoes_total", {"rota": route, "status": str(status_code)})
+
+# Máximo de e-mails aceitos por requisição em /process_batch
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "1000"))
+
+# Tamanho máximo (bytes) da exportação mbox enviada a /process_stream (vai para disco temporário)
+STREAM_MAX_BYTES = int(os.getenv("STREAM_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Prewarm na inicialização: classificador, NLTK e SDK do Gemini prontos antes do primeiro pedido
+STARTUP_PREWARM = os.getenv("STARTUP_PREWARM", "false").lower() in ("1", "true", "yes")
+
+_classifier: Optional[GeminiEmailClassifier] = None
+_classifier_failed = False
+_classifier_lock = threading.Lock()
+_ready_after: Optional[float] = None
+_job_queue: Optional[JobQueue] = None
+
+def get_classifier() -> Optional[GeminiEmailClassifier]:
+    """Classificador criado no primeiro uso, uma vez por processo (None se Gemini não configurado)"""
+    global _classifier, _classifier_failed
+    if _classifier is None and not _classifier_failed:
+        with _classifier_lock:
+            if _classifier is None and not _classifier_failed:
+                try:
+                    with metrics.timer("init_classifier"):
+                        _classifier = GeminiEmailClassifier()
+                except Exception as e:
+                    logger.error("Erro ao inicializar classificador", erro=str(e))
+                    _classifier_failed = True
+    return _classifier
+
+def _prewarm():
+    classifier = get_classifier()
+    if classifier:
+        classifier.prewarm()
+
+def _startup_breakdown() -> dict:
+    """Tempo (segundos) de cada etapa da inicialização já executada"""
+    stages = metrics.snapshot(local_only=True)["etapas"]
+    breakdown = {
+        stage[len("init_"):]: round(data["media"] * data["count"], 4)
+        for stage, data in stages.items() if stage.startswith("init_")
+    }
+    if _ready_after is not None:
+        breakdown["pronto_apos"] = _ready_after
+    return breakdown
+
+@app.on_event("startup")
+async def startup():
+    """Prewarm opcional (STARTUP_PREWARM) e registro do tempo de inicialização"""
+    global _ready_after, _job_queue
+    if STARTUP_PREWARM:
+        await asyncio.to_thread(_prewarm)
+        if _classifier:
+            await _classifier.prewarm_async()
+    if JOBS_WORKERS > 0:
+        # Jobs pendentes de execuções anteriores voltam a ser processados aqui
+        _job_queue = JobQueue(JobStore(JOBS_DB_PATH), _run_job, extract_upload)
+        _job_queue.start()
+    _ready_after = round(time.perf_counter() - _IMPORT_STARTED, 4)
+    logger.info("Inicialização concluída", prewarm=STARTUP_PREWARM, tempos=_startup_breakdown())
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Devolve os jobs em andamento para a fila e libera o pool de extração e as conexões com o Gemini"""
+    if _job_queue:
+        await _job_queue.stop()
+        _job_queue.store.close()
+    shutdown_extraction_pool()
+    if _classifier:
+        await _classifier.close_async()
 
 @app.get("/health")
 async def health():
     """Endpoint de saúde com informações do sistema"""
+    classifier = get_classifier()
     if not classifier:
         return {
             "status": "error",
             "message": "Classificador não configurado - verifique GEMINI_API_KEY"
         }
     
-    status = classifier.get_status()
+    # get_status lê baldes e cache no SQLite compartilhado: fora do event loop
+    status = await asyncio.to_thread(classifier.get_status)
+    circuito = status['circuito']
     return {
-        "status": "ok",
+        # Circuito aberto: respostas seguem só com NLP + templates até o Gemini voltar
+        "status": "ok" if circuito['estado'] == "fechado" else "degradado",
         "version": "3.0",
         "classifier": "Gemini-only",
         "gemini": f"✅ {status['status'].title()}",
-        "modelo": status['modelo']
+        "modelo": status['modelo'],
+        "circuito_gemini": circuito
     }
 
 @app.get("/system_info")
 async def system_info():
     """Informações detalhadas do sistema de classificação"""
+    classifier = get_classifier()
     if not classifier:
         return {
             "error": "Classificador não configurado",
             "solution": "Configure GEMINI_API_KEY no arquivo .env"
         }
     
-    status = classifier.get_status()
+    status = await asyncio.to_thread(classifier.get_status)
+    jobs = await asyncio.to_thread(_job_queue.stats) if _job_queue else {"ativo": False}
+    snapshot = await asyncio.to_thread(metrics.snapshot)
     return {
         "version": "3.0-gemini-only",
         "components": {
@@ -69,9 +184,24 @@ async def system_info():
         "features": status['recursos'],
         "accuracy_expected": "90-95%",
         "performance": "Ultra-rápido",
-        "modelo": status['modelo']
+        "modelo": status['modelo'],
+        "concorrencia": status['concorrencia'],
+        "cache": status['cache'],
+        "cache_respostas": status['cache_respostas'],
+        "modelo_local": status['modelo_local'],
+        "resposta_especulativa": status['resposta_especulativa'],
+        "saida_json": status['saida_json'],
+        "jobs": jobs,
+        "inicializacao": {**status['inicializacao'], "tempos": _startup_breakdown()},
+        "metricas": snapshot
     }
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Histogramas de latência por etapa e contadores no formato texto do Prometheus"""
+    # Junta as métricas dos outros workers (SQLite compartilhado): fora do event loop
+    return PlainTextResponse(await asyncio.to_thread(metrics.render_prometheus), media_type="text/plain; version=0.0.4")
+
 @app.post("/process_email")
 async def process_email(text: Optional[str] = Form(default=None), file: Optional[UploadFile] = File(default=None)):
     """
@@ -82,41 +212,292 @@ async def process_email(text: Optional[str] = Form(default=None), file: Optional
     
     Versão 3.0: Usa apenas Google Gemini para máxima precisão e simplicidade
     """
+    classifier = get_classifier()
     if not classifier:
         raise HTTPException(
             status_code=500, 
             detail="Classificador não configurado. Verifique GEMINI_API_KEY no arquivo .env"
         )
     
-    print(f"DEBUG: text recebido: {repr(text)}")
-    print(f"DEBUG: file recebido: {file}")
+    logger.debug("Requisição recebida", texto=redact_text(text), arquivo=file.filename if file else None)
     
     # Verificar se text está vazio ou None
     if text is not None and text.strip() == "":
         text = None
     
     if not text and not file:
-        print("DEBUG: Nenhum texto ou arquivo fornecido")
+        logger.debug("Nenhum texto ou arquivo fornecido")
         raise HTTPException(status_code=400, detail="Envie 'text' (form field) ou um arquivo 'file' (.txt ou .pdf).")
 
+    extraction = None
     if file:
-        filename = file.filename.lower()
-        content = await file.read()
-        if filename.endswith(".pdf"):
-            try:
-                reader = PyPDF2.PdfReader(io.BytesIO(content))
-                pages = []
-                for page in reader.pages:
-                    txt = page.extract_text()
-                    if txt:
-                        pages.append(txt)
-                text = "\n".join(pages)
-            except Exception as e:
-                raise HTTPException(status_code=400, detail=f"Erro ao ler PDF: {e}")
-        elif filename.endswith(".txt"):
-            text = content.decode("utf-8", errors="ignore")
-        else:
-            raise HTTPException(status_code=400, detail="Formato não suportado. Use .txt ou .pdf.")
+        text, extraction = await _extract_text_from_upload(file)
 
-    result = classifier.classify_and_respond(text)
+    # Caminho assíncrono: as chamadas ao Gemini não bloqueiam o event loop
+    result = await classifier.classify_and_respond_async(text)
+    if extraction is not None:
+        result["detalhes"]["tempo_extracao"] = extraction["tempo_extracao"]
+        result["detalhes"]["extracao"] = extraction
     return result
+
+
+@app.post("/process_email/events")
+async def process_email_events(text: Optional[str] = Form(default=None), file: Optional[UploadFile] = File(default=None)):
+    """
+    Mesmos campos de /process_email, com o resultado em Server-Sent Events:
+    "nlp" e "classificacao" chegam antes da resposta, que vem em trechos ("resposta")
+    conforme o Gemini gera; o último evento ("resultado") traz o JSON completo
+    """
+    classifier = get_classifier()
+    if not classifier:
+        raise HTTPException(
+            status_code=500, 
+            detail="Classificador não configurado. Verifique GEMINI_API_KEY no arquivo .env"
+        )
+    
+    if text is not None and text.strip() == "":
+        text = None
+    if not text and not file:
+        raise HTTPException(status_code=400, detail="Envie 'text' (form field) ou um arquivo 'file' (.txt ou .pdf).")
+    
+    extraction = None
+    if file:
+        text, extraction = await _extract_text_from_upload(file)
+    
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for event, data in classifier.classify_and_respond_events_async(text):
+                if event == "resultado" and extraction is not None:
+                    data["detalhes"]["tempo_extracao"] = extraction["tempo_extracao"]
+                    data["detalhes"]["extracao"] = extraction
+                yield _sse(event, data)
+        except Exception as e:
+            logger.error("Erro no processamento com eventos", erro=str(e))
+            yield _sse("erro", {"detail": str(e)})
+    
+    # X-Accel-Buffering: proxies (nginx) não devem segurar os eventos em buffer
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _sse(event: str, data: dict) -> str:
+    """Um evento no formato Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/process_batch")
+async def process_batch(request: Request):
+    """
+    Recebe:
+      - JSON: lista de textos (ou de objetos {"text": ...}) OR
+      - multipart com vários arquivos .txt ou .pdf (campo 'files')
+    Retorna os resultados na mesma ordem da entrada.
+    
+    Textos repetidos são classificados uma única vez e vários e-mails
+    são agrupados em cada prompt do Gemini.
+    """
+    classifier = get_classifier()
+    if not classifier:
+        raise HTTPException(
+            status_code=500, 
+            detail="Classificador não configurado. Verifique GEMINI_API_KEY no arquivo .env"
+        )
+    
+    content_type = request.headers.get("content-type", "")
+    extractions = None
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        uploads = form.getlist("files")
+        # Tamanho do lote e tipo dos itens antes de extrair qualquer arquivo
+        if len(uploads) > BATCH_MAX_SIZE:
+            raise HTTPException(status_code=413, detail=f"Lote muito grande. Máximo de {BATCH_MAX_SIZE} e-mails por requisição.")
+        if any(isinstance(upload, str) for upload in uploads):
+            raise HTTPException(status_code=400, detail="O campo 'files' deve conter apenas arquivos .txt ou .pdf.")
+        extracted = await asyncio.gather(*(_extract_text_from_upload(upload) for upload in uploads))
+        texts = [text for text, _ in extracted]
+        extractions = [meta for _, meta in extracted]
+    else:
+        try:
+            payload = await request.json()
+        except Exception:
+            raise HTTPException(status_code=400, detail="Envie um array JSON de textos ou arquivos no campo 'files'.")
+        texts = _parse_batch_payload(payload)
+    
+    if not texts:
+        raise HTTPException(status_code=400, detail="Lote vazio. Envie ao menos um texto ou arquivo.")
+    if len(texts) > BATCH_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"Lote muito grande. Máximo de {BATCH_MAX_SIZE} e-mails por requisição.")
+    
+    response = await classifier.classify_batch_async(texts)
+    if extractions is not None:
+        for result, extraction in zip(response["resultados"], extractions):
+            result["detalhes"]["tempo_extracao"] = extraction["tempo_extracao"]
+            result["detalhes"]["extracao"] = extraction
+    return response
+
+
+@app.post("/process_stream")
+async def process_stream(request: Request):
+    """
+    Recebe uma exportação mbox:
+      - no corpo bruto da requisição (ex.: curl --data-binary @caixa.mbox) OR
+      - como arquivo no campo 'file' (multipart)
+    Retorna NDJSON: uma linha por mensagem, enviada assim que cada uma termina.
+    
+    As mensagens são lidas sob demanda e classificadas com concorrência limitada.
+    """
+    classifier = get_classifier()
+    if not classifier:
+        raise HTTPException(
+            status_code=500, 
+            detail="Classificador não configurado. Verifique GEMINI_API_KEY no arquivo .env"
+        )
+    
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Envie a exportação mbox no campo 'file'.")
+        if upload.size is not None and upload.size > STREAM_MAX_BYTES:
+            await upload.close()
+            raise HTTPException(status_code=413, detail=str(UploadTooLargeError(STREAM_MAX_BYTES)))
+    else:
+        # O corpo precisa ser lido antes da resposta começar (a StreamingResponse passa a
+        # consumir o canal de recebimento); grandes volumes vão para disco, não para a memória
+        try:
+            upload = await _spool_request_body(request, STREAM_MAX_BYTES)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+    
+    async def ndjson_lines() -> AsyncIterator[str]:
+        try:
+            messages = aiter_mbox_messages(_iter_upload_chunks(upload))
+            async for result in classifier.classify_stream_async(messages):
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        finally:
+            await upload.close()
+    
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+
+async def _run_job(text: str) -> dict:
+    """Processamento de um job da fila (mesmo fluxo de /process_email, na faixa de lote do Gemini)"""
+    classifier = get_classifier()
+    if not classifier:
+        raise RuntimeError("Classificador não configurado. Verifique GEMINI_API_KEY no arquivo .env")
+    # Jobs são tráfego em lote: cedem a cota do Gemini às requisições interativas
+    lane_token = current_lane.set(LANE_BULK)
+    try:
+        return await classifier.classify_and_respond_async(text)
+    finally:
+        current_lane.reset(lane_token)
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(text: Optional[str] = Form(default=None), file: Optional[UploadFile] = File(default=None),
+                     callback_url: Optional[str] = Form(default=None)):
+    """
+    Recebe os mesmos campos de /process_email ('text' ou 'file') e, opcionalmente,
+    'callback_url'. Responde na hora com o id do job; a extração e a classificação
+    rodam nos workers da fila. O resultado fica em GET /jobs/{id} e, com
+    callback_url, é enviado por POST (JSON) ao terminar.
+    """
+    if _job_queue is None:
+        raise HTTPException(status_code=503, detail="Fila de jobs desativada (JOBS_WORKERS=0).")
+    
+    if text is not None and text.strip() == "":
+        text = None
+    if not text and not file:
+        raise HTTPException(status_code=400, detail="Envie 'text' (form field) ou um arquivo 'file' (.txt ou .pdf).")
+    if callback_url:
+        try:
+            # Resolve o host (DNS) fora do event loop
+            await asyncio.to_thread(validate_callback_url, callback_url)
+        except CallbackURLError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    filename = data = None
+    if file:
+        filename = file.filename or ""
+        if not filename.lower().endswith((".txt", ".pdf")):
+            raise HTTPException(status_code=400, detail="Formato não suportado. Use .txt ou .pdf.")
+        try:
+            data = await read_upload_bytes(file)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        text = None
+    
+    job_id = await _job_queue.submit(text, filename, data, callback_url or None)
+    return {"id": job_id, "status": "pendente", "url": f"/jobs/{job_id}"}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Estado do job: pendente, processando, concluido (com 'resultado') ou erro"""
+    if _job_queue is None:
+        raise HTTPException(status_code=503, detail="Fila de jobs desativada (JOBS_WORKERS=0).")
+    job = await asyncio.to_thread(_job_queue.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado ou expirado.")
+    return job
+
+
+async def _spool_request_body(request: Request, max_bytes: int) -> UploadFile:
+    """
+    Copia o corpo bruto da requisição para um arquivo temporário (memória até 1 MB)
+    Levanta UploadTooLargeError se passar de max_bytes (pelo Content-Length, antes de ler, ou na leitura)
+    """
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_bytes:
+        raise UploadTooLargeError(max_bytes)
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    upload = UploadFile(file=spool)
+    size = 0
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(max_bytes)
+            await upload.write(chunk)
+    except BaseException:
+        await upload.close()
+        raise
+    await upload.seek(0)
+    return upload
+
+
+async def _iter_upload_chunks(upload: UploadFile, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """Lê um upload em blocos (o arquivo já está em disco temporário)"""
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _parse_batch_payload(payload) -> List[str]:
+    """Aceita ["texto", ...], [{"text": "..."}, ...] ou {"texts": [...]}"""
+    if isinstance(payload, dict):
+        payload = payload.get("texts")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="O corpo deve ser um array JSON de textos.")
+    
+    texts = []
+    for item in payload:
+        if isinstance(item, dict):
+            item = item.get("text")
+        if item is not None and not isinstance(item, str):
+            raise HTTPException(status_code=400, detail="Cada item do lote deve ser um texto ou {\"text\": ...}.")
+        texts.append(item or "")
+    return texts
+
+
+async def _extract_text_from_upload(file: UploadFile):
+    """Extrai o texto de um upload .txt ou .pdf (PDF em pool de processos, com orçamento de páginas/caracteres)"""
+    try:
+        return await extract_upload(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ExtractionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
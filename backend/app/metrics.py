@@ -0,0 +1,240 @@
+# app/metrics.py
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+# Limites dos buckets (segundos) - do NLP (~ms) às chamadas lentas ao Gemini
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Amostras recentes mantidas por etapa para calcular p50/p95/p99
+RESERVOIR_SIZE = 2048
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+METRIC_PREFIX = "email_classifier"
+
+# Modo multi-worker: intervalo de gravação do retrato de cada worker e amostras enviadas por etapa
+SHARED_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+SHARED_SAMPLES = 512
+# Workers sem gravar há mais tempo que isto saem da soma dos medidores (valores instantâneos)
+SHARED_STALE_SECONDS = max(60.0, SHARED_FLUSH_SECONDS * 4)
+
+
+class Histogram:
+    """Histograma cumulativo (formato Prometheus) + amostras recentes para percentis"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.samples.append(value)
+        for i, limit in enumerate(self.buckets):
+            if value <= limit:
+                self.bucket_counts[i] += 1
+
+    def export(self) -> Dict:
+        return {
+            "buckets": list(self.bucket_counts),
+            "count": self.count,
+            "total": self.total,
+            "samples": list(self.samples)[-SHARED_SAMPLES:]
+        }
+
+    def merge(self, data: Dict):
+        """Soma o histograma exportado por outro worker"""
+        self.bucket_counts = [a + b for a, b in zip(self.bucket_counts, data["buckets"])]
+        self.count += data["count"]
+        self.total += data["total"]
+        self.samples.extend(data["samples"])
+
+    def quantiles(self) -> Dict[float, float]:
+        """Percentis sobre as amostras recentes"""
+        if not self.samples:
+            return {q: 0.0 for q in QUANTILES}
+        ordered = sorted(self.samples)
+        last = len(ordered) - 1
+        return {q: ordered[min(last, int(round(q * last)))] for q in QUANTILES}
+
+
+class MetricsRegistry:
+    """
+    Métricas do processo: histogramas de latência por etapa e contadores com rótulos
+    Etapas: extract, nlp, gemini_classify, gemini_respond, gemini_combined, gemini_batch, parse, decide, request
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], Dict[str, float]]]] = {}
+        self._store = None
+        self._worker_id = str(os.getpid())
+
+    def observe(self, stage: str, seconds: float):
+        """Registra a duração de uma etapa"""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Mede o bloco (funciona também em volta de await)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def inc(self, name: str, labels: Optional[Dict[str, str]] = None, value: float = 1.0):
+        """Incrementa um contador (ex.: inc("classificacoes_total", {"metodo": "nlp"}))"""
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def register_gauge(self, name: str, label: str, callback: Callable[[], Dict[str, float]]):
+        """Medidor lido na exportação: callback retorna {valor do rótulo: valor}"""
+        with self._lock:
+            self._gauges[name] = (label, callback)
+
+    def enable_sharing(self, store, worker_id: Optional[str] = None, interval: float = SHARED_FLUSH_SECONDS):
+        """
+        Modo multi-worker: grava periodicamente o retrato deste worker no SharedStateStore;
+        snapshot() e render_prometheus() passam a somar todos os workers
+        """
+        self._store = store
+        self._worker_id = worker_id or str(os.getpid())
+        thread = threading.Thread(target=self._flush_loop, args=(interval,), name="metrics-flush", daemon=True)
+        thread.start()
+
+    def _flush_loop(self, interval: float):
+        while True:
+            time.sleep(interval)
+            self.flush()
+
+    def flush(self):
+        """Grava o retrato deste worker (erros de disco são ignorados até o próximo ciclo)"""
+        if self._store is None:
+            return
+        try:
+            self._store.save_worker_metrics(self._worker_id, self._export_state())
+        except Exception:
+            pass
+
+    def _export_state(self) -> Dict:
+        with self._lock:
+            histograms = {stage: histogram.export() for stage, histogram in self._histograms.items()}
+            counters = [[name, list(map(list, labels)), value] for (name, labels), value in self._counters.items()]
+            gauges = dict(self._gauges)
+        return {
+            "histogramas": histograms,
+            "contadores": counters,
+            "medidores": {name: [label, callback()] for name, (label, callback) in gauges.items()}
+        }
+
+    def _collect(self, local_only: bool = False) -> Tuple[Dict[str, Histogram], Dict, Dict[str, Tuple[str, Dict[str, float]]]]:
+        """Histogramas, contadores e medidores deste worker ou, em modo compartilhado, de todos"""
+        if self._store is None or local_only:
+            state = self._export_state()
+            states = [(state, time.time())]
+        else:
+            self.flush()
+            try:
+                states = [(data, updated) for _, data, updated in self._store.load_worker_metrics()]
+            except Exception:
+                states = [(self._export_state(), time.time())]
+
+        histograms: Dict[str, Histogram] = {}
+        counters: Dict = {}
+        gauges: Dict[str, Tuple[str, Dict[str, float]]] = {}
+        now = time.time()
+        for state, updated in states:
+            for stage, data in state["histogramas"].items():
+                histograms.setdefault(stage, Histogram()).merge(data)
+            for name, labels, value in state["contadores"]:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                counters[key] = counters.get(key, 0.0) + value
+            # Medidores são valores instantâneos: workers que pararam de reportar não entram
+            if now - updated > SHARED_STALE_SECONDS:
+                continue
+            for name, (label, values) in state["medidores"].items():
+                merged = gauges.setdefault(name, (label, {}))[1]
+                for label_value, value in values.items():
+                    merged[label_value] = merged.get(label_value, 0.0) + value
+        return histograms, counters, gauges
+
+    def snapshot(self, local_only: bool = False) -> Dict:
+        """Resumo em JSON (contagem, média e percentis por etapa + contadores)"""
+        histograms, counters, _ = self._collect(local_only)
+        stages = {}
+        for stage, histogram in histograms.items():
+            quantiles = histogram.quantiles()
+            stages[stage] = {
+                "count": histogram.count,
+                "media": round(histogram.total / histogram.count, 6) if histogram.count else 0.0,
+                "p50": round(quantiles[0.5], 6),
+                "p95": round(quantiles[0.95], 6),
+                "p99": round(quantiles[0.99], 6)
+            }
+        counter_values = {}
+        for (name, labels), value in counters.items():
+            label_text = ",".join(f"{k}={v}" for k, v in labels)
+            counter_values[f"{name}{{{label_text}}}" if label_text else name] = value
+        return {"etapas": stages, "contadores": counter_values}
+
+    def render_prometheus(self) -> str:
+        """Exporta no formato texto do Prometheus (versão 0.0.4)"""
+        histograms, counters, gauges = self._collect()
+        lines = []
+        histogram_name = f"{METRIC_PREFIX}_stage_seconds"
+        lines.append(f"# HELP {histogram_name} Duração de cada etapa do processamento")
+        lines.append(f"# TYPE {histogram_name} histogram")
+        for stage, histogram in sorted(histograms.items()):
+            for limit, count in zip(histogram.buckets, histogram.bucket_counts):
+                lines.append(f'{histogram_name}_bucket{{stage="{stage}",le="{limit}"}} {count}')
+            lines.append(f'{histogram_name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{histogram_name}_sum{{stage="{stage}"}} {histogram.total:.6f}')
+            lines.append(f'{histogram_name}_count{{stage="{stage}"}} {histogram.count}')
+
+        quantile_name = f"{METRIC_PREFIX}_stage_quantile_seconds"
+        lines.append(f"# HELP {quantile_name} Percentis recentes (p50/p95/p99) de cada etapa")
+        lines.append(f"# TYPE {quantile_name} gauge")
+        for stage, histogram in sorted(histograms.items()):
+            for q, value in histogram.quantiles().items():
+                lines.append(f'{quantile_name}{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+
+        names = sorted({name for name, _ in counters})
+        for name in names:
+            metric = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} counter")
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name != name:
+                    continue
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{metric}{{{label_text}}} {value:g}" if label_text else f"{metric} {value:g}")
+
+        for name, (label, values) in sorted(gauges.items()):
+            metric = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            for label_value, value in sorted(values.items()):
+                lines.append(f'{metric}{{{label}="{label_value}"}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+# Registro único do processo
+metrics = MetricsRegistry()
@@ -1,30 +1,135 @@
 # app/nlp_preprocessor.py
+import os
 import re
 import string
-from typing import Dict, List
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from .metrics import metrics
+from .structured_logging import get_logger
 
-# Tentar importar NLTK, mas funcionar sem ele se necessário
-try:
+logger = get_logger(__name__)
+
+# Dados do NLTK (punkt, stopwords) baixados no build para este diretório: a aplicação
+# nunca acessa a rede para obtê-los (ver "python -m app.cli nltk-download")
+NLTK_DATA_DIR = os.getenv(
+    "NLTK_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "nltk_data")
+)
+NLTK_PACKAGES = ("punkt", "punkt_tab", "stopwords")
+
+
+class NLTKResources:
+    """
+    Tokenizador e stopwords do NLTK carregados sob demanda, uma única vez por processo
+    (thread-safe). Sem o NLTK ou sem os dados locais, o preprocessor usa o fallback simples
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.tokenize = None
+        self.stopwords: Optional[set] = None
+
+    @property
+    def available(self) -> bool:
+        return self.load().tokenize is not None
+
+    def load(self) -> "NLTKResources":
+        if self._loaded:
+            return self
+        with self._lock:
+            if self._loaded:
+                return self
+            with metrics.timer("init_nltk"):
+                self._load_uncached()
+            self._loaded = True
+        return self
+
+    def _load_uncached(self):
+        try:
+            import nltk
+            from nltk.corpus import stopwords
+            from nltk.tokenize import word_tokenize
+        except ImportError:
+            logger.warning("NLTK não instalado, usando fallback simples")
+            return
+        
+        if NLTK_DATA_DIR not in nltk.data.path:
+            nltk.data.path.insert(0, NLTK_DATA_DIR)
+        try:
+            # Carrega os modelos agora (LookupError se os dados não estiverem no disco)
+            word_tokenize("teste", language='portuguese')
+            self.tokenize = word_tokenize
+        except LookupError:
+            logger.warning("Tokenizador NLTK não encontrado localmente, usando fallback simples",
+                           diretorio=NLTK_DATA_DIR)
+        try:
+            self.stopwords = set(stopwords.words('portuguese')) | set(stopwords.words('english'))
+        except LookupError:
+            logger.warning("Stopwords NLTK não encontradas localmente, usando fallback simples",
+                           diretorio=NLTK_DATA_DIR)
+
+
+def download_nltk_data(target_dir: str = NLTK_DATA_DIR) -> bool:
+    """Baixa os dados do NLTK para o diretório local (executar no build, não em produção)"""
     import nltk
-    from nltk.corpus import stopwords
-    from nltk.tokenize import word_tokenize
     
-    # Download necessário (executar uma vez)
-    try:
-        nltk.data.find('tokenizers/punkt')
-        nltk.data.find('corpora/stopwords')
-        NLTK_AVAILABLE = True
-    except LookupError:
-        try:
-            nltk.download('punkt', quiet=True)
-            nltk.download('stopwords', quiet=True)
-            NLTK_AVAILABLE = True
-        except:
-            print("⚠️ NLTK não disponível, usando fallback simples")
-            NLTK_AVAILABLE = False
+    os.makedirs(target_dir, exist_ok=True)
+    return all(nltk.download(package, download_dir=target_dir, quiet=True) for package in NLTK_PACKAGES)
+
+
+# Recursos compartilhados pelos preprocessors do processo
+nltk_resources = NLTKResources()
+
+# NumPy é opcional: sem ele, classify_many usa o caminho por e-mail
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
 except ImportError:
-    print("⚠️ NLTK não instalado, usando fallback simples")
-    NLTK_AVAILABLE = False
+    NUMPY_AVAILABLE = False
+
+# Mensagens triviais de cortesia (texto já normalizado por clean_text) - dispensam o Gemini
+TRIVIAL_MESSAGE_PATTERN = re.compile(
+    r'^(?:(?:olá|ola|oi|prezad[oa]s?)\s+)?'
+    r'(?:muito\s+)?'
+    r'(?:obrigad[oa]s?|valeu|ok|okay|ciente|recebido|de nada|bom dia|boa tarde|boa noite|parabéns'
+    r'|feliz (?:natal|ano novo|aniversário|páscoa)|boas festas)'
+    r'(?:\s+(?:pela|pelo)\s+(?:ajuda|atenção|informação|retorno|resposta|contato))?'
+    r'(?:\s+(?:a todos|pessoal|equipe))?$'
+)
+
+# Expressões pré-compiladas da limpeza de texto
+HTML_TAG_PATTERN = re.compile(r'<[^>]+>')
+NON_WORD_PATTERN = re.compile(r'[^\w\s\u00C0-\u017F]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Indicadores de urgência (busca por substring no texto limpo, ex.: "urgentemente", "prazos")
+URGENT_PATTERN = re.compile(r'urgente|importante|prazo')
+
+# Quantas análises recentes manter para reaproveitamento entre consumidores do mesmo e-mail
+ANALYSIS_MEMO_SIZE = 64
+
+
+class EmailAnalysis:
+    """
+    Resultado de uma única passada sobre o e-mail: limpeza, tokens, palavras
+    significativas, palavras-chave encontradas e indicadores
+    """
+    
+    __slots__ = ('text', 'cleaned', 'tokens', 'meaningful_words',
+                 'productive_matches', 'unproductive_matches', 'has_urgent_indicators')
+    
+    def __init__(self, text: str, cleaned: str, tokens: List[str], meaningful_words: List[str],
+                 productive_matches: List[str], unproductive_matches: List[str], has_urgent_indicators: bool):
+        self.text = text
+        self.cleaned = cleaned
+        self.tokens = tokens
+        self.meaningful_words = meaningful_words
+        self.productive_matches = productive_matches
+        self.unproductive_matches = unproductive_matches
+        self.has_urgent_indicators = has_urgent_indicators
+
 
 class EmailNLPPreprocessor:
     """
@@ -33,15 +138,8 @@ class EmailNLPPreprocessor:
     """
     
     def __init__(self):
-        # Configurar stop words com fallback
-        if NLTK_AVAILABLE:
-            try:
-                self.stop_words = set(stopwords.words('portuguese'))
-                self.stop_words.update(stopwords.words('english'))
-            except:
-                self.stop_words = self._get_fallback_stopwords()
-        else:
-            self.stop_words = self._get_fallback_stopwords()
+        # Stopwords e tokenizador do NLTK são carregados no primeiro uso (ver warm_up)
+        self._stop_words: Optional[set] = None
         
         # Palavras-chave para classificação rápida
         self.productive_keywords = {
@@ -56,7 +154,33 @@ class EmailNLPPreprocessor:
             'ano novo', 'feriado', 'desculpa', 'agradecimento', 'elogio',
             'congratulações', 'felicitações', 'sucesso', 'conquista'
         }
+        
+        self._compile_keyword_pattern()
+        self._analysis_memo = OrderedDict()
+        self._memo_lock = threading.Lock()
     
+    def _compile_keyword_pattern(self):
+        """
+        Compila todas as palavras-chave (inclusive expressões como 'ano novo') em um único padrão
+        Chamar novamente se os conjuntos de palavras-chave forem alterados
+        """
+        keywords = sorted(self.productive_keywords | self.unproductive_keywords, key=len, reverse=True)
+        alternatives = '|'.join(re.escape(keyword).replace(r'\ ', r'\s+') for keyword in keywords)
+        self._keyword_pattern = re.compile(rf'(?<!\w)(?:{alternatives})(?!\w)')
+        # Coluna de cada palavra-chave na matriz de contagens de classify_many
+        self._keyword_columns = {keyword: column for column, keyword in enumerate(keywords)}
+    
+    @property
+    def stop_words(self) -> set:
+        """Stopwords do NLTK (ou fallback), carregadas no primeiro acesso"""
+        if self._stop_words is None:
+            self._stop_words = nltk_resources.load().stopwords or self._get_fallback_stopwords()
+        return self._stop_words
+
+    def warm_up(self):
+        """Carrega NLTK e stopwords e exercita a análise (prewarm na inicialização)"""
+        self.analyze("Prezados, solicito o status do relatório. Obrigado!")
+
     def _get_fallback_stopwords(self) -> set:
         """Stopwords básicas em português e inglês"""
         return {
@@ -66,7 +190,7 @@ class EmailNLPPreprocessor:
     def _simple_tokenize(self, text: str) -> List[str]:
         """Tokenização simples sem NLTK"""
         # Remover pontuação e converter para minúsculas
-        text = re.sub(r'[^\w\s\u00C0-\u017F]', ' ', text.lower())
+        text = NON_WORD_PATTERN.sub(' ', text.lower())
         return text.split()
 
     def clean_text(self, text: str) -> str:
@@ -75,60 +199,107 @@ class EmailNLPPreprocessor:
             return ""
         
         # Remover HTML tags
-        text = re.sub(r'<[^>]+>', ' ', text)
+        text = HTML_TAG_PATTERN.sub(' ', text)
         
         # Remover caracteres especiais mantendo acentos
-        text = re.sub(r'[^\w\s\u00C0-\u017F]', ' ', text)
+        text = NON_WORD_PATTERN.sub(' ', text)
         
         # Normalizar espaços
-        text = re.sub(r'\s+', ' ', text)
+        text = WHITESPACE_PATTERN.sub(' ', text)
         
         return text.strip().lower()
 
-    def extract_features(self, text: str) -> Dict:
-        """Extrai features do texto para análise complementar"""
-        cleaned = self.clean_text(text)
-        
-        # Tokenização com ou sem NLTK
-        if NLTK_AVAILABLE:
+    def _tokenize(self, cleaned: str) -> List[str]:
+        """Tokenização com ou sem NLTK"""
+        tokenize = nltk_resources.load().tokenize
+        if tokenize is not None:
             try:
-                tokens = word_tokenize(cleaned, language='portuguese')
-            except:
-                tokens = self._simple_tokenize(cleaned)
-        else:
-            tokens = self._simple_tokenize(cleaned)
+                return tokenize(cleaned, language='portuguese')
+            except Exception:
+                return self._simple_tokenize(cleaned)
+        return self._simple_tokenize(cleaned)
+
+    def analyze(self, text: str) -> EmailAnalysis:
+        """
+        Passada única sobre o e-mail, compartilhada por extract_features, classify_with_nlp
+        e is_trivial_message (análises recentes são reaproveitadas)
+        """
+        text = text or ""
+        with self._memo_lock:
+            analysis = self._analysis_memo.get(text)
+            if analysis is not None:
+                self._analysis_memo.move_to_end(text)
+                return analysis
+        
+        cleaned = self.clean_text(text)
+        tokens = self._tokenize(cleaned)
         
         # Remover stop words
         meaningful_words = [word for word in tokens if word not in self.stop_words and len(word) > 2]
         
+        # Palavras-chave: um único padrão sobre o texto limpo (inclui expressões com mais de uma palavra)
+        productive_matches = []
+        unproductive_matches = []
+        for match in self._keyword_pattern.findall(cleaned):
+            keyword = WHITESPACE_PATTERN.sub(' ', match)
+            if keyword in self.productive_keywords:
+                productive_matches.append(keyword)
+            if keyword in self.unproductive_keywords:
+                unproductive_matches.append(keyword)
+        
+        analysis = EmailAnalysis(
+            text=text,
+            cleaned=cleaned,
+            tokens=tokens,
+            meaningful_words=meaningful_words,
+            productive_matches=productive_matches,
+            unproductive_matches=unproductive_matches,
+            has_urgent_indicators=URGENT_PATTERN.search(cleaned) is not None
+        )
+        
+        with self._memo_lock:
+            self._analysis_memo[text] = analysis
+            while len(self._analysis_memo) > ANALYSIS_MEMO_SIZE:
+                self._analysis_memo.popitem(last=False)
+        return analysis
+
+    def has_keyword(self, text: str) -> bool:
+        """Indica se o trecho contém alguma palavra-chave produtiva ou improdutiva"""
+        return self._keyword_pattern.search(self.clean_text(text)) is not None
+
+    def is_trivial_message(self, text: str, analysis: Optional[EmailAnalysis] = None) -> bool:
+        """Identifica mensagens curtas de cortesia ("obrigado", "ok", "feliz natal"...)"""
+        analysis = analysis or self.analyze(text)
+        return bool(TRIVIAL_MESSAGE_PATTERN.match(analysis.cleaned))
+
+    def extract_features(self, text: str, analysis: Optional[EmailAnalysis] = None) -> Dict:
+        """Extrai features do texto para análise complementar"""
+        analysis = analysis or self.analyze(text)
+        tokens = analysis.tokens
+        meaningful_words = analysis.meaningful_words
+        
         # Calcular features
-        features = {
+        return {
             'word_count': len(tokens),
-            'char_count': len(text),
+            'char_count': len(analysis.text),
             'meaningful_words': len(meaningful_words),
             'avg_word_length': sum(len(word) for word in meaningful_words) / max(len(meaningful_words), 1),
-            'has_urgent_indicators': any(word in cleaned for word in ['urgente', 'importante', 'prazo']),
-            'has_question_marks': '?' in text,
-            'has_exclamation': '!' in text,
-            'productive_score': 0,
-            'unproductive_score': 0
+            'has_urgent_indicators': analysis.has_urgent_indicators,
+            'has_question_marks': '?' in analysis.text,
+            'has_exclamation': '!' in analysis.text,
+            # Score baseado em palavras-chave
+            'productive_score': len(analysis.productive_matches),
+            'unproductive_score': len(analysis.unproductive_matches)
         }
-        
-        # Score baseado em palavras-chave
-        for word in meaningful_words:
-            if word in self.productive_keywords:
-                features['productive_score'] += 1
-            if word in self.unproductive_keywords:
-                features['unproductive_score'] += 1
-        
-        return features
 
-    def classify_with_nlp(self, text: str) -> Dict:
+    def classify_with_nlp(self, text: str, analysis: Optional[EmailAnalysis] = None,
+                          features: Optional[Dict] = None) -> Dict:
         """
         Classificação completa NLP com confiança calculada
         Agora retorna classificação real, não apenas hint
         """
-        features = self.extract_features(text)
+        if features is None:
+            features = self.extract_features(text, analysis)
         
         # Calcular scores normalizados
         productive_indicators = features['productive_score']
@@ -179,6 +350,107 @@ class EmailNLPPreprocessor:
             }
         }
     
+    def classify_many(self, texts: List[str], chunk_size: int = 50000) -> List[Dict]:
+        """
+        Classificação NLP em massa (re-pontuação offline, ajuste de limites)
+        Uma passada por texto (limpeza, tokenização e busca das palavras-chave com regex)
+        coleta só as ocorrências encontradas; as contagens por linha saem de np.bincount
+        e as regras de classify_with_nlp são aplicadas com operações vetorizadas do NumPy.
+        Os resultados são idênticos aos de classify_with_nlp, na mesma ordem.
+        A passada por texto (regex de limpeza e de palavras-chave) continua em Python e domina
+        o custo: o ganho sobre classify_with_nlp em laço fica em ~1.3x.
+        """
+        if not NUMPY_AVAILABLE:
+            return [self.classify_with_nlp(text) for text in texts]
+        
+        results = []
+        for start in range(0, len(texts), chunk_size):
+            results.extend(self._classify_chunk_vectorized(texts[start:start + chunk_size]))
+        return results
+
+    def _classify_chunk_vectorized(self, texts: List[str]) -> List[Dict]:
+        """Aplica as regras de classify_with_nlp a um bloco de textos com NumPy"""
+        n = len(texts)
+        if n == 0:
+            return []
+        
+        # Passada única pelo corpus (laço Python por texto): contagem de tokens, indicadores e
+        # coordenadas (linha, coluna) de cada palavra-chave encontrada
+        word_count = np.zeros(n, dtype=np.int64)
+        urgent = np.zeros(n, dtype=bool)
+        question = np.zeros(n, dtype=bool)
+        rows, cols = [], []
+        for row, text in enumerate(texts):
+            text = text or ""
+            cleaned = self.clean_text(text)
+            word_count[row] = len(self._tokenize(cleaned))
+            urgent[row] = URGENT_PATTERN.search(cleaned) is not None
+            question[row] = '?' in text
+            for match in self._keyword_pattern.findall(cleaned):
+                column = self._keyword_columns.get(WHITESPACE_PATTERN.sub(' ', match))
+                if column is not None:
+                    rows.append(row)
+                    cols.append(column)
+        
+        # Contagens esparsas: cada ocorrência pesa 1 na categoria da sua coluna e np.bincount
+        # soma os pesos por linha (sem matriz densa textos x palavras-chave)
+        productive_mask = np.zeros(len(self._keyword_columns), dtype=np.float64)
+        unproductive_mask = np.zeros(len(self._keyword_columns), dtype=np.float64)
+        for keyword, column in self._keyword_columns.items():
+            if keyword in self.productive_keywords:
+                productive_mask[column] = 1.0
+            if keyword in self.unproductive_keywords:
+                unproductive_mask[column] = 1.0
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        p = np.bincount(rows, weights=productive_mask[cols], minlength=n)
+        u = np.bincount(rows, weights=unproductive_mask[cols], minlength=n)
+        
+        # Mesmas regras (e mesma ordem de operações) de classify_with_nlp
+        base_confidence = 0.6
+        conditions = [
+            urgent | question,
+            (p >= 2) & (u == 0),
+            (u >= 2) & (p == 0),
+            (p > u) & (p > 0),
+            (u > p) & (u > 0),
+            (word_count < 10) & ~question,
+            (word_count > 20) & question,
+        ]
+        is_productive = np.select(conditions, [True, True, False, True, False, False, True], default=False)
+        confidences = np.select(conditions, [
+            np.minimum(0.85, base_confidence + 0.2 + (p * 0.05)),
+            np.minimum(0.80, base_confidence + (p * 0.05)),
+            np.minimum(0.80, base_confidence + (u * 0.05)),
+            np.minimum(0.75, base_confidence + ((p - u) * 0.05)),
+            np.minimum(0.75, base_confidence + ((u - p) * 0.05)),
+            np.full(n, 0.65),
+            np.full(n, 0.70),
+        ], default=0.55)
+        
+        results = []
+        for i in range(n):
+            classification = "Produtivo" if is_productive[i] else "Improdutivo"
+            features = {
+                'has_urgent_indicators': bool(urgent[i]),
+                'has_question_marks': bool(question[i]),
+                'productive_score': int(p[i]),
+                'unproductive_score': int(u[i]),
+            }
+            results.append({
+                'nlp_classification': classification,
+                'nlp_confidence': round(float(confidences[i]), 3),
+                'nlp_reasoning': self._generate_nlp_reasoning(features, classification),
+                'features_detected': {
+                    'productive_keywords': features['productive_score'],
+                    'unproductive_keywords': features['unproductive_score'],
+                    'has_urgency': features['has_urgent_indicators'],
+                    'has_questions': features['has_question_marks'],
+                    'word_count': int(word_count[i])
+                }
+            })
+        return results
+
     def _generate_nlp_reasoning(self, features: Dict, classification: str) -> str:
         """Gera explicação da decisão NLP"""
         reasons = []
@@ -201,13 +473,14 @@ class EmailNLPPreprocessor:
         """
         Prepara texto para envio ao Gemini com classificação NLP completa
         """
-        cleaned_text = self.clean_text(text)
-        features = self.extract_features(text)
-        nlp_result = self.classify_with_nlp(text)
+        with metrics.timer("nlp"):
+            analysis = self.analyze(text)
+            features = self.extract_features(text, analysis)
+            nlp_result = self.classify_with_nlp(text, analysis, features)
         
         return {
             'original_text': text,
-            'cleaned_text': cleaned_text,
+            'cleaned_text': analysis.cleaned,
             'features': features,
             'nlp_classification': nlp_result,
             'ready_for_gemini': True
@@ -0,0 +1,157 @@
+# app/prompt_budget.py
+import re
+from typing import Callable, Dict, List, Tuple
+
+# Marcadores de início de mensagem citada/encaminhada (tudo a partir deles é descartado)
+QUOTE_HEADER_PATTERN = re.compile(
+    r'^\s*(?:'
+    r'-{2,}\s*(?:original message|mensagem original|forwarded message|mensagem encaminhada)\s*-{2,}'
+    r'|em .{3,120}escreveu:\s*$'
+    r'|on .{3,120}wrote:\s*$'
+    r'|(?:de|from):\s.+\n\s*(?:enviad[ao](?: em)?|sent|data|date):\s'
+    r')',
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Linhas citadas no estilo "> texto"
+QUOTED_LINE_PATTERN = re.compile(r'^\s*>.*$\n?', re.MULTILINE)
+
+# Início de assinatura: delimitador "-- " ou despedidas comuns em linha própria
+SIGNATURE_PATTERN = re.compile(
+    r'^(?:--\s*$'
+    r'|(?:atenciosamente|att\.?|atte\.?|abraços?|cordialmente|saudações'
+    r'|best regards|regards|kind regards)[,.!]?\s*$'
+    r'|enviado do meu .+$|sent from my .+$)',
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Agradecimento em linha própria: só é despedida quando seguido do nome (senão é o conteúdo)
+THANKS_CLOSING_PATTERN = re.compile(r'^(?:obrigad[oa]|grat[oa])[,.]?\s*$', re.IGNORECASE)
+
+# Linha com o nome de quem assina (poucas palavras, sem pontuação de frase)
+SIGNATURE_NAME_PATTERN = re.compile(r'^[^\W\d_][^\d.!?:]{0,60}$')
+
+# Quebra em frases (mantém a pontuação final)
+SENTENCE_PATTERN = re.compile(r'[^.!?\n]+[.!?]*')
+
+# Quantas linhas finais podem conter a assinatura
+SIGNATURE_MAX_LINES = 8
+
+ELLIPSIS = " [...] "
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa simples de tokens (~4 caracteres por token)"""
+    return len(text) // 4 + 1
+
+
+def strip_quoted_replies(text: str) -> Tuple[str, bool]:
+    """Remove cadeias de resposta citadas/encaminhadas; mantém o original se nada sobrar"""
+    stripped = text
+    match = QUOTE_HEADER_PATTERN.search(stripped)
+    if match:
+        stripped = stripped[:match.start()]
+    stripped = QUOTED_LINE_PATTERN.sub('', stripped).strip()
+    if not stripped:
+        # E-mail só com conteúdo encaminhado: não há corpo novo, usar o texto sem as linhas "> "
+        stripped = QUOTED_LINE_PATTERN.sub('', text).strip() or text.strip()
+    return stripped, stripped != text.strip()
+
+
+def strip_signature(text: str) -> Tuple[str, bool]:
+    """Remove a assinatura quando ela aparece nas últimas linhas do e-mail"""
+    lines = text.split('\n')
+    first_candidate = max(1, len(lines) - SIGNATURE_MAX_LINES)
+    for index in range(first_candidate, len(lines)):
+        line = lines[index].strip()
+        if SIGNATURE_PATTERN.match(line) or (THANKS_CLOSING_PATTERN.match(line)
+                                             and _followed_by_name(lines[index + 1:])):
+            stripped = '\n'.join(lines[:index]).strip()
+            if stripped:
+                return stripped, True
+            break
+    return text, False
+
+
+def _followed_by_name(lines: List[str]) -> bool:
+    """As linhas após a despedida são só o nome (e talvez cargo/empresa)"""
+    rest = [line.strip() for line in lines if line.strip()]
+    return 0 < len(rest) <= 3 and all(SIGNATURE_NAME_PATTERN.match(line) for line in rest)
+
+
+def fit_to_budget(text: str, max_tokens: int, is_informative: Callable[[str], bool]) -> Tuple[str, bool]:
+    """
+    Reduz o texto ao orçamento mantendo as partes mais informativas:
+    começo, final e frases com palavras-chave (ou perguntas), na ordem original
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text, False
+
+    sentences: List[str] = [s.strip() for s in SENTENCE_PATTERN.findall(text) if s.strip()]
+    if not sentences:
+        return text[:max_tokens * 4], True
+
+    max_chars = max_tokens * 4
+    head_chars = int(max_chars * 0.4)
+    tail_chars = int(max_chars * 0.2)
+    selected = set()
+
+    used = 0
+    for i, sentence in enumerate(sentences):
+        if used + len(sentence) > head_chars and selected:
+            break
+        selected.add(i)
+        used += len(sentence) + 1
+
+    tail_used = 0
+    for i in range(len(sentences) - 1, -1, -1):
+        if i in selected:
+            break
+        if tail_used + len(sentences[i]) > tail_chars and tail_used:
+            break
+        selected.add(i)
+        tail_used += len(sentences[i]) + 1
+    used += tail_used
+
+    for i, sentence in enumerate(sentences):
+        if i in selected:
+            continue
+        if used + len(sentence) > max_chars:
+            continue
+        if '?' in sentence or is_informative(sentence):
+            selected.add(i)
+            used += len(sentence) + 1
+
+    parts = []
+    previous = -1
+    for i in sorted(selected):
+        if parts and i != previous + 1:
+            parts.append(ELLIPSIS.strip())
+        parts.append(sentences[i])
+        previous = i
+    budgeted = ' '.join(parts)
+    return budgeted[:max_chars], True
+
+
+def apply_prompt_budget(text: str, max_tokens: int, is_informative: Callable[[str], bool],
+                        strip_quotes: bool = True) -> Tuple[str, Dict]:
+    """
+    Prepara o texto do e-mail para o prompt: remove citações e assinatura e aplica o orçamento
+    Retorna (texto para o prompt, metadados com tamanhos original e enviado)
+    """
+    prompt_text = text.strip()
+    quotes_removed = signature_removed = False
+    if strip_quotes:
+        prompt_text, quotes_removed = strip_quoted_replies(prompt_text)
+        prompt_text, signature_removed = strip_signature(prompt_text)
+    prompt_text, truncated = fit_to_budget(prompt_text, max_tokens, is_informative)
+
+    return prompt_text, {
+        "tamanho_original": len(text),
+        "tamanho_enviado": len(prompt_text),
+        "tokens_estimados_original": estimate_tokens(text),
+        "tokens_estimados_enviados": estimate_tokens(prompt_text),
+        "citacoes_removidas": quotes_removed,
+        "assinatura_removida": signature_removed,
+        "truncado": truncated
+    }
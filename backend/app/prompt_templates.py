@@ -0,0 +1,230 @@
+# app/prompt_templates.py
+import os
+from string import Template
+from typing import Dict, Optional
+from .structured_logging import get_logger
+from .structured_output import CLASSIFICATION_SCHEMA, COMBINED_SCHEMA, BATCH_SCHEMA
+
+logger = get_logger(__name__)
+
+# Versão ativa dos prompts (entra na chave do cache e em detalhes.versao_prompt)
+# Para A/B, rode instâncias com versões diferentes e compare por versao_prompt
+PROMPT_VERSION = os.getenv("PROMPT_VERSION", "5.1")
+
+# Tipos de prompt usados pelo classificador
+CLASSIFICATION = "classificacao"
+REPLY = "resposta"
+COMBINED = "combinado"
+BATCH = "lote"
+REPAIR = "reparo"
+
+# Esquema da saída JSON de cada tipo de prompt (também usado no reparo de respostas inválidas)
+OUTPUT_SCHEMAS = {CLASSIFICATION: CLASSIFICATION_SCHEMA, COMBINED: COMBINED_SCHEMA, BATCH: BATCH_SCHEMA}
+
+CLASSIFICATION_DEFINITIONS = """DEFINIÇÕES PRECISAS:
+
+📧 PRODUTIVO (requer ação/resposta):
+• Solicitações de informação, relatórios, documentos
+• Problemas técnicos que precisam ser resolvidos
+• Pedidos de reunião, aprovação, autorização
+• Perguntas que necessitam resposta
+• Confirmações de recebimento necessárias
+• Cobranças, prazos, urgências
+• Solicitações de suporte ou ajuda
+
+💬 IMPRODUTIVO (cortesia/social):
+• Agradecimentos simples sem solicitação
+• Cumprimentos (aniversário, festas, feriados)
+• Elogios e parabéns
+• Saudações e votos de bem-estar
+• Felicitações sem pedido de resposta
+• Mensagens de motivação"""
+
+CLASSIFICATION_INSTRUCTIONS = """INSTRUÇÕES:
+- Analise o contexto e intenção principal
+- Se há PERGUNTA ou SOLICITAÇÃO = Produtivo
+- Se é apenas CORTESIA/AGRADECIMENTO = Improdutivo
+- Seja preciso na confiança: alta (0.9-1.0) para casos claros, média (0.7-0.8) para ambíguos"""
+
+REPLY_GUIDELINES = """- Se PRODUTIVO: Confirme recebimento e indique próximos passos
+- Se IMPRODUTIVO: Agradeça cordialmente sem prometer ações
+- Máximo 2-3 frases, tom profissional e amigável, em português brasileiro
+- NÃO explique a classificação na resposta sugerida"""
+
+CLASSIFICATION_OUTPUT_FORMAT = """Responda EXATAMENTE neste formato JSON (sem formatação markdown):
+{"categoria": "Produtivo", "confianca": 0.95, "justificativa": "breve explicação do motivo"}"""
+
+COMBINED_OUTPUT_FORMAT = """Além de classificar, escreva uma resposta sugerida para o e-mail:
+""" + REPLY_GUIDELINES + """
+
+Responda EXATAMENTE neste formato JSON (sem formatação markdown):
+{"categoria": "Produtivo", "confianca": 0.95, "justificativa": "breve explicação do motivo", "resposta_sugerida": "texto da resposta"}"""
+
+BATCH_OUTPUT_FORMAT = """Responda EXATAMENTE com um array JSON (sem formatação markdown), um objeto por e-mail, usando o mesmo id:
+[{"id": 0, "categoria": "Produtivo", "confianca": 0.95, "justificativa": "breve explicação do motivo", "resposta_sugerida": "texto da resposta"}]"""
+
+CLASSIFICATION_ROLE = """Você é um especialista em classificação de e-mails corporativos brasileiros."""
+
+NLP_CONTEXT = """INFORMAÇÕES COMPLEMENTARES (análise NLP prévia):
+• Classificação NLP: $nlp_classification (confiança: $nlp_confidence)
+• Raciocínio NLP: $nlp_reasoning
+• Palavras: $word_count
+• Indicadores urgentes: $has_urgent
+• Contém perguntas: $has_questions"""
+
+
+class RenderedPrompt:
+    """Prompt pronto para envio: o template (instrução de sistema) e o conteúdo deste e-mail"""
+
+    def __init__(self, template: "PromptTemplate", text: str):
+        self.template = template
+        self.text = text
+
+    @property
+    def full_text(self) -> str:
+        """Instrução de sistema + conteúdo (para estimar tokens)"""
+        return f"{self.template.system}\n\n{self.text}" if self.template.system else self.text
+
+
+class PromptTemplate:
+    """
+    Prompt versionado: a parte fixa (definições, regras, formato de saída) vira a
+    instrução de sistema do modelo, registrada uma vez; cada chamada envia só os
+    campos do e-mail. Sem system, o prompt inteiro vai no conteúdo (versões antigas)
+    Campos no formato $campo (string.Template: as chaves dos exemplos JSON ficam literais)
+    """
+
+    def __init__(self, kind: str, version: str, user: str, system: Optional[str] = None,
+                 response_schema: Optional[Dict] = None):
+        self.kind = kind
+        self.version = version
+        self.system = system
+        # Esquema da saída JSON (o modelo é criado com response_mime_type + response_schema)
+        self.response_schema = response_schema
+        self._user = Template(user)
+
+    @property
+    def key(self) -> str:
+        return f"{self.kind}@{self.version}"
+
+    def render(self, **fields) -> RenderedPrompt:
+        return RenderedPrompt(self, self._user.substitute(**fields))
+
+
+def _legacy_templates(version: str) -> Dict[str, PromptTemplate]:
+    """Prompts da versão 4.0: tudo no conteúdo de cada chamada (referência para A/B)"""
+    classification = (CLASSIFICATION_ROLE + """
+Analise o e-mail abaixo e classifique-o como "Produtivo" ou "Improdutivo".
+
+""" + NLP_CONTEXT + """
+
+IMPORTANTE: Analise independentemente. Sua decisão pode concordar ou discordar completamente do NLP.
+
+""" + CLASSIFICATION_DEFINITIONS + """
+
+E-MAIL PARA ANÁLISE:
+"$text"
+
+""" + CLASSIFICATION_INSTRUCTIONS + """
+
+""")
+    return {
+        CLASSIFICATION: PromptTemplate(CLASSIFICATION, version, classification + CLASSIFICATION_OUTPUT_FORMAT),
+        COMBINED: PromptTemplate(COMBINED, version, classification + COMBINED_OUTPUT_FORMAT),
+        REPLY: PromptTemplate(REPLY, version, """Gere uma resposta profissional em português brasileiro para este e-mail classificado como "$categoria".
+
+E-mail original: "$text"
+
+DIRETRIZES:
+- Se PRODUTIVO: Confirme recebimento e indique próximos passos
+- Se IMPRODUTIVO: Agradeça cordialmente sem prometer ações
+- Máximo 2-3 frases
+- Tom profissional e amigável
+- Use português brasileiro
+- NÃO explique a classificação
+
+Resposta:"""),
+        BATCH: PromptTemplate(BATCH, version, CLASSIFICATION_ROLE + """
+Classifique CADA e-mail abaixo como "Produtivo" ou "Improdutivo" e escreva uma resposta sugerida para cada um.
+A dica NLP é apenas complementar: analise cada e-mail independentemente.
+
+""" + CLASSIFICATION_DEFINITIONS + """
+
+""" + CLASSIFICATION_INSTRUCTIONS + """
+
+RESPOSTA SUGERIDA:
+""" + REPLY_GUIDELINES + """
+
+E-MAILS PARA ANÁLISE:
+$emails
+
+""" + BATCH_OUTPUT_FORMAT),
+    }
+
+
+def _system_instruction_templates(version: str) -> Dict[str, PromptTemplate]:
+    """Prompts com a parte fixa na instrução de sistema (conteúdo por chamada = dados do e-mail)"""
+    classification_system = "\n\n".join([
+        CLASSIFICATION_ROLE + '\nClassifique o e-mail recebido como "Produtivo" ou "Improdutivo".',
+        "A análise NLP prévia enviada junto com o e-mail é apenas complementar: analise independentemente, "
+        "sua decisão pode concordar ou discordar completamente do NLP.",
+        CLASSIFICATION_DEFINITIONS,
+        CLASSIFICATION_INSTRUCTIONS,
+    ])
+    email_with_context = NLP_CONTEXT + '\n\nE-MAIL PARA ANÁLISE:\n"$text"'
+    return {
+        CLASSIFICATION: PromptTemplate(CLASSIFICATION, version, email_with_context,
+                                       system=classification_system + "\n\n" + CLASSIFICATION_OUTPUT_FORMAT),
+        COMBINED: PromptTemplate(COMBINED, version, email_with_context,
+                                 system=classification_system + "\n\n" + COMBINED_OUTPUT_FORMAT),
+        REPLY: PromptTemplate(REPLY, version, 'Classificação: "$categoria"\n\nE-mail original: "$text"', system="\n\n".join([
+            "Gere uma resposta profissional em português brasileiro para o e-mail recebido, "
+            "de acordo com a classificação informada.",
+            "DIRETRIZES:\n" + REPLY_GUIDELINES,
+            "Responda apenas com o texto da resposta.",
+        ])),
+        BATCH: PromptTemplate(BATCH, version, "E-MAILS PARA ANÁLISE:\n$emails", system="\n\n".join([
+            CLASSIFICATION_ROLE + '\nClassifique CADA e-mail recebido como "Produtivo" ou "Improdutivo" '
+            "e escreva uma resposta sugerida para cada um.",
+            "A dica NLP de cada e-mail é apenas complementar: analise cada e-mail independentemente.",
+            CLASSIFICATION_DEFINITIONS,
+            CLASSIFICATION_INSTRUCTIONS,
+            "RESPOSTA SUGERIDA:\n" + REPLY_GUIDELINES,
+            BATCH_OUTPUT_FORMAT,
+        ])),
+    }
+
+
+def _structured_output_templates(version: str) -> Dict[str, PromptTemplate]:
+    """Prompts da 5.0 com saída JSON restrita a um esquema (sem cercas markdown nem texto extra)"""
+    templates = _system_instruction_templates(version)
+    for kind, schema in OUTPUT_SCHEMAS.items():
+        template = templates[kind]
+        templates[kind] = PromptTemplate(kind, version, template._user.template,
+                                         system=template.system, response_schema=schema)
+    return templates
+
+
+# Reparo de JSON inválido (mesmo texto em todas as versões; o esquema vem do prompt original)
+REPAIR_TEMPLATE = PromptTemplate(REPAIR, "1", "$saida", system=(
+    "Você recebe a saída de outro modelo que deveria ser JSON, mas está malformada ou incompleta. "
+    "Converta-a para JSON válido no esquema pedido, preservando os valores presentes. "
+    "Não reclassifique nem reescreva o conteúdo; para campos ausentes use valores neutros."
+))
+
+# Versões registradas; uma versão publicada não muda (alterações entram como versão nova)
+PROMPT_SETS: Dict[str, Dict[str, PromptTemplate]] = {
+    "4.0": _legacy_templates("4.0"),
+    "5.0": _system_instruction_templates("5.0"),
+    "5.1": _structured_output_templates("5.1"),
+}
+LATEST_PROMPT_VERSION = "5.1"
+
+
+def get_prompt_set(version: str = PROMPT_VERSION) -> Dict[str, PromptTemplate]:
+    """Templates da versão pedida (versão desconhecida: a mais recente, com aviso)"""
+    if version not in PROMPT_SETS:
+        logger.warning("Versão de prompt desconhecida, usando a mais recente",
+                       versao=version, disponiveis=sorted(PROMPT_SETS))
+        version = LATEST_PROMPT_VERSION
+    return PROMPT_SETS[version]
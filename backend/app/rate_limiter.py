@@ -0,0 +1,307 @@
+# app/rate_limiter.py
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+import contextvars
+from typing import Dict, Optional
+from .structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Faixas de prioridade: requisições interativas (interface) passam à frente do tráfego em lote
+LANE_INTERACTIVE = "interativo"
+LANE_BULK = "lote"
+LANE_PRIORITY = {LANE_INTERACTIVE: 0, LANE_BULK: 1}
+
+# Faixa da requisição corrente (as tarefas criadas herdam o valor)
+current_lane: contextvars.ContextVar = contextvars.ContextVar("gemini_lane", default=LANE_INTERACTIVE)
+
+# Espera após um erro ao consultar a cota (ex.: SQLite compartilhado ocupado)
+SCHEDULER_ERROR_BACKOFF = 0.5
+
+
+class RateLimiterError(RuntimeError):
+    """A chamada enfileirada não pôde ser liberada (agendador de outro event loop)"""
+
+
+class TokenBucket:
+    """Balde de fichas com reposição contínua (capacidade = cota por minuto)"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Segundos até haver `amount` fichas (pedidos maiores que a capacidade esperam o balde cheio)"""
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+def _set_exception_if_pending(future: asyncio.Future, error: Exception):
+    if not future.done():
+        future.set_exception(error)
+
+
+class _Waiter:
+    __slots__ = ("tokens", "lane", "future")
+
+    def __init__(self, tokens: int, lane: str, future: asyncio.Future):
+        self.tokens = tokens
+        self.lane = lane
+        self.future = future
+
+
+class GeminiRateLimiter:
+    """
+    Agendador das chamadas ao Gemini respeitando as cotas de requisições (RPM)
+    e de tokens estimados (TPM) por minuto
+    - com cota disponível e fila vazia a chamada segue imediatamente
+    - sem cota, a chamada espera na fila (por prioridade de faixa, depois por ordem de chegada)
+    Cota 0 desativa o respectivo limite. Com `store` (SharedStateStore) os baldes ficam
+    no SQLite e a cota é dividida por todos os workers da máquina
+    """
+
+    def __init__(self, rpm: int, tpm: int, store=None):
+        self._lock = threading.Lock()
+        self.rpm = rpm
+        self.tpm = tpm
+        self._store = store
+        self._requests = TokenBucket(rpm) if rpm > 0 else None
+        self._tokens = TokenBucket(tpm) if tpm > 0 else None
+        self._heap = []
+        self._seq = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._scheduler: Optional[asyncio.Task] = None
+        self.depth = {lane: 0 for lane in LANE_PRIORITY}
+        self.queued_total = {lane: 0 for lane in LANE_PRIORITY}
+        self.wait_total = {lane: 0.0 for lane in LANE_PRIORITY}
+        self.wait_max = {lane: 0.0 for lane in LANE_PRIORITY}
+        self.throttled = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._requests is not None or self._tokens is not None
+
+    def _try_consume(self, tokens: int) -> float:
+        """Consome 1 requisição + tokens se houver cota; senão retorna a espera necessária"""
+        if self._store is not None:
+            demands = {}
+            if self._requests is not None:
+                demands["gemini_requisicoes"] = (self._requests.capacity, 1)
+            if self._tokens is not None:
+                demands["gemini_tokens"] = (self._tokens.capacity, tokens)
+            return self._store.bucket_try_consume(demands)
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self._requests is not None:
+                self._requests.refill(now)
+                wait = max(wait, self._requests.wait_time(1))
+            if self._tokens is not None:
+                self._tokens.refill(now)
+                wait = max(wait, self._tokens.wait_time(tokens))
+            if wait > 0:
+                return wait
+            if self._requests is not None:
+                self._requests.tokens -= 1
+            if self._tokens is not None:
+                self._tokens.tokens -= min(tokens, self._tokens.capacity)
+            return 0.0
+
+    async def _off_loop(self, func, *args):
+        """
+        Executa uma operação nos baldes sem bloquear o event loop: com o SQLite
+        compartilhado (BEGIN IMMEDIATE pode esperar outros workers) roda em thread
+        """
+        if self._store is not None:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    def _record_wait(self, lane: str, waited: float):
+        with self._lock:
+            self.wait_total[lane] += waited
+            self.wait_max[lane] = max(self.wait_max[lane], waited)
+
+    async def acquire(self, tokens: int, lane: Optional[str] = None) -> float:
+        """Aguarda cota para uma chamada com `tokens` estimados; retorna o tempo de espera"""
+        if not self.enabled:
+            return 0.0
+        lane = lane if lane in LANE_PRIORITY else current_lane.get()
+        loop = asyncio.get_running_loop()
+        self._ensure_scheduler(loop)
+        if not self._heap and await self._off_loop(self._try_consume, tokens) == 0:
+            return 0.0
+
+        waiter = _Waiter(tokens, lane, loop.create_future())
+        heapq.heappush(self._heap, (LANE_PRIORITY[lane], next(self._seq), waiter))
+        self.depth[lane] += 1
+        self.queued_total[lane] += 1
+        self._wakeup.set()
+        start = time.monotonic()
+        await waiter.future
+        waited = time.monotonic() - start
+        self._record_wait(lane, waited)
+        return waited
+
+    def acquire_blocking(self, tokens: int) -> float:
+        """Versão síncrona (bloqueia a thread; não participa da fila por prioridade)"""
+        if not self.enabled:
+            return 0.0
+        start = time.monotonic()
+        while True:
+            wait = self._try_consume(tokens)
+            if wait <= 0:
+                return time.monotonic() - start
+            time.sleep(wait)
+
+    def settle(self, estimated: int, actual: Optional[int]):
+        """Corrige o balde de tokens com o uso real informado pela API"""
+        if self._tokens is None or not actual:
+            return
+        delta = min(estimated, self._tokens.capacity) - actual
+        if self._store is not None:
+            self._store.bucket_update("gemini_tokens", self._tokens.capacity, delta=delta)
+            return
+        with self._lock:
+            self._tokens.tokens += delta
+
+    async def settle_async(self, estimated: int, actual: Optional[int]):
+        """settle sem bloquear o event loop"""
+        await self._off_loop(self.settle, estimated, actual)
+
+    def _refund(self, tokens: int):
+        """Devolve a cota de uma chamada liberada mas cancelada antes de usá-la"""
+        if self._store is not None:
+            if self._requests is not None:
+                self._store.bucket_update("gemini_requisicoes", self._requests.capacity, delta=1)
+            if self._tokens is not None:
+                self._store.bucket_update("gemini_tokens", self._tokens.capacity,
+                                          delta=min(tokens, self._tokens.capacity))
+            return
+        with self._lock:
+            if self._requests is not None:
+                self._requests.tokens += 1
+            if self._tokens is not None:
+                self._tokens.tokens += min(tokens, self._tokens.capacity)
+
+    def throttle(self):
+        """A API respondeu 429: zera a cota de requisições para a fila esperar a reposição"""
+        if self._requests is None:
+            return
+        with self._lock:
+            self.throttled += 1
+            if self._store is None:
+                self._requests.tokens = min(self._requests.tokens, 0.0)
+                return
+        self._store.bucket_update("gemini_requisicoes", self._requests.capacity, at_most=0.0)
+
+    def _ensure_scheduler(self, loop: asyncio.AbstractEventLoop):
+        """
+        Agendador por event loop. Se o agendador parou, um novo assume a mesma fila;
+        se o loop mudou, as chamadas presas ao loop anterior recebem erro em vez de
+        ficarem esperando para sempre
+        """
+        if self._loop is loop and self._scheduler is not None and not self._scheduler.done():
+            return
+        if self._loop is not loop:
+            self._fail_pending(RateLimiterError("Agendador do limitador de taxa reiniciado em outro event loop"))
+            self._loop = loop
+        self._wakeup = asyncio.Event()
+        if self._heap:
+            self._wakeup.set()
+        self._scheduler = loop.create_task(self._run_scheduler())
+
+    def _fail_pending(self, error: Exception):
+        """Descarta a fila atual, sinalizando erro a cada chamada ainda à espera"""
+        for _, _, waiter in self._heap:
+            future = waiter.future
+            if future.done():
+                continue
+            future_loop = future.get_loop()
+            if not future_loop.is_closed():
+                future_loop.call_soon_threadsafe(_set_exception_if_pending, future, error)
+        self._heap = []
+        self.depth = {lane: 0 for lane in LANE_PRIORITY}
+
+    async def _run_scheduler(self):
+        """Libera o primeiro da fila assim que houver cota para ele"""
+        while True:
+            while self._heap and self._heap[0][2].future.done():
+                # Chamada cancelada enquanto esperava
+                self.depth[heapq.heappop(self._heap)[2].lane] -= 1
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            waiter = self._heap[0][2]
+            try:
+                wait = await self._off_loop(self._try_consume, waiter.tokens)
+            except Exception as e:
+                # Falha ao consultar a cota: o agendador continua e tenta de novo em seguida
+                logger.error("Erro ao consultar a cota do Gemini", erro=str(e))
+                wait = SCHEDULER_ERROR_BACKOFF
+            else:
+                if wait <= 0:
+                    heapq.heappop(self._heap)
+                    self.depth[waiter.lane] -= 1
+                    if waiter.future.done():
+                        # Cancelada durante a consulta: devolve a cota consumida
+                        await self._off_loop(self._refund, waiter.tokens)
+                    else:
+                        waiter.future.set_result(None)
+                    continue
+            # Acorda antes se chegar uma chamada de maior prioridade
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _available(self) -> Dict:
+        """Fichas disponíveis agora em cada balde"""
+        available = {}
+        if self._store is not None:
+            if self._requests is not None:
+                available["requisicoes"] = round(self._store.bucket_level("gemini_requisicoes", self._requests.capacity), 1)
+            if self._tokens is not None:
+                available["tokens"] = round(self._store.bucket_level("gemini_tokens", self._tokens.capacity))
+            return available
+        with self._lock:
+            now = time.monotonic()
+            if self._requests is not None:
+                self._requests.refill(now)
+                available["requisicoes"] = round(self._requests.tokens, 1)
+            if self._tokens is not None:
+                self._tokens.refill(now)
+                available["tokens"] = round(self._tokens.tokens)
+        return available
+
+    def stats(self) -> Dict:
+        available = self._available()
+        with self._lock:
+            return {
+                "ativo": self.enabled,
+                "compartilhado": self._store is not None,
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "disponivel": available,
+                "fila": dict(self.depth),
+                "enfileiradas": dict(self.queued_total),
+                "espera_media": {
+                    lane: round(self.wait_total[lane] / self.queued_total[lane], 3) if self.queued_total[lane] else 0.0
+                    for lane in LANE_PRIORITY
+                },
+                "espera_maxima": {lane: round(value, 3) for lane, value in self.wait_max.items()},
+                "limitacoes_429": self.throttled
+            }
@@ -0,0 +1,172 @@
+# app/reply_cache.py
+import os
+import re
+import zlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from .structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# NumPy é opcional: sem ele o reaproveitamento de respostas fica desativado
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Reaproveitamento de respostas sugeridas entre emails quase idênticos (mesma categoria)
+# Desativado por padrão: a resposta servida foi escrita para outro remetente
+REPLY_CACHE_ENABLED = os.getenv("REPLY_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+# Similaridade de Jaccard estimada (MinHash) mínima para servir a resposta guardada
+REPLY_CACHE_THRESHOLD = float(os.getenv("REPLY_CACHE_THRESHOLD", "0.8"))
+# Emails indexados por categoria (despejo LRU)
+REPLY_CACHE_MAX_ENTRIES = int(os.getenv("REPLY_CACHE_MAX_ENTRIES", "500"))
+REPLY_CACHE_PERMUTATIONS = 64
+
+# Números (protocolos, datas, valores) identificam o caso de um remetente: emails ou
+# respostas com dígitos não entram no índice nem recebem resposta reaproveitada
+DIGIT_PATTERN = re.compile(r"\d")
+
+
+def contains_digits(*texts: Optional[str]) -> bool:
+    """True se algum dos textos tem dígitos"""
+    return any(text and DIGIT_PATTERN.search(text) for text in texts)
+
+
+def shingles(words: Iterable[str]) -> List[str]:
+    """Unigramas e bigramas das palavras significativas (tokens do EmailNLPPreprocessor)"""
+    words = list(words)
+    return list(set(words + [f"{a} {b}" for a, b in zip(words, words[1:])]))
+
+
+class MinHasher:
+    """Assinaturas MinHash com hashing multiplicativo (a·x + b) >> 32 em uint64, vetorizado no NumPy"""
+
+    def __init__(self, num_perm: int = REPLY_CACHE_PERMUTATIONS, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    def signature(self, items: List[str]):
+        base = np.fromiter((zlib.crc32(item.encode("utf-8")) for item in items), dtype=np.uint64, count=len(items))
+        # Overflow do uint64 é intencional (aritmética módulo 2^64)
+        with np.errstate(over="ignore"):
+            hashed = (np.outer(base, self._a) + self._b) >> np.uint64(32)
+        return hashed.min(axis=0).astype(np.uint32)
+
+
+class _CategoryIndex:
+    """Assinaturas de uma categoria em matriz fixa; as linhas são reaproveitadas na ordem LRU"""
+
+    def __init__(self, capacity: int, num_perm: int):
+        self.capacity = capacity
+        self.signatures = np.zeros((capacity, num_perm), dtype=np.uint32)
+        self.replies: List[Optional[str]] = [None] * capacity
+        self.lru: "OrderedDict[int, None]" = OrderedDict()
+
+    def best(self, signature) -> Tuple[Optional[int], float]:
+        """Linha mais parecida e similaridade estimada (fração de posições iguais)"""
+        if not self.lru:
+            return None, 0.0
+        used = len(self.lru)
+        scores = (self.signatures[:used] == signature).mean(axis=1)
+        slot = int(scores.argmax())
+        return slot, float(scores[slot])
+
+    def touch(self, slot: int):
+        self.lru.move_to_end(slot)
+
+    def put(self, signature, reply: str, slot: Optional[int] = None) -> bool:
+        """Grava na linha indicada, numa livre ou na menos usada; retorna True se houve despejo"""
+        evicted = False
+        if slot is None:
+            if len(self.lru) < self.capacity:
+                slot = len(self.lru)
+            else:
+                slot, _ = self.lru.popitem(last=False)
+                evicted = True
+        self.signatures[slot] = signature
+        self.replies[slot] = reply
+        self.lru[slot] = None
+        self.lru.move_to_end(slot)
+        return evicted
+
+
+class ReplyCache:
+    """
+    Índice de emails já respondidos pelo Gemini, por categoria
+    Um email novo recebe a resposta guardada do vizinho mais parecido quando a
+    similaridade (MinHash sobre unigramas e bigramas) atinge o limite
+    """
+
+    def __init__(self, threshold: float = REPLY_CACHE_THRESHOLD, max_entries: int = REPLY_CACHE_MAX_ENTRIES,
+                 num_perm: int = REPLY_CACHE_PERMUTATIONS):
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self._hasher = MinHasher(num_perm)
+        self._indexes: Dict[str, _CategoryIndex] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _index(self, categoria: str) -> _CategoryIndex:
+        index = self._indexes.get(categoria)
+        if index is None:
+            index = self._indexes[categoria] = _CategoryIndex(self.max_entries, self._hasher.num_perm)
+        return index
+
+    def lookup(self, words: List[str], categoria: str) -> Tuple[Optional[str], Optional[float]]:
+        """(resposta guardada ou None, melhor similaridade encontrada ou None se o email não tem palavras)"""
+        items = shingles(words)
+        if not items or contains_digits(*words):
+            return None, None
+        signature = self._hasher.signature(items)
+        with self._lock:
+            index = self._index(categoria)
+            slot, score = index.best(signature)
+            if slot is not None and score >= self.threshold:
+                index.touch(slot)
+                self.hits += 1
+                return index.replies[slot], round(score, 3)
+            self.misses += 1
+        return None, round(score, 3)
+
+    def add(self, words: List[str], categoria: str, reply: str):
+        """Indexa uma resposta nova; um email quase igual já indexado tem a resposta substituída"""
+        items = shingles(words)
+        if not items or not reply or contains_digits(reply, *words):
+            return
+        signature = self._hasher.signature(items)
+        with self._lock:
+            index = self._index(categoria)
+            slot, score = index.best(signature)
+            if index.put(signature, reply, slot if score >= self.threshold else None):
+                self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "ativo": True,
+                "limite_similaridade": self.threshold,
+                "max_entradas_por_categoria": self.max_entries,
+                "entradas": {categoria: len(index.lru) for categoria, index in self._indexes.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0
+            }
+
+
+def create_reply_cache() -> Optional[ReplyCache]:
+    """Cria o índice conforme REPLY_CACHE_* (None se desativado ou sem NumPy)"""
+    if not REPLY_CACHE_ENABLED:
+        return None
+    if not NUMPY_AVAILABLE:
+        logger.warning("NumPy não instalado, reaproveitamento de respostas desativado")
+        return None
+    return ReplyCache()
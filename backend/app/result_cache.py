@@ -0,0 +1,236 @@
+# app/result_cache.py
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+from .metrics import metrics
+from .shared_state import SHARED_STATE_PATH
+from .structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class MemoryCacheBackend:
+    """
+    Backend em memória (por processo) com TTL e despejo LRU
+    """
+
+    # Operações rápidas: podem rodar direto no event loop
+    blocking = False
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCacheBackend:
+    """
+    Backend em disco (SQLite em modo WAL) compartilhável entre workers da mesma máquina
+    """
+
+    # Pode esperar o lock de outro worker (timeout de 5 s): fora do event loop
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: float):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS result_cache (
+                   key TEXT PRIMARY KEY,
+                   value TEXT NOT NULL,
+                   expires_at REAL NOT NULL,
+                   last_access REAL NOT NULL
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_result_cache_access ON result_cache(last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM result_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at < now:
+                self._conn.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.expirations += 1
+                return None
+            self._conn.execute("UPDATE result_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(value)
+
+    def set(self, key: str, value: Dict):
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO result_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, payload, now + self.ttl_seconds, now),
+            )
+            # Remover expirados e, se ainda acima do limite, os menos usados recentemente
+            expired = self._conn.execute("DELETE FROM result_cache WHERE expires_at < ?", (now,)).rowcount
+            self.expirations += max(expired, 0)
+            count = self._conn.execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+            excess = count - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM result_cache WHERE key IN "
+                    "(SELECT key FROM result_cache ORDER BY last_access ASC LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+            self._conn.commit()
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM result_cache")
+            self._conn.commit()
+
+
+class ResultCache:
+    """
+    Cache de resultados endereçado por conteúdo
+    Chave = hash(texto normalizado + modelo + versão do prompt)
+    """
+
+    def __init__(self, backend, backend_name: str = "memory"):
+        self.backend = backend
+        self.backend_name = backend_name
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(normalized_text: str, model_name: str, prompt_version: str) -> str:
+        """Gera a chave do cache a partir do texto já normalizado"""
+        raw = f"{model_name}\x00{prompt_version}\x00{normalized_text}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning("Erro ao ler cache de resultados", erro=str(e))
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        # Também nas métricas, somadas entre workers no modo multi-worker
+        metrics.inc("cache_resultados_total", {"resultado": "miss" if value is None else "hit"})
+        return value
+
+    def set(self, key: str, value: Dict):
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            logger.warning("Erro ao gravar cache de resultados", erro=str(e))
+
+    async def get_async(self, key: str) -> Optional[Dict]:
+        """get sem bloquear o event loop (backends em disco rodam em thread)"""
+        if self.backend.blocking:
+            return await asyncio.to_thread(self.get, key)
+        return self.get(key)
+
+    async def set_async(self, key: str, value: Dict):
+        """set sem bloquear o event loop (backends em disco rodam em thread)"""
+        if self.backend.blocking:
+            await asyncio.to_thread(self.set, key, value)
+        else:
+            self.set(key, value)
+
+    def stats(self) -> Dict:
+        """Contadores expostos em /system_info"""
+        total = self.hits + self.misses
+        try:
+            size = self.backend.size()
+        except Exception:
+            size = None
+        return {
+            "backend": self.backend_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.backend.evictions,
+            "expirations": self.backend.expirations,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entradas": size,
+            "max_entradas": self.backend.max_entries,
+            "ttl_segundos": self.backend.ttl_seconds
+        }
+
+
+def create_result_cache() -> Optional[ResultCache]:
+    """
+    Cria o cache conforme variáveis de ambiente
+    RESULT_CACHE_BACKEND: memory | sqlite | off
+    Padrão: sqlite no arquivo compartilhado quando SHARED_STATE_PATH está definido
+    (multi-worker), senão memory
+    """
+    backend_name = os.getenv("RESULT_CACHE_BACKEND", "sqlite" if SHARED_STATE_PATH else "memory").lower()
+    ttl_seconds = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+    max_entries = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1000"))
+
+    if backend_name in ("off", "none", "disabled", ""):
+        return None
+    if backend_name == "sqlite":
+        path = os.getenv("RESULT_CACHE_PATH", SHARED_STATE_PATH or "result_cache.sqlite3")
+        try:
+            return ResultCache(SQLiteCacheBackend(path, max_entries, ttl_seconds), "sqlite")
+        except Exception as e:
+            logger.warning("Cache SQLite indisponível, usando cache em memória", erro=str(e))
+    return ResultCache(MemoryCacheBackend(max_entries, ttl_seconds), "memory")
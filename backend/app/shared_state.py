@@ -0,0 +1,135 @@
+# app/shared_state.py
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Arquivo SQLite (modo WAL) compartilhado pelos workers da mesma máquina
+# Vazio = estado apenas em memória, por processo (modo de um worker)
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "")
+
+
+class SharedStateStore:
+    """
+    Estado entre processos em SQLite/WAL:
+    - baldes de fichas do limitador de taxa (cota do Gemini única para todos os workers)
+    - retrato das métricas de cada worker (agregado em /metrics)
+    Cada operação é uma transação curta (BEGIN IMMEDIATE serializa os workers)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS rate_buckets (
+                   name TEXT PRIMARY KEY,
+                   tokens REAL NOT NULL,
+                   updated REAL NOT NULL
+               )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS worker_metrics (
+                   worker TEXT PRIMARY KEY,
+                   data TEXT NOT NULL,
+                   updated REAL NOT NULL
+               )"""
+        )
+
+    def _refilled(self, name: str, capacity: float, now: float) -> float:
+        """Fichas atuais do balde após a reposição (cria o balde cheio); chamado dentro da transação"""
+        row = self._conn.execute("SELECT tokens, updated FROM rate_buckets WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return capacity
+        tokens, updated = row
+        return min(capacity, tokens + max(0.0, now - updated) * capacity / 60.0)
+
+    def _write_bucket(self, name: str, tokens: float, now: float):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO rate_buckets (name, tokens, updated) VALUES (?, ?, ?)", (name, tokens, now)
+        )
+
+    def bucket_try_consume(self, demands: Dict[str, Tuple[float, float]]) -> float:
+        """
+        demands: {balde: (capacidade por minuto, quantidade)}
+        Consome de todos os baldes se houver fichas; senão retorna a espera necessária
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                levels = {name: self._refilled(name, capacity, now) for name, (capacity, _) in demands.items()}
+                wait = 0.0
+                for name, (capacity, amount) in demands.items():
+                    amount = min(amount, capacity)
+                    if levels[name] < amount:
+                        wait = max(wait, (amount - levels[name]) / (capacity / 60.0))
+                for name, (capacity, amount) in demands.items():
+                    remaining = levels[name] if wait > 0 else levels[name] - min(amount, capacity)
+                    self._write_bucket(name, remaining, now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    def bucket_update(self, name: str, capacity: float, delta: float = 0.0, at_most: Optional[float] = None):
+        """Soma delta às fichas do balde e/ou limita o nível a at_most"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                tokens = self._refilled(name, capacity, now) + delta
+                if at_most is not None:
+                    tokens = min(tokens, at_most)
+                self._write_bucket(name, tokens, now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def bucket_level(self, name: str, capacity: float) -> float:
+        with self._lock:
+            return self._refilled(name, capacity, time.time())
+
+    def save_worker_metrics(self, worker: str, data: Dict):
+        payload = json.dumps(data)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO worker_metrics (worker, data, updated) VALUES (?, ?, ?)",
+                (worker, payload, time.time()),
+            )
+
+    def load_worker_metrics(self) -> List[Tuple[str, Dict, float]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT worker, data, updated FROM worker_metrics").fetchall()
+        return [(worker, json.loads(data), updated) for worker, data, updated in rows]
+
+    def reset(self):
+        """Limpa métricas e baldes de execuções anteriores (chamado pelo processo mestre ao iniciar)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM worker_metrics")
+            self._conn.execute("DELETE FROM rate_buckets")
+
+
+_store: Optional[SharedStateStore] = None
+_store_lock = threading.Lock()
+
+
+def get_shared_store() -> Optional[SharedStateStore]:
+    """Store compartilhado do processo (None quando SHARED_STATE_PATH não está definido)"""
+    global _store
+    if not SHARED_STATE_PATH:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SharedStateStore(SHARED_STATE_PATH)
+    return _store
@@ -0,0 +1,184 @@
+# app/structured_logging.py
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import hashlib
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+from .metrics import metrics
+
+# Nível mínimo registrado (DEBUG, INFO, WARNING, ERROR)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Formato de saída: "json" (uma linha por evento) ou "text" (legível no terminal)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Amostragem por nível, ex.: "DEBUG:0.01,INFO:0.1" (níveis omitidos registram tudo)
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+# Caracteres do corpo do e-mail mantidos nos logs (0 = só tamanho e hash)
+LOG_BODY_CHARS = int(os.getenv("LOG_BODY_CHARS", "0"))
+# Eventos aguardando escrita; com a fila cheia novos eventos são descartados
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+ROOT_LOGGER = "app"
+
+LEVEL_ICONS = {"DEBUG": "🔎", "INFO": "✅", "WARNING": "⚠️", "ERROR": "❌", "CRITICAL": "❌"}
+
+_configured = False
+_configure_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+
+
+def redact_text(text: Optional[str], keep_chars: Optional[int] = None) -> Optional[Dict]:
+    """
+    Representação segura do texto de um e-mail para os logs: tamanho e hash
+    (para correlacionar repetições) e, se configurado, apenas o começo do texto
+    """
+    if text is None:
+        return None
+    keep_chars = LOG_BODY_CHARS if keep_chars is None else keep_chars
+    redacted = {
+        "caracteres": len(text),
+        "sha256": hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()[:12]
+    }
+    if keep_chars > 0:
+        redacted["trecho"] = text[:keep_chars] + ("…" if len(text) > keep_chars else "")
+    return redacted
+
+
+def parse_sampling(spec: str) -> Dict[int, float]:
+    """Converte "DEBUG:0.01,INFO:0.5" em {nível: taxa}"""
+    rates = {}
+    for item in spec.split(","):
+        if ":" not in item:
+            continue
+        name, rate = item.split(":", 1)
+        level = logging.getLevelName(name.strip().upper())
+        if isinstance(level, int):
+            rates[level] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Mantém só uma fração dos eventos de cada nível (avaliado antes de enfileirar)"""
+
+    def __init__(self, rates: Dict[int, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler que descarta eventos quando a fila está cheia, sem bloquear a requisição"""
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("logs_descartados_total", {"nivel": record.levelname})
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # A formatação fica na thread do listener; aqui só congelamos a exceção
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por evento: horário, nível, logger, mensagem e campos"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensagem": record.getMessage()
+        }
+        entry.update(getattr(record, "campos", None) or {})
+        if record.exc_text:
+            entry["excecao"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato legível: ícone do nível, mensagem e campos chave=valor"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "campos", None) or {}
+        parts = [f"{LEVEL_ICONS.get(record.levelname, '')} {record.getMessage()}"]
+        parts.extend(f"{key}={json.dumps(value, ensure_ascii=False, default=str)}" for key, value in fields.items())
+        line = " | ".join(parts)
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """
+    Logger com campos nomeados:
+        logger.info("Decisão", metodo="gemini", confianca=0.9)
+    Os campos viram chaves no JSON (ou chave=valor no formato texto)
+    """
+
+    RESERVED = ("exc_info", "stack_info", "stacklevel", "extra")
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in self.RESERVED}
+        extra = dict(kwargs.get("extra") or {})
+        extra["campos"] = fields
+        kwargs["extra"] = extra
+        return msg, kwargs
+
+
+def configure_logging():
+    """
+    Instala (uma vez) o handler com fila no logger "app": as chamadas só enfileiram
+    e a escrita em stderr acontece numa thread separada
+    """
+    global _configured, _listener
+    if _configured:
+        return
+    with _configure_lock:
+        if _configured:
+            return
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+
+        log_queue = queue.Queue(maxsize=max(1, LOG_QUEUE_SIZE))
+        queue_handler = DroppingQueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter(parse_sampling(LOG_SAMPLING)))
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(queue_handler)
+        root.propagate = False
+
+        _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        _configured = True
+
+
+def shutdown_logging():
+    """Escreve os eventos pendentes e encerra a thread de escrita"""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """Logger estruturado sob o namespace "app" (configura o logging na primeira chamada)"""
+    configure_logging()
+    if name != ROOT_LOGGER and not name.startswith(ROOT_LOGGER + "."):
+        name = f"{ROOT_LOGGER}.{name}"
+    return StructuredLogger(logging.getLogger(name), {})
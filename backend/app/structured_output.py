@@ -0,0 +1,182 @@
+# app/structured_output.py
+import re
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# Esquemas de saída do Gemini (subconjunto OpenAPI aceito em response_schema)
+CLASSIFICATION_FIELDS = {
+    "categoria": {"type": "string", "enum": ["Produtivo", "Improdutivo"]},
+    "confianca": {"type": "number"},
+    "justificativa": {"type": "string"},
+}
+CLASSIFICATION_SCHEMA = {
+    "type": "object",
+    "properties": CLASSIFICATION_FIELDS,
+    "required": ["categoria", "confianca", "justificativa"],
+}
+COMBINED_SCHEMA = {
+    "type": "object",
+    "properties": {**CLASSIFICATION_FIELDS, "resposta_sugerida": {"type": "string"}},
+    "required": ["categoria", "confianca", "justificativa", "resposta_sugerida"],
+}
+BATCH_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"id": {"type": "integer"}, **COMBINED_SCHEMA["properties"]},
+        "required": ["id"] + COMBINED_SCHEMA["required"],
+    },
+}
+
+# Como a saída foi lida (rótulo do contador gemini_json_total)
+PARSE_DIRECT = "direto"
+PARSE_TOLERANT = "tolerante"
+PARSE_PARTIAL = "parcial"
+PARSE_FAILED = "falha"
+
+TRAILING_COMMA_PATTERN = re.compile(r',(\s*[}\]])')
+CLOSERS = {"{": "}", "[": "]"}
+
+
+class JsonStreamParser:
+    """
+    Leitor incremental do primeiro valor JSON (objeto ou array) em meio a texto:
+    ignora cercas markdown e comentários antes/depois, acompanha aninhamento e strings
+    a cada trecho recebido (feed) e, se a saída foi truncada, consegue fechar o valor
+    """
+
+    def __init__(self, opener: str = "{"):
+        self.opener = opener
+        self.done = False
+        self._chars: List[str] = []
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        # Posição da aspa que abriu a string corrente (para descartá-la se a saída for cortada)
+        self._string_start = 0
+        # Em arrays: fim do último elemento completo (para salvar saídas truncadas)
+        self._last_item_end = 0
+
+    def feed(self, chunk: str):
+        for char in chunk:
+            if self.done:
+                return
+            if not self._stack:
+                if char == self.opener:
+                    self._chars.append(char)
+                    self._stack.append(CLOSERS[char])
+                continue
+            self._chars.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+                self._string_start = len(self._chars) - 1
+            elif char in CLOSERS:
+                self._stack.append(CLOSERS[char])
+            elif char in "}]" and char == self._stack[-1]:
+                self._stack.pop()
+                if len(self._stack) == 1:
+                    self._last_item_end = len(self._chars)
+                elif not self._stack:
+                    self.done = True
+
+    def text(self) -> str:
+        return "".join(self._chars)
+
+    def closed_text(self) -> Optional[str]:
+        """
+        Valor truncado fechado: arrays ficam com os elementos completos; objetos, com os campos completos
+        (uma string cortada no meio é descartada com a sua chave, nunca fechada)
+        """
+        if not self._chars:
+            return None
+        if self.opener == "[":
+            return "".join(self._chars[:self._last_item_end]).rstrip().rstrip(",") + "]" if self._last_item_end else "[]"
+        text = "".join(self._chars[:self._string_start]) if self._in_string else self.text()
+        closers = "".join(reversed(self._stack))
+        # Campo pela metade ("chave" sem valor ou vírgula solta) é descartado
+        candidates = [text, re.sub(r',?\s*"(?:[^"\\]|\\.)*"\s*:?\s*$', "", text)]
+        for candidate in candidates:
+            candidate = re.sub(r'[\s,:]+$', "", candidate) + closers
+            try:
+                _loads(candidate)
+                return candidate
+            except ValueError:
+                continue
+        return None
+
+
+def _loads(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except ValueError:
+        return json.loads(TRAILING_COMMA_PATTERN.sub(r"\1", text))
+
+
+def required_fields(schema: Dict) -> Tuple[str, ...]:
+    """Campos obrigatórios do objeto do esquema (dos elementos, em esquemas de array)"""
+    if schema.get("type") == "array":
+        schema = schema.get("items", {})
+    return tuple(schema.get("required", ()))
+
+
+def _complete(value: Any, required: Tuple[str, ...]) -> Any:
+    """Valor parcial só com o que tem todos os campos obrigatórios (None se nada sobrar)"""
+    if isinstance(value, list):
+        items = [item for item in value if isinstance(item, dict) and all(key in item for key in required)]
+        return items or None
+    if isinstance(value, dict) and value and all(key in value for key in required):
+        return value
+    return None
+
+
+def parse_json_output(response_text: str, opener: str = "{", required: Tuple[str, ...] = ()) -> Tuple[Any, str]:
+    """
+    Decodifica a saída JSON do Gemini: (valor ou None, como foi lida)
+    - direto: JSON puro (saída com response_schema)
+    - tolerante: JSON em meio a texto, cercas markdown ou vírgulas sobrando
+    - parcial: saída truncada, fechada com os campos/elementos completos; só é aceita
+      se tiver todos os campos em `required` (em arrays, os elementos sem eles são descartados)
+    """
+    expected = dict if opener == "{" else list
+    try:
+        value = json.loads(response_text)
+        if isinstance(value, expected):
+            return value, PARSE_DIRECT
+    except ValueError:
+        pass
+
+    parser = JsonStreamParser(opener)
+    parser.feed(response_text)
+    if parser.done:
+        try:
+            return _loads(parser.text()), PARSE_TOLERANT
+        except ValueError:
+            return None, PARSE_FAILED
+    closed = parser.closed_text()
+    if closed is not None:
+        try:
+            value = _complete(_loads(closed), required)
+        except ValueError:
+            return None, PARSE_FAILED
+        if value:
+            return value, PARSE_PARTIAL
+    return None, PARSE_FAILED
+
+
+def valid_classification(value: Any, with_reply: bool = False) -> bool:
+    """Objeto com categoria válida (e resposta sugerida, no modo combinado)"""
+    if not isinstance(value, dict) or value.get("categoria") not in ("Produtivo", "Improdutivo"):
+        return False
+    return not with_reply or bool(str(value.get("resposta_sugerida") or "").strip())
+
+
+def generation_config(schema: Dict) -> Dict:
+    """generation_config do SDK que restringe a saída ao esquema"""
+    return {"response_mime_type": "application/json", "response_schema": schema}
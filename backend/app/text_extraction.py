@@ -0,0 +1,201 @@
+# app/text_extraction.py
+import os
+import io
+import time
+import asyncio
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Tuple
+from .metrics import metrics
+from .structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Orçamento de extração: o classificador só precisa do começo do documento
+EXTRACT_MAX_PAGES = int(os.getenv("EXTRACT_MAX_PAGES", "20"))
+EXTRACT_MAX_CHARS = int(os.getenv("EXTRACT_MAX_CHARS", "20000"))
+# Processos dedicados à extração de PDF (fora do event loop)
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "2"))
+# Uploads maiores que isto são gravados em disco em vez de mantidos em memória
+UPLOAD_SPOOL_MAX_MEMORY = int(os.getenv("UPLOAD_SPOOL_MAX_MEMORY", str(1024 * 1024)))
+# Tamanho máximo (bytes) de um arquivo enviado
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class ExtractionError(Exception):
+    """Arquivo inválido ou formato não suportado"""
+
+
+class UploadTooLargeError(ExtractionError):
+    """Arquivo maior que UPLOAD_MAX_BYTES"""
+
+    def __init__(self, max_bytes: int = UPLOAD_MAX_BYTES):
+        super().__init__(f"Arquivo muito grande. Máximo de {max_bytes} bytes.")
+
+
+def _get_pool():
+    """Pool de processos criado sob demanda (None se não for possível criar processos)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                try:
+                    _pool = ProcessPoolExecutor(max_workers=max(1, EXTRACT_WORKERS))
+                except Exception as e:
+                    logger.warning("Pool de extração indisponível, usando threads", erro=str(e))
+                    _pool = False
+    return _pool or None
+
+
+def shutdown_extraction_pool():
+    """Encerra o pool de processos (chamado no desligamento da aplicação)"""
+    global _pool
+    with _pool_lock:
+        if _pool:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def extract_pdf(source, max_pages: int = EXTRACT_MAX_PAGES, max_chars: int = EXTRACT_MAX_CHARS) -> Tuple[str, Dict]:
+    """
+    Extrai texto de um PDF (caminho em disco ou bytes), parando ao atingir o orçamento
+    de páginas ou de caracteres. Executado em processo separado.
+    """
+    import PyPDF2
+
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    reader = PyPDF2.PdfReader(stream)
+    total_pages = len(reader.pages)
+    pages = []
+    chars = 0
+    pages_read = 0
+    for page in reader.pages:
+        if pages_read >= max_pages or chars >= max_chars:
+            break
+        pages_read += 1
+        txt = page.extract_text()
+        if txt:
+            pages.append(txt)
+            chars += len(txt) + 1
+    text = "\n".join(pages)
+    truncated = pages_read < total_pages or len(text) > max_chars
+    return text[:max_chars], {
+        "tipo": "pdf",
+        "paginas_lidas": pages_read,
+        "paginas_total": total_pages,
+        "caracteres": min(len(text), max_chars),
+        "truncado": truncated
+    }
+
+
+async def _spool_upload(upload) -> Tuple[object, int]:
+    """
+    Lê o upload em blocos: pequenos ficam em memória (bytes), grandes vão para
+    um arquivo temporário em disco (retorna o caminho)
+    """
+    buffer = bytearray()
+    spool_file = None
+    size = 0
+    try:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > UPLOAD_MAX_BYTES:
+                raise UploadTooLargeError()
+            if spool_file is None:
+                buffer.extend(chunk)
+                if len(buffer) > UPLOAD_SPOOL_MAX_MEMORY:
+                    spool_file = tempfile.NamedTemporaryFile(prefix="upload_", suffix=".pdf", delete=False)
+                    spool_file.write(buffer)
+                    buffer = bytearray()
+            else:
+                spool_file.write(chunk)
+    except Exception:
+        if spool_file is not None:
+            spool_file.close()
+            os.unlink(spool_file.name)
+        raise
+    if spool_file is not None:
+        spool_file.close()
+        return spool_file.name, size
+    return bytes(buffer), size
+
+
+async def read_upload_bytes(upload, max_bytes: int = UPLOAD_MAX_BYTES) -> bytes:
+    """Lê o upload inteiro em memória, recusando arquivos maiores que max_bytes"""
+    data = bytearray()
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return bytes(data)
+        data.extend(chunk)
+        if len(data) > max_bytes:
+            raise UploadTooLargeError(max_bytes)
+
+
+async def _read_text_upload(upload, max_chars: int) -> Tuple[str, Dict]:
+    """Lê apenas o necessário de um .txt (até ~4 bytes por caractere do orçamento)"""
+    max_bytes = max_chars * 4
+    data = bytearray()
+    exhausted = False
+    while len(data) < max_bytes:
+        chunk = await upload.read(min(UPLOAD_CHUNK_SIZE, max_bytes - len(data)))
+        if not chunk:
+            exhausted = True
+            break
+        data.extend(chunk)
+    text = data.decode("utf-8", errors="ignore")
+    truncated = not exhausted or len(text) > max_chars
+    return text[:max_chars], {
+        "tipo": "txt",
+        "caracteres": min(len(text), max_chars),
+        "truncado": truncated
+    }
+
+
+async def extract_upload(upload, max_pages: int = EXTRACT_MAX_PAGES,
+                         max_chars: int = EXTRACT_MAX_CHARS) -> Tuple[str, Dict]:
+    """
+    Extrai o texto de um upload .txt ou .pdf sem bloquear o event loop
+    Retorna (texto, metadados com tempo_extracao)
+    """
+    start_time = time.time()
+    filename = (getattr(upload, "filename", "") or "").lower()
+
+    if filename.endswith(".txt"):
+        text, meta = await _read_text_upload(upload, max_chars)
+    elif filename.endswith(".pdf"):
+        source, size = await _spool_upload(upload)
+        loop = asyncio.get_running_loop()
+        try:
+            pool = _get_pool()
+            if pool is not None:
+                text, meta = await loop.run_in_executor(pool, extract_pdf, source, max_pages, max_chars)
+            else:
+                text, meta = await asyncio.to_thread(extract_pdf, source, max_pages, max_chars)
+        except BrokenProcessPool as e:
+            # Um processo morreu (ex.: PDF malicioso): recriar o pool na próxima chamada
+            shutdown_extraction_pool()
+            raise ExtractionError(f"Erro ao ler PDF: {e}")
+        except Exception as e:
+            raise ExtractionError(f"Erro ao ler PDF: {e}")
+        finally:
+            if isinstance(source, str):
+                os.unlink(source)
+        meta["bytes"] = size
+    else:
+        raise ExtractionError("Formato não suportado. Use .txt ou .pdf.")
+
+    elapsed = time.time() - start_time
+    metrics.observe("extract", elapsed)
+    meta["tempo_extracao"] = round(elapsed, 4)
+    return text, meta
@@ -0,0 +1 @@
+# Marcador de pacote Python
\ No newline at end of file
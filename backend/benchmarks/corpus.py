@@ -0,0 +1,92 @@
+# benchmarks/corpus.py
+"""
+Corpus sintético de emails em português (produtivos e improdutivos)
+
+Determinístico para a mesma semente; o tamanho das mensagens varia com o número de
+parágrafos e parte delas traz assinatura e resposta citada, como emails reais
+"""
+import random
+from pathlib import Path
+from typing import List
+
+NAMES = ["Ana", "Bruno", "Carla", "Diego", "Fernanda", "Gustavo", "Helena", "Igor", "Juliana", "Marcos",
+         "Patrícia", "Rafael", "Sofia", "Thiago", "Vanessa"]
+PRODUCTS = ["sistema de faturamento", "portal do cliente", "aplicativo móvel", "módulo de relatórios",
+            "integração com o ERP", "painel financeiro", "cadastro de fornecedores"]
+
+PRODUCTIVE_OPENINGS = [
+    "Estou com um problema no {produto}: desde ontem aparece erro ao salvar os dados.",
+    "Gostaria de saber o status da solicitação {protocolo}, aberta na semana passada.",
+    "Preciso de acesso ao {produto} para o novo colaborador da equipe de vendas.",
+    "O boleto referente à fatura {protocolo} veio com valor diferente do contrato.",
+    "Não consigo exportar o relatório mensal no {produto}, a tela fica carregando.",
+    "Poderiam verificar o chamado {protocolo}? O prazo de atendimento já venceu.",
+    "Solicito a alteração do e-mail cadastrado na conta da empresa.",
+    "Precisamos agendar uma reunião para revisar a configuração do {produto}.",
+]
+PRODUCTIVE_DETAILS = [
+    "O erro acontece com todos os usuários do setor e impede o fechamento do mês.",
+    "Já tentei limpar o cache e usar outro navegador, sem sucesso.",
+    "Segue em anexo a captura de tela com a mensagem exibida.",
+    "É urgente, pois temos uma auditoria marcada para sexta-feira.",
+    "Caso precisem de mais informações, o número do contrato é {protocolo}.",
+    "Qual é o prazo previsto para a correção?",
+    "Aguardo retorno com as instruções para resolver o problema.",
+]
+UNPRODUCTIVE_OPENINGS = [
+    "Parabéns pelo excelente trabalho no projeto, o resultado ficou ótimo!",
+    "Feliz Natal e um próspero ano novo para toda a equipe!",
+    "Obrigado pela ajuda de ontem, foi muito gentil da sua parte.",
+    "Boas festas! Que o próximo ano seja de muitas conquistas.",
+    "Só passando para agradecer o atendimento, deu tudo certo.",
+    "Vi a foto do evento, ficou muito bonita. Abraços a todos!",
+]
+UNPRODUCTIVE_DETAILS = [
+    "Não é necessário responder, era só para registrar o agradecimento.",
+    "Continue assim, a equipe está de parabéns.",
+    "Mande lembranças para o pessoal do escritório.",
+    "Sem pressa nenhuma, quando puder a gente conversa.",
+]
+SIGNATURE = "\n\n--\n{nome}\nAnalista de Operações\nTel.: (11) 4002-{ramal}"
+QUOTED_REPLY = ("\n\nEm {dia}/03/2025, {outro} escreveu:\n"
+                "> Olá {nome}, recebemos sua mensagem anterior.\n"
+                "> Assim que tivermos novidades entraremos em contato.\n")
+
+
+def _fill(template: str, rng: random.Random) -> str:
+    return template.format(produto=rng.choice(PRODUCTS), protocolo=f"#{rng.randint(10000, 99999)}")
+
+
+def generate_email(rng: random.Random, index: int, productive: bool, paragraphs: int) -> str:
+    """Um email sintético; o número de sequência evita textos idênticos (e acertos de cache)"""
+    nome, outro = rng.sample(NAMES, 2)
+    openings, details = ((PRODUCTIVE_OPENINGS, PRODUCTIVE_DETAILS) if productive
+                         else (UNPRODUCTIVE_OPENINGS, UNPRODUCTIVE_DETAILS))
+    lines = [f"Olá {outro},", "", _fill(rng.choice(openings), rng)]
+    for _ in range(max(0, paragraphs - 1)):
+        lines.append(" ".join(_fill(rng.choice(details), rng) for _ in range(rng.randint(1, 3))))
+    lines.append(f"Mensagem {index}.")
+    text = "\n\n".join(lines)
+    if rng.random() < 0.5:
+        text += SIGNATURE.format(nome=nome, ramal=rng.randint(1000, 9999))
+    if rng.random() < 0.3:
+        text += QUOTED_REPLY.format(dia=rng.randint(10, 28), outro=outro, nome=nome)
+    return text
+
+
+def build_corpus(size: int, seed: int = 42, productive_ratio: float = 0.6,
+                 min_paragraphs: int = 1, max_paragraphs: int = 4, include_samples: bool = False) -> List[str]:
+    """Lista de `size` emails; include_samples acrescenta Teste1.txt e Teste2.txt da raiz do repositório"""
+    rng = random.Random(seed)
+    corpus = [
+        generate_email(rng, index, rng.random() < productive_ratio,
+                       rng.randint(min_paragraphs, max(min_paragraphs, max_paragraphs)))
+        for index in range(size)
+    ]
+    if include_samples:
+        root = Path(__file__).resolve().parents[2]
+        for name in ("Teste1.txt", "Teste2.txt"):
+            path = root / name
+            if path.exists():
+                corpus.append(path.read_text(encoding="utf-8"))
+    return corpus
@@ -0,0 +1,199 @@
+# benchmarks/gemini_stub.py
+"""
+Stub local do Gemini para benchmarks sem chave de API nem rede
+
+Substitui google.generativeai.GenerativeModel por StubGenerativeModel, com latência
+e perfil de erros configuráveis. As respostas seguem o formato pedido em cada prompt
+(classificação, resposta sugerida, modo combinado e lote)
+"""
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional
+
+# Tipos de erro simulados (mesmas exceções que o SDK levanta)
+ERROR_KINDS = ("503", "429", "timeout", "json_invalido")
+
+# Em stream=True, fração da latência até o primeiro trecho (o resto se divide entre os trechos)
+STREAM_FIRST_CHUNK_FRACTION = 0.25
+
+# Pistas de email improdutivo (expressões que não aparecem nas instruções dos prompts)
+UNPRODUCTIVE_CUES = ("parabéns pelo", "feliz natal", "obrigado pela", "boas festas", "passando para agradecer",
+                     "abraços a todos")
+
+
+@dataclass
+class StubProfile:
+    """Perfil de latência (milissegundos) e de erros do stub"""
+    latency_ms: float = 300.0
+    jitter_ms: float = 100.0
+    # Cauda: fração das chamadas com latência multiplicada por tail_factor
+    tail_rate: float = 0.01
+    tail_factor: float = 5.0
+    error_rate: float = 0.0
+    error_kind: str = "503"
+    seed: Optional[int] = None
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class _Usage:
+    def __init__(self, total: int):
+        self.prompt_token_count = total
+        self.total_token_count = total
+
+
+class StubResponse:
+    """Resposta mínima compatível com o uso no classificador (text e usage_metadata)"""
+
+    def __init__(self, text: str, prompt_chars: int):
+        self.text = text
+        self.usage_metadata = _Usage(prompt_chars // 4 + len(text) // 4)
+
+
+class StubStreamResponse:
+    """Resposta em stream: trechos de algumas palavras, como o SDK entrega em stream=True"""
+
+    def __init__(self, response: StubResponse, latency: float, words_per_chunk: int = 3):
+        words = response.text.split(" ")
+        self._chunks = [" ".join(words[i:i + words_per_chunk]) + " " for i in range(0, len(words), words_per_chunk)]
+        self._chunks[-1] = self._chunks[-1].rstrip()
+        self._first = latency * STREAM_FIRST_CHUNK_FRACTION
+        self._step = (latency - self._first) / max(1, len(self._chunks) - 1)
+        self._usage = response.usage_metadata
+
+    def _chunk(self, index: int):
+        chunk = StubResponse(self._chunks[index], 0)
+        chunk.usage_metadata = self._usage if index == len(self._chunks) - 1 else None
+        return chunk
+
+    def __iter__(self):
+        for index in range(len(self._chunks)):
+            time.sleep(self._first if index == 0 else self._step)
+            yield self._chunk(index)
+
+    async def __aiter__(self):
+        for index in range(len(self._chunks)):
+            await asyncio.sleep(self._first if index == 0 else self._step)
+            yield self._chunk(index)
+
+
+class StubStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def record(self, error: bool):
+        with self._lock:
+            self.calls += 1
+            if error:
+                self.errors += 1
+
+    def to_dict(self) -> Dict:
+        return {"chamadas": self.calls, "erros_injetados": self.errors}
+
+
+class StubGenerativeModel:
+    """Substituto de genai.GenerativeModel (aceita e ignora os demais argumentos do SDK)"""
+
+    profile = StubProfile()
+    stats = StubStats()
+    _random = random.Random()
+
+    def __init__(self, model_name: str = "stub", system_instruction: Optional[str] = None,
+                 generation_config: Optional[Dict] = None, **kwargs):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.generation_config = generation_config or {}
+        self._client = None
+        self._async_client = None
+
+    @classmethod
+    def _draw(cls):
+        """Sorteia (latência em segundos, erro) para uma chamada"""
+        profile = cls.profile
+        latency = max(0.0, cls._random.gauss(profile.latency_ms, profile.jitter_ms))
+        if cls._random.random() < profile.tail_rate:
+            latency *= profile.tail_factor
+        failed = cls._random.random() < profile.error_rate
+        cls.stats.record(failed)
+        return latency / 1000.0, failed
+
+    @classmethod
+    def _raise(cls, prompt: str):
+        from google.api_core import exceptions
+
+        kind = cls.profile.error_kind
+        if kind == "429":
+            raise exceptions.ResourceExhausted("stub: cota excedida")
+        if kind == "timeout":
+            raise exceptions.DeadlineExceeded("stub: prazo excedido")
+        if kind == "json_invalido":
+            return StubResponse("resposta fora do formato esperado", len(prompt))
+        raise exceptions.ServiceUnavailable("stub: serviço indisponível")
+
+    @staticmethod
+    def _answer(prompt: str, schema: Optional[Dict] = None) -> StubResponse:
+        """Responde no formato pedido (esquema de saída ou prompt); a categoria segue pistas simples do texto"""
+        lowered = prompt.lower()
+        productive = not any(cue in lowered for cue in UNPRODUCTIVE_CUES)
+        categoria = "Produtivo" if productive else "Improdutivo"
+        item = {
+            "categoria": categoria,
+            "confianca": 0.92,
+            "justificativa": "resposta do stub de benchmark",
+        }
+        reply = "Olá, obrigado pelo contato. Recebemos sua mensagem e retornaremos em breve."
+        schema = schema or {}
+        if schema.get("type") == "array" or "array json" in lowered:
+            ids = re.findall(r"\[id=(\d+)\]", prompt)
+            text = json.dumps([{"id": int(i), **item, "resposta_sugerida": reply} for i in ids], ensure_ascii=False)
+        elif "resposta_sugerida" in schema.get("properties", {}) or "resposta_sugerida" in prompt:
+            text = json.dumps({**item, "resposta_sugerida": reply}, ensure_ascii=False)
+        elif "gere uma resposta" in lowered:
+            text = reply
+        else:
+            text = json.dumps(item, ensure_ascii=False)
+        return StubResponse(text, len(prompt))
+
+    def generate_content(self, contents, stream: bool = False, **kwargs):
+        # A instrução de sistema define o formato pedido (templates com parte fixa)
+        prompt = f"{self.system_instruction or ''}\n{contents}"
+        schema = (kwargs.get("generation_config") or self.generation_config).get("response_schema")
+        latency, failed = self._draw()
+        if stream and not failed:
+            return StubStreamResponse(self._answer(prompt, schema), latency)
+        time.sleep(latency)
+        if failed:
+            return self._raise(prompt)
+        return self._answer(prompt, schema)
+
+    async def generate_content_async(self, contents, stream: bool = False, **kwargs):
+        # A instrução de sistema define o formato pedido (templates com parte fixa)
+        prompt = f"{self.system_instruction or ''}\n{contents}"
+        schema = (kwargs.get("generation_config") or self.generation_config).get("response_schema")
+        latency, failed = self._draw()
+        if stream and not failed:
+            return StubStreamResponse(self._answer(prompt, schema), latency)
+        await asyncio.sleep(latency)
+        if failed:
+            return self._raise(prompt)
+        return self._answer(prompt, schema)
+
+
+def install(profile: StubProfile) -> StubStats:
+    """Troca o modelo do SDK pelo stub (chamar antes de criar o classificador)"""
+    import google.generativeai as genai
+
+    StubGenerativeModel.profile = profile
+    StubGenerativeModel.stats = StubStats()
+    StubGenerativeModel._random = random.Random(profile.seed)
+    genai.GenerativeModel = StubGenerativeModel
+    genai.configure = lambda **kwargs: None
+    return StubGenerativeModel.stats
@@ -0,0 +1,362 @@
+# benchmarks/run.py
+"""
+Benchmark offline do classificador (sem chave de API nem rede)
+
+O Gemini é substituído por um stub local (gemini_stub) e o app FastAPI é chamado em
+processo, direto pela interface ASGI. Mede o pré-processamento NLP e o endpoint
+/process_email com um corpus sintético e grava o resultado em JSON para comparar commits
+
+Uso (no diretório backend/):
+    python -m benchmarks.run run --emails 500 --concurrency 32 --output base.json
+    python -m benchmarks.run run --latency-ms 800 --error-rate 0.05 --error-kind 429
+    python -m benchmarks.run compare base.json novo.json --max-regression 0.10
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import subprocess
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+from urllib.parse import urlencode
+
+from .corpus import build_corpus
+from .gemini_stub import ERROR_KINDS, StubProfile, install
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+FORMAT_VERSION = 1
+
+# Configuração do app durante o benchmark (variáveis já definidas no ambiente prevalecem)
+BENCHMARK_ENV = {
+    "GEMINI_API_KEY": "benchmark",
+    "GEMINI_POOL_SIZE": "0",
+    "GEMINI_RPM": "0",
+    "GEMINI_TPM": "0",
+    "RESULT_CACHE_BACKEND": "off",
+    "SHARED_STATE_PATH": "",
+    "STARTUP_PREWARM": "false",
+    "LOG_LEVEL": "WARNING",
+}
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """Percentil pelo método do posto mais próximo (values ordenada)"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(q * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def _latency_summary(latencies: List[float], elapsed: float) -> Dict:
+    ordered = sorted(latencies)
+    return {
+        "total": len(ordered),
+        "duracao_s": round(elapsed, 4),
+        "req_s": round(len(ordered) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latencia_ms": {
+            "media": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+            "p50": round(_percentile(ordered, 0.50) * 1000, 3),
+            "p90": round(_percentile(ordered, 0.90) * 1000, 3),
+            "p99": round(_percentile(ordered, 0.99) * 1000, 3),
+            "max": round(ordered[-1] * 1000, 3) if ordered else 0.0
+        }
+    }
+
+
+def _memory() -> Dict:
+    """Pico de memória residente do processo (MB) e pico do tracemalloc, se ativo"""
+    memory = {}
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss: KB no Linux, bytes no macOS
+        memory["rss_pico_mb"] = round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    if tracemalloc.is_tracing():
+        memory["python_pico_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+        tracemalloc.reset_peak()
+    return memory
+
+
+def _stage_times() -> Dict:
+    """Tempo por etapa registrado pelo app (metrics) durante o cenário, em milissegundos"""
+    from app.metrics import metrics
+
+    snapshot = metrics.snapshot(local_only=True)
+    stages = {
+        stage: {
+            "count": data["count"],
+            "media_ms": round(data["media"] * 1000, 3),
+            "p50_ms": round(data["p50"] * 1000, 3),
+            "p99_ms": round(data["p99"] * 1000, 3),
+            "total_s": round(data["media"] * data["count"], 4)
+        }
+        for stage, data in sorted(snapshot["etapas"].items())
+    }
+    return {"etapas": stages, "contadores": snapshot["contadores"]}
+
+
+def bench_nlp(corpus: List[str]) -> Dict:
+    """EmailNLPPreprocessor.preprocess_for_gemini sobre o corpus, sequencial"""
+    from app.metrics import metrics
+    from app.nlp_preprocessor import EmailNLPPreprocessor
+
+    preprocessor = EmailNLPPreprocessor()
+    start = time.perf_counter()
+    preprocessor.warm_up()
+    warm_up = time.perf_counter() - start
+
+    metrics.reset()
+    latencies = []
+    start = time.perf_counter()
+    for text in corpus:
+        call_start = time.perf_counter()
+        preprocessor.preprocess_for_gemini(text)
+        latencies.append(time.perf_counter() - call_start)
+    result = _latency_summary(latencies, time.perf_counter() - start)
+    result["aquecimento_s"] = round(warm_up, 4)
+    result.update(_stage_times())
+    result["memoria"] = _memory()
+    return result
+
+
+async def _asgi_post(app, path: str, fields: Dict[str, str]) -> Tuple[int, bytes]:
+    """POST de formulário direto na aplicação ASGI (sem servidor HTTP nem cliente de rede)"""
+    body = urlencode(fields).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"benchmark"),
+            (b"content-type", b"application/x-www-form-urlencoded"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+    finished = asyncio.Event()
+    sent = False
+    status = 0
+    chunks = []
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+async def _drive_api(corpus: List[str], concurrency: int) -> Dict:
+    from app.main import app
+    from app.metrics import metrics
+
+    # Primeira requisição cria o classificador e carrega NLTK (medida à parte)
+    start = time.perf_counter()
+    status, _ = await _asgi_post(app, "/process_email", {"text": corpus[0]})
+    first_request = time.perf_counter() - start
+    if status != 200:
+        raise RuntimeError(f"Requisição de aquecimento falhou com status {status}")
+
+    metrics.reset()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    latencies = []
+    statuses: Dict[str, int] = {}
+    methods: Dict[str, int] = {}
+
+    async def one(text: str):
+        async with semaphore:
+            call_start = time.perf_counter()
+            status, payload = await _asgi_post(app, "/process_email", {"text": text})
+            latencies.append(time.perf_counter() - call_start)
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        if status == 200:
+            method = json.loads(payload).get("metodo_usado", "?")
+            methods[method] = methods.get(method, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(text) for text in corpus))
+    result = _latency_summary(latencies, time.perf_counter() - start)
+    result["concorrencia"] = concurrency
+    result["primeira_requisicao_s"] = round(first_request, 4)
+    result["status"] = statuses
+    result["metodo_usado"] = methods
+    result.update(_stage_times())
+    result["memoria"] = _memory()
+    return result
+
+
+def bench_api(corpus: List[str], concurrency: int) -> Dict:
+    """/process_email com `concurrency` requisições simultâneas"""
+    return asyncio.run(_drive_api(corpus, concurrency))
+
+
+def _git_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=10).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, timeout=30).stdout.strip()
+        return f"{commit}-modificado" if commit and dirty else commit or "desconhecido"
+    except (OSError, subprocess.SubprocessError):
+        return "desconhecido"
+
+
+def _cmd_run(args) -> int:
+    for name, value in BENCHMARK_ENV.items():
+        os.environ.setdefault(name, value)
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    profile = StubProfile(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, tail_rate=args.tail_rate,
+                          tail_factor=args.tail_factor, error_rate=args.error_rate, error_kind=args.error_kind,
+                          seed=args.seed)
+    stub_stats = install(profile)
+    corpus = build_corpus(args.emails, seed=args.seed, productive_ratio=args.productive_ratio,
+                          min_paragraphs=args.min_paragraphs, max_paragraphs=args.max_paragraphs,
+                          include_samples=args.include_samples)
+
+    scenarios = {}
+    if args.scenario in ("nlp", "all"):
+        print(f"⏱️  nlp: {len(corpus)} emails", file=sys.stderr)
+        scenarios["nlp"] = bench_nlp(corpus)
+    if args.scenario in ("api", "all"):
+        print(f"⏱️  api: {len(corpus)} requisições, concorrência {args.concurrency}", file=sys.stderr)
+        scenarios["api"] = bench_api(corpus, args.concurrency)
+
+    report = {
+        "versao_formato": FORMAT_VERSION,
+        "commit": _git_commit(),
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {
+            "emails": len(corpus),
+            "concorrencia": args.concurrency,
+            "semente": args.seed,
+            "paragrafos": [args.min_paragraphs, args.max_paragraphs],
+            "proporcao_produtivos": args.productive_ratio,
+            "ambiente": {name: os.environ.get(name, "") for name in BENCHMARK_ENV if name != "GEMINI_API_KEY"}
+        },
+        "stub": {**profile.to_dict(), **stub_stats.to_dict()},
+        "cenarios": scenarios
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            output.write(text + "\n")
+        print(f"✅ Resultado em {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return 0
+
+
+# Métricas comparadas: (caminho no JSON, maior é melhor)
+COMPARED_METRICS = [
+    (("req_s",), True),
+    (("latencia_ms", "p50"), False),
+    (("latencia_ms", "p99"), False),
+    (("memoria", "rss_pico_mb"), False),
+]
+
+
+def _lookup(data: Dict, path: Tuple[str, ...]):
+    for key in path:
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+
+def _cmd_compare(args) -> int:
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    print(f"{'métrica':<38} {baseline.get('commit', '?'):>14} {candidate.get('commit', '?'):>14} {'variação':>9}")
+    regressions = []
+    for scenario in sorted(set(baseline["cenarios"]) & set(candidate["cenarios"])):
+        before, after = baseline["cenarios"][scenario], candidate["cenarios"][scenario]
+        rows = [(path, higher_is_better) for path, higher_is_better in COMPARED_METRICS]
+        rows += [(("etapas", stage, "media_ms"), False)
+                 for stage in sorted(set(before.get("etapas", {})) & set(after.get("etapas", {})))]
+        for path, higher_is_better in rows:
+            old, new = _lookup(before, path), _lookup(after, path)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0
+            name = f"{scenario}.{'.'.join(path)}"
+            print(f"{name:<38} {old:>14} {new:>14} {change:>+8.1%}")
+            worse = -change if higher_is_better else change
+            if args.max_regression is not None and path[0] != "etapas" and worse > args.max_regression:
+                regressions.append(name)
+
+    if regressions:
+        print(f"❌ Regressões acima de {args.max_regression:.0%}: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Benchmark offline do classificador")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Executa os cenários e grava o resultado em JSON")
+    run.add_argument("--scenario", choices=("nlp", "api", "all"), default="all")
+    run.add_argument("--emails", type=int, default=200, help="Tamanho do corpus sintético (padrão: 200)")
+    run.add_argument("--concurrency", type=int, default=16, help="Requisições simultâneas no cenário api")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--min-paragraphs", type=int, default=1)
+    run.add_argument("--max-paragraphs", type=int, default=4)
+    run.add_argument("--productive-ratio", type=float, default=0.6)
+    run.add_argument("--include-samples", action="store_true", help="Inclui Teste1.txt e Teste2.txt no corpus")
+    run.add_argument("--latency-ms", type=float, default=300.0, help="Latência média do stub do Gemini")
+    run.add_argument("--jitter-ms", type=float, default=100.0, help="Desvio padrão da latência do stub")
+    run.add_argument("--tail-rate", type=float, default=0.01, help="Fração de chamadas lentas (cauda)")
+    run.add_argument("--tail-factor", type=float, default=5.0, help="Multiplicador da latência na cauda")
+    run.add_argument("--error-rate", type=float, default=0.0, help="Fração de chamadas com erro")
+    run.add_argument("--error-kind", choices=ERROR_KINDS, default="503")
+    run.add_argument("--tracemalloc", action="store_true", help="Mede o pico de memória Python (mais lento)")
+    run.add_argument("--output", "-o", help="Arquivo JSON de saída (padrão: stdout)")
+    run.set_defaults(func=_cmd_run)
+
+    compare = subparsers.add_parser("compare", help="Compara dois resultados (ex.: commit base x commit novo)")
+    compare.add_argument("baseline")
+    compare.add_argument("candidate")
+    compare.add_argument("--max-regression", type=float,
+                         help="Falha (código 1) se req/s, p50, p99 ou memória piorarem mais que esta fração")
+    compare.set_defaults(func=_cmd_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+# gunicorn.conf.py - Modo multi-worker (gunicorn + workers uvicorn)
+#
+# Uso: gunicorn -c gunicorn.conf.py app.main:app
+#
+# Os workers compartilham pelo SQLite (modo WAL) em SHARED_STATE_PATH:
+# cache de resultados, cota do Gemini (limitador de taxa) e métricas.
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Um worker por núcleo disponível ao processo (afinidade/cgroup, não os núcleos da máquina):
+# o trabalho pesado é espera de rede (async) e a extração de PDF já roda no pool de processos
+# de cada worker. Sem sched_getaffinity (macOS), 2 workers.
+def _available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return 2
+
+
+workers = int(os.getenv("WEB_CONCURRENCY", str(_available_cpus())))
+
+# Chamadas ao Gemini (com retentativas) podem passar de 30s
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+# Sem preload: cada worker inicializa o classificador depois do fork (conexões e threads próprias)
+preload_app = False
+
+# Estado compartilhado: todos os workers usam o mesmo arquivo
+os.environ.setdefault("SHARED_STATE_PATH", os.path.join(tempfile.gettempdir(), "email_classifier_state.sqlite3"))
+os.environ.setdefault("STARTUP_PREWARM", "true")
+
+
+def on_starting(server):
+    """Limpa baldes e métricas deixados por uma execução anterior no mesmo arquivo"""
+    from app.shared_state import SharedStateStore
+
+    SharedStateStore(os.environ["SHARED_STATE_PATH"]).reset()
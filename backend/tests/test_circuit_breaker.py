@@ -0,0 +1,120 @@
+# tests/test_circuit_breaker.py
+import threading
+
+import pytest
+
+from app import circuit_breaker
+from app.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.acquire()
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert not breaker.available()
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+    assert breaker.stats()["chamadas_recusadas"] == 1
+    assert breaker.stats()["aberturas"] == 1
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CLOSED
+
+
+def test_half_open_after_reset_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    open_breaker(breaker)
+    clock[0] += 29.9
+    assert breaker.state == OPEN
+
+    clock[0] += 0.1
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.available()
+
+
+def test_half_open_admits_only_the_probe_calls(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, half_open_max_calls=1)
+    open_breaker(breaker)
+    clock[0] += 30
+
+    breaker.acquire()
+
+    # Vaga de teste ocupada: as demais chamadas são recusadas (e available() já indica isso)
+    assert not breaker.available()
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+
+
+def test_probe_success_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    open_breaker(breaker)
+    clock[0] += 30
+    breaker.acquire()
+
+    breaker.record_success()
+
+    assert breaker.state == CLOSED
+    breaker.acquire()
+
+
+def test_probe_failure_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    open_breaker(breaker)
+    clock[0] += 30
+    breaker.acquire()
+
+    # Em meio aberto uma única falha reabre, mesmo abaixo do limite
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert breaker.stats()["teste_em"] == 30.0
+    assert breaker.stats()["aberturas"] == 2
+
+
+def test_release_returns_the_probe_slot(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    open_breaker(breaker)
+    clock[0] += 30
+    breaker.acquire()
+
+    breaker.release()
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.available()
+    breaker.acquire()
+
+
+def test_record_degraded_counts_under_concurrency():
+    breaker = CircuitBreaker()
+    threads = [threading.Thread(target=lambda: [breaker.record_degraded() for _ in range(1000)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert breaker.stats()["respostas_degradadas"] == 8000
@@ -0,0 +1,96 @@
+# tests/test_job_queue.py
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from app import job_queue
+from app.job_queue import DONE, CallbackURLError, JobStore, validate_callback_url
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/hook",
+    "http://localhost:8000/hook",
+    "http://169.254.169.254/latest/meta-data",
+    "http://10.0.0.5/hook",
+    "https://192.168.1.10/hook",
+    "http://[::1]/hook",
+    "http://[::ffff:127.0.0.1]/hook",
+    "http://0.0.0.0/hook",
+])
+def test_internal_callback_hosts_are_rejected(url):
+    with pytest.raises(CallbackURLError):
+        validate_callback_url(url)
+
+
+@pytest.mark.parametrize("url", ["ftp://8.8.8.8/hook", "http:///hook", "hook"])
+def test_non_http_callback_urls_are_rejected(url):
+    with pytest.raises(CallbackURLError):
+        validate_callback_url(url)
+
+
+def test_public_address_is_accepted():
+    assert validate_callback_url("https://8.8.8.8/hook") == "8.8.8.8"
+
+
+def test_allowlisted_host_is_accepted(monkeypatch):
+    monkeypatch.setattr(job_queue, "JOBS_CALLBACK_ALLOWED_HOSTS", {"localhost"})
+
+    assert validate_callback_url("http://LOCALHOST:9000/hook") is None
+
+
+@pytest.fixture
+def callback_server():
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            received.append((self.headers["Host"], self.path, json.loads(body)))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[1], received
+    server.shutdown()
+    server.server_close()
+
+
+def test_callback_connects_to_the_validated_address(monkeypatch, callback_server):
+    port, received = callback_server
+    # O host não resolve: a entrega só funciona se conectar ao endereço validado, sem novo DNS
+    monkeypatch.setattr(job_queue, "validate_callback_url", lambda url: "127.0.0.1")
+
+    state = job_queue._deliver_callback(f"http://callback.invalid:{port}/hook?a=1", {"id": "job"})
+
+    assert state["estado"] == "entregue"
+    assert received == [(f"callback.invalid:{port}", "/hook?a=1", {"id": "job"})]
+
+
+def test_interrupted_callback_is_reclaimed(monkeypatch, tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.submit("texto", callback_url="https://exemplo.com/hook")
+    store.claim("worker-a")
+    store.finish(job_id, {"categoria": "Produtivo"})
+
+    # Entrega em andamento (posse válida): ninguém a retoma
+    assert store.claim_callback("worker-b") is None
+    assert store.get(job_id)["callback"]["estado"] == job_queue.PENDING
+
+    # Processo caiu no meio da entrega: vencida a posse, outro worker a retoma uma única vez
+    finished = store.get(job_id)["concluido_em"]
+    monkeypatch.setattr(job_queue.time, "time", lambda: finished + job_queue.JOBS_LEASE_SECONDS + 1)
+    assert store.claim_callback("worker-b") == job_id
+    assert store.claim_callback("worker-c") is None
+
+    store.set_callback(job_id, {"estado": "entregue", "tentativas": 1})
+    monkeypatch.setattr(job_queue.time, "time", lambda: finished + 10 * job_queue.JOBS_LEASE_SECONDS)
+    assert store.claim_callback("worker-c") is None
+    assert store.get(job_id)["status"] == DONE
+    store.close()
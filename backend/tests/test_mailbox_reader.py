@@ -0,0 +1,43 @@
+# tests/test_mailbox_reader.py
+import asyncio
+
+from app.mailbox_reader import aiter_lines, aiter_mbox_messages
+
+
+async def _chunks(parts):
+    for part in parts:
+        yield part
+
+
+def read_lines(parts, max_line_bytes=1024):
+    async def collect():
+        return [line async for line in aiter_lines(_chunks(parts), max_line_bytes)]
+    return asyncio.run(collect())
+
+
+def test_lines_split_across_chunks():
+    assert read_lines([b"ab", b"c\nde", b"f\n\ng", b"h"]) == ["abc\n", "def\n", "\n", "gh"]
+
+
+def test_multibyte_characters_split_across_chunks():
+    data = "Reunião amanhã\n".encode()
+
+    assert read_lines([data[:6], data[6:]]) == ["Reunião amanhã\n"]
+
+
+def test_long_lines_are_truncated():
+    assert read_lines([b"0123456", b"789abcdef", b"XYZ\nok\n", b"x" * 50], max_line_bytes=10) == [
+        "0123456789\n", "ok\n", "x" * 10
+    ]
+
+
+def test_mbox_messages_from_chunks():
+    mbox = b"From a\nSubject: oi\n\nPreciso do relatorio\n\nFrom b\n\n>From nosso lado, obrigado!\n"
+
+    async def collect():
+        return [message async for message in aiter_mbox_messages(_chunks([mbox[:17], mbox[17:]]))]
+
+    assert asyncio.run(collect()) == [
+        {"id": "mbox:0", "text": "Assunto: oi\n\nPreciso do relatorio"},
+        {"id": "mbox:1", "text": "From nosso lado, obrigado!"},
+    ]
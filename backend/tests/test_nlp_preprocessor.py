@@ -0,0 +1,42 @@
+# tests/test_nlp_preprocessor.py
+import pytest
+
+from app.nlp_preprocessor import EmailNLPPreprocessor
+
+
+@pytest.fixture(scope="module")
+def preprocessor():
+    return EmailNLPPreprocessor()
+
+
+def test_phrase_keyword_matches_across_whitespace(preprocessor):
+    analysis = preprocessor.analyze("Feliz Ano   Novo\na todos!")
+
+    assert analysis.unproductive_matches == ["feliz", "ano novo"]
+    assert preprocessor.extract_features("", analysis)["unproductive_score"] == 2
+
+
+def test_phrase_keyword_near_misses(preprocessor):
+    for text in ("O ano foi novo para todos", "anos novos", "ano novos"):
+        assert preprocessor.analyze(text).unproductive_matches == [], text
+        assert not preprocessor.has_keyword(text), text
+
+
+def test_classify_many_matches_classify_with_nlp(preprocessor):
+    corpus = [
+        "",
+        "   ",
+        "Obrigado!",
+        "Feliz ano novo e feliz natal, parabéns pela conquista",
+        # Palavras-chave das duas categorias no mesmo e-mail
+        "Obrigado pelo relatório; preciso revisar o projeto e aprovar o prazo, parabéns",
+        "Obrigado, parabéns pelo sucesso do projeto",
+        "URGENTE: erro no sistema de suporte",
+        "Vocês podem verificar o status da solicitação?",
+        "<p>Reunião de <b>status</b> do projeto</p> amanhã",
+        " ".join(["texto sem nenhuma palavra chave conhecida"] * 6) + "?",
+        " ".join(["palavra"] * 15),
+    ]
+
+    assert preprocessor.classify_many(corpus) == [preprocessor.classify_with_nlp(text) for text in corpus]
+    assert preprocessor.classify_many(corpus, chunk_size=3) == preprocessor.classify_many(corpus)
@@ -0,0 +1,108 @@
+# tests/test_prompt_budget.py
+from app.prompt_budget import (
+    ELLIPSIS, apply_prompt_budget, estimate_tokens, fit_to_budget, strip_quoted_replies, strip_signature
+)
+
+
+def never_informative(sentence: str) -> bool:
+    return False
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("a" * 40) == 11
+
+
+def test_strip_quoted_replies_drops_reply_chain():
+    text = ("Podem verificar o chamado?\n\n"
+            "Em seg., 3 de jun. de 2024 às 10:00, Suporte <suporte@empresa.com> escreveu:\n"
+            "> Recebemos sua solicitação.\n> Atenciosamente")
+
+    stripped, removed = strip_quoted_replies(text)
+
+    assert stripped == "Podem verificar o chamado?"
+    assert removed
+
+
+def test_strip_quoted_replies_keeps_original_when_nothing_is_left():
+    text = "> Reunião confirmada para amanhã.\n> Até lá"
+
+    assert strip_quoted_replies(text) == (text, False)
+
+
+def test_strip_signature_removes_closing_block():
+    text = "Preciso do status do chamado.\nAtenciosamente,\nMaria Souza\nFinanceiro"
+
+    assert strip_signature(text) == ("Preciso do status do chamado.", True)
+
+
+def test_strip_signature_keeps_thank_you_content():
+    # Emails de agradecimento: o "obrigado" é o conteúdo, não a assinatura
+    for text in ("Obrigado pela ajuda!", "Oi pessoal\nObrigado!", "Bom dia\nObrigado.\nQualquer dúvida estou à disposição."):
+        assert strip_signature(text) == (text, False)
+
+
+def test_strip_signature_thanks_followed_by_name():
+    text = "Segue o relatório do mês.\nObrigado,\nJoão Silva"
+
+    assert strip_signature(text) == ("Segue o relatório do mês.", True)
+
+
+def test_strip_signature_never_empties_the_email():
+    assert strip_signature("Atenciosamente,\nMaria") == ("Atenciosamente,\nMaria", False)
+
+
+def test_fit_to_budget_keeps_short_text():
+    assert fit_to_budget("Texto curto.", 100, never_informative) == ("Texto curto.", False)
+
+
+def test_fit_to_budget_keeps_head_tail_and_questions():
+    filler = " ".join(f"Frase de contexto número {i} sem nada relevante." for i in range(200))
+    text = f"Início do email. {filler} Qual o prazo de entrega? {filler} Fim do email."
+    max_tokens = 200
+
+    budgeted, truncated = fit_to_budget(text, max_tokens, never_informative)
+
+    assert truncated
+    assert len(budgeted) <= max_tokens * 4
+    assert budgeted.startswith("Início do email.")
+    assert budgeted.endswith("Fim do email.")
+    assert "Qual o prazo de entrega?" in budgeted
+    assert ELLIPSIS.strip() in budgeted
+
+
+def test_fit_to_budget_keeps_informative_sentences():
+    filler = " ".join(f"Frase neutra {i}." for i in range(400))
+    text = f"{filler} O pagamento da fatura falhou. {filler}"
+
+    budgeted, _ = fit_to_budget(text, 150, lambda sentence: "fatura" in sentence)
+
+    assert "O pagamento da fatura falhou." in budgeted
+
+
+def test_fit_to_budget_without_sentence_breaks():
+    budgeted, truncated = fit_to_budget("x" * 1000, 10, never_informative)
+
+    assert truncated
+    assert len(budgeted) <= 40
+
+
+def test_apply_prompt_budget_reports_sizes():
+    text = "Podem liberar meu acesso?\nAtenciosamente,\nAna\n\nOn Mon, Jun 3, 2024 Support wrote:\n> ok"
+
+    prompt_text, meta = apply_prompt_budget(text, 1000, never_informative)
+
+    assert prompt_text == "Podem liberar meu acesso?"
+    assert meta["citacoes_removidas"] and meta["assinatura_removida"]
+    assert not meta["truncado"]
+    assert meta["tamanho_original"] == len(text)
+    assert meta["tamanho_enviado"] == len(prompt_text)
+
+
+def test_apply_prompt_budget_can_keep_quotes():
+    text = "Resposta curta.\n> citação"
+
+    prompt_text, meta = apply_prompt_budget(text, 1000, never_informative, strip_quotes=False)
+
+    assert prompt_text == text
+    assert not meta["citacoes_removidas"]
@@ -0,0 +1,132 @@
+# tests/test_rate_limiter.py
+import asyncio
+
+import pytest
+
+from app.rate_limiter import LANE_BULK, LANE_INTERACTIVE, GeminiRateLimiter, RateLimiterError, TokenBucket
+from app.shared_state import SharedStateStore
+
+
+def drained(rpm: int, tpm: int = 0) -> GeminiRateLimiter:
+    """Limitador sem cota de requisições disponível no momento"""
+    limiter = GeminiRateLimiter(rpm, tpm)
+    limiter._requests.tokens = 0.0
+    return limiter
+
+
+def test_token_bucket_wait_time():
+    bucket = TokenBucket(60)
+    bucket.tokens = 0.0
+
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    # Pedido maior que a capacidade espera o balde cheio, não para sempre
+    assert bucket.wait_time(600) == pytest.approx(60.0)
+
+
+def test_disabled_limiter_never_waits():
+    limiter = GeminiRateLimiter(0, 0)
+
+    assert not limiter.enabled
+    assert asyncio.run(limiter.acquire(10 ** 9)) == 0.0
+
+
+def test_acquire_with_quota_consumes_immediately():
+    limiter = GeminiRateLimiter(60, 1000)
+
+    assert asyncio.run(limiter.acquire(100)) == 0.0
+    assert limiter._requests.tokens == pytest.approx(59, abs=0.1)
+    assert limiter._tokens.tokens == pytest.approx(900, abs=1)
+
+
+def test_interactive_lane_goes_before_bulk():
+    limiter = drained(rpm=600)
+    order = []
+
+    async def call(lane):
+        await limiter.acquire(1, lane)
+        order.append(lane)
+
+    async def scenario():
+        bulk = asyncio.ensure_future(call(LANE_BULK))
+        await asyncio.sleep(0.01)
+        interactive = asyncio.ensure_future(call(LANE_INTERACTIVE))
+        await asyncio.wait_for(asyncio.gather(bulk, interactive), 5)
+
+    asyncio.run(scenario())
+
+    assert order == [LANE_INTERACTIVE, LANE_BULK]
+    assert limiter.stats()["enfileiradas"] == {LANE_INTERACTIVE: 1, LANE_BULK: 1}
+
+
+def test_scheduler_survives_quota_errors():
+    limiter = drained(rpm=600)
+    consume = limiter._try_consume
+    calls = []
+
+    def flaky(tokens):
+        calls.append(tokens)
+        if len(calls) == 2:
+            raise RuntimeError("database is locked")
+        return consume(tokens)
+
+    limiter._try_consume = flaky
+
+    waited = asyncio.run(asyncio.wait_for(limiter.acquire(1), 5))
+
+    assert waited > 0
+    assert len(calls) >= 3
+
+
+def test_waiters_of_a_previous_loop_fail_instead_of_hanging():
+    limiter = drained(rpm=1)
+    old_loop = asyncio.new_event_loop()
+    try:
+        pending = old_loop.create_task(limiter.acquire(1))
+        old_loop.run_until_complete(asyncio.sleep(0.01))
+
+        async def use_on_new_loop():
+            limiter._ensure_scheduler(asyncio.get_running_loop())
+
+        asyncio.run(use_on_new_loop())
+        old_loop.run_until_complete(asyncio.sleep(0.01))
+
+        assert pending.done()
+        assert isinstance(pending.exception(), RateLimiterError)
+        assert limiter.depth == {LANE_INTERACTIVE: 0, LANE_BULK: 0}
+    finally:
+        for task in asyncio.all_tasks(old_loop):
+            task.cancel()
+        old_loop.run_until_complete(asyncio.sleep(0))
+        old_loop.close()
+
+
+def test_settle_and_throttle():
+    limiter = GeminiRateLimiter(60, 1000)
+    limiter._try_consume(300)
+
+    limiter.settle(300, 100)
+    assert limiter._tokens.tokens == pytest.approx(900, abs=1)
+
+    limiter.throttle()
+    assert limiter._requests.tokens <= 0
+    assert limiter.stats()["limitacoes_429"] == 1
+
+
+def test_shared_store_splits_quota_between_workers(tmp_path):
+    store = SharedStateStore(str(tmp_path / "state.sqlite3"))
+    first, second = GeminiRateLimiter(2, 0, store=store), GeminiRateLimiter(2, 0, store=store)
+
+    assert first._try_consume(1) == 0
+    assert second._try_consume(1) == 0
+    assert first._try_consume(1) > 0
+
+
+def test_shared_store_acquire_consumes_shared_quota(tmp_path):
+    store = SharedStateStore(str(tmp_path / "state.sqlite3"))
+    limiter = GeminiRateLimiter(60, 0, store=store)
+
+    async def scenario():
+        return await limiter.acquire(1)
+
+    assert asyncio.run(scenario()) == 0.0
+    assert store.bucket_level("gemini_requisicoes", 60) == pytest.approx(59, abs=0.1)
@@ -0,0 +1,79 @@
+# tests/test_reply_cache.py
+import pytest
+
+pytest.importorskip("numpy")
+
+from app.reply_cache import ReplyCache, contains_digits, shingles  # noqa: E402
+
+WORDS = ["preciso", "atualizar", "cadastro", "empresa", "sistema", "financeiro", "hoje"]
+REPLY = "Olá! Recebemos seu pedido de atualização cadastral e retornaremos em breve."
+
+
+def test_shingles_are_unigrams_and_bigrams():
+    assert sorted(shingles(["abrir", "chamado", "abrir"])) == sorted(
+        ["abrir", "chamado", "abrir chamado", "chamado abrir"])
+
+
+def test_shingles_keep_numbers_distinct():
+    assert set(shingles(["chamado", "123"])) != set(shingles(["chamado", "456"]))
+
+
+def test_contains_digits():
+    assert contains_digits("sem números", "protocolo 42")
+    assert not contains_digits("sem números", None, "")
+
+
+def test_near_duplicate_in_same_category_reuses_reply():
+    cache = ReplyCache(threshold=0.8)
+    cache.add(WORDS, "Produtivo", REPLY)
+
+    reply, score = cache.lookup(list(WORDS), "Produtivo")
+
+    assert reply == REPLY
+    assert score == 1.0
+    assert cache.stats()["hits"] == 1
+
+
+def test_other_category_or_different_email_misses():
+    cache = ReplyCache(threshold=0.8)
+    cache.add(WORDS, "Produtivo", REPLY)
+
+    assert cache.lookup(WORDS, "Improdutivo")[0] is None
+    reply, score = cache.lookup(["feliz", "natal", "equipe", "toda", "sucesso"], "Produtivo")
+    assert reply is None
+    assert score < 0.8
+
+
+def test_replies_with_numbers_are_not_indexed():
+    cache = ReplyCache(threshold=0.8)
+    cache.add(WORDS, "Produtivo", "Seu chamado 4512 foi aberto.")
+
+    assert cache.lookup(WORDS, "Produtivo") == (None, 0.0)
+    assert cache.stats()["entradas"]["Produtivo"] == 0
+
+
+def test_emails_with_numbers_never_reuse():
+    cache = ReplyCache(threshold=0.8)
+    cache.add(WORDS, "Produtivo", REPLY)
+
+    assert cache.lookup(WORDS + ["2024"], "Produtivo") == (None, None)
+
+
+def test_near_duplicate_replaces_reply_and_lru_evicts():
+    cache = ReplyCache(threshold=0.8, max_entries=1)
+    cache.add(WORDS, "Produtivo", REPLY)
+    cache.add(WORDS, "Produtivo", "Resposta nova.")
+    assert cache.lookup(WORDS, "Produtivo")[0] == "Resposta nova."
+    assert cache.evictions == 0
+
+    cache.add(["reuniao", "diretoria", "remarcada", "semana", "proxima"], "Produtivo", "Combinado.")
+
+    assert cache.evictions == 1
+    assert cache.lookup(WORDS, "Produtivo")[0] is None
+
+
+def test_empty_email_is_ignored():
+    cache = ReplyCache()
+    cache.add([], "Produtivo", REPLY)
+
+    assert cache.lookup([], "Produtivo") == (None, None)
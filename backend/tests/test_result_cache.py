@@ -0,0 +1,119 @@
+# tests/test_result_cache.py
+import asyncio
+
+from app import result_cache
+from app.result_cache import MemoryCacheBackend, ResultCache, SQLiteCacheBackend
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_make_key_depends_on_text_model_and_prompt_version():
+    key = ResultCache.make_key("texto normalizado", "gemini-2.5-flash", "5.1-duas_chamadas")
+
+    assert key == ResultCache.make_key("texto normalizado", "gemini-2.5-flash", "5.1-duas_chamadas")
+    assert key != ResultCache.make_key("outro texto", "gemini-2.5-flash", "5.1-duas_chamadas")
+    assert key != ResultCache.make_key("texto normalizado", "gemini-2.0-flash", "5.1-duas_chamadas")
+    # Nova versão do prompt (ou outro modo) invalida as entradas antigas
+    assert key != ResultCache.make_key("texto normalizado", "gemini-2.5-flash", "5.2-duas_chamadas")
+    assert key != ResultCache.make_key("texto normalizado", "gemini-2.5-flash", "5.1-combinado")
+
+
+def test_make_key_separates_fields():
+    assert ResultCache.make_key("b", "a", "") != ResultCache.make_key("", "a", "b")
+
+
+def test_memory_backend_expires_entries(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(result_cache.time, "time", clock)
+    backend = MemoryCacheBackend(max_entries=10, ttl_seconds=60)
+
+    backend.set("k", {"categoria": "Produtivo"})
+    clock.now += 59
+    assert backend.get("k") == {"categoria": "Produtivo"}
+    clock.now += 2
+    assert backend.get("k") is None
+    assert backend.expirations == 1
+    assert backend.size() == 0
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryCacheBackend(max_entries=2, ttl_seconds=60)
+    backend.set("a", {"v": 1})
+    backend.set("b", {"v": 2})
+    backend.get("a")
+    backend.set("c", {"v": 3})
+
+    assert backend.get("b") is None
+    assert backend.get("a") == {"v": 1}
+    assert backend.get("c") == {"v": 3}
+    assert backend.evictions == 1
+
+
+def test_sqlite_backend_round_trip_expiry_and_eviction(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(result_cache.time, "time", clock)
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_entries=2, ttl_seconds=60)
+
+    backend.set("a", {"resposta": "olá"})
+    clock.now += 1
+    backend.set("b", {"resposta": "oi"})
+    clock.now += 1
+    assert backend.get("a") == {"resposta": "olá"}
+    clock.now += 1
+    backend.set("c", {"resposta": "ok"})
+    assert backend.get("b") is None
+    assert backend.evictions == 1
+    assert backend.size() == 2
+
+    clock.now += 61
+    assert backend.get("a") is None
+    assert backend.expirations >= 1
+
+
+def test_sqlite_backend_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SQLiteCacheBackend(path, max_entries=10, ttl_seconds=60).set("k", {"v": 1})
+
+    assert SQLiteCacheBackend(path, max_entries=10, ttl_seconds=60).get("k") == {"v": 1}
+
+
+def test_result_cache_counts_hits_and_misses():
+    cache = ResultCache(MemoryCacheBackend(max_entries=10, ttl_seconds=60))
+    cache.set("k", {"v": 1})
+
+    assert cache.get("k") == {"v": 1}
+    assert cache.get("outra") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_result_cache_survives_backend_errors():
+    class BrokenBackend(MemoryCacheBackend):
+        def get(self, key):
+            raise OSError("disco cheio")
+
+        def set(self, key, value):
+            raise OSError("disco cheio")
+
+    cache = ResultCache(BrokenBackend(max_entries=10, ttl_seconds=60))
+    cache.set("k", {"v": 1})
+
+    assert cache.get("k") is None
+    assert cache.misses == 1
+
+
+def test_async_access_with_sqlite_backend(tmp_path):
+    cache = ResultCache(SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), 10, 60), "sqlite")
+
+    async def scenario():
+        await cache.set_async("k", {"v": 1})
+        return await cache.get_async("k"), await cache.get_async("outra")
+
+    assert asyncio.run(scenario()) == ({"v": 1}, None)
+    assert (cache.hits, cache.misses) == (1, 1)
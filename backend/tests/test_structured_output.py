@@ -0,0 +1,112 @@
+# tests/test_structured_output.py
+from app.structured_output import (
+    PARSE_DIRECT, PARSE_FAILED, PARSE_PARTIAL, PARSE_TOLERANT, JsonStreamParser, parse_json_output,
+    required_fields, valid_classification
+)
+
+
+def test_plain_json_is_direct():
+    value, mode = parse_json_output('{"categoria": "Produtivo", "confianca": 0.9}')
+
+    assert value == {"categoria": "Produtivo", "confianca": 0.9}
+    assert mode == PARSE_DIRECT
+
+
+def test_markdown_fence_and_comments_are_tolerated():
+    text = 'Segue a análise:\n```json\n{"categoria": "Improdutivo", "justificativa": "agradecimento {ok}"}\n```\nFim.'
+
+    value, mode = parse_json_output(text)
+
+    assert value == {"categoria": "Improdutivo", "justificativa": "agradecimento {ok}"}
+    assert mode == PARSE_TOLERANT
+
+
+def test_trailing_commas_are_tolerated():
+    value, mode = parse_json_output('```\n{"categoria": "Produtivo", "confianca": 0.8,}\n```')
+
+    assert value == {"categoria": "Produtivo", "confianca": 0.8}
+    assert mode == PARSE_TOLERANT
+
+
+def test_wrong_top_level_type_is_not_direct():
+    value, mode = parse_json_output('[{"id": 1}]', opener="{")
+
+    assert value == {"id": 1}
+    assert mode == PARSE_TOLERANT
+
+
+def test_truncated_object_keeps_complete_fields():
+    value, mode = parse_json_output('{"categoria": "Produtivo", "confianca": 0.9, "justificativa": "Pedido de sta')
+
+    assert (value, mode) == ({"categoria": "Produtivo", "confianca": 0.9}, PARSE_PARTIAL)
+
+
+def test_truncated_object_missing_required_field_fails():
+    text = '{"categoria": "Produtivo", "confianca": 0.9, "justificativa": "Pedido de sta'
+
+    assert parse_json_output(text, required=("categoria", "confianca", "justificativa")) == (None, PARSE_FAILED)
+
+
+def test_truncated_object_with_required_fields_is_partial():
+    text = '{"categoria": "Produtivo", "confianca": 0.9, "justificativa": "pedido", "resposta_sugerida": "Olá, rec'
+
+    value, mode = parse_json_output(text, required=("categoria", "confianca", "justificativa"))
+
+    assert (value, mode) == ({"categoria": "Produtivo", "confianca": 0.9, "justificativa": "pedido"}, PARSE_PARTIAL)
+
+
+def test_truncated_object_drops_dangling_key():
+    value, mode = parse_json_output('{"categoria": "Produtivo", "confianca":')
+
+    assert (value, mode) == ({"categoria": "Produtivo"}, PARSE_PARTIAL)
+
+
+def test_truncated_array_keeps_complete_items():
+    text = '[{"id": 0, "categoria": "Produtivo"}, {"id": 1, "categoria": "Impro'
+
+    value, mode = parse_json_output(text, opener="[")
+
+    assert (value, mode) == ([{"id": 0, "categoria": "Produtivo"}], PARSE_PARTIAL)
+
+
+def test_truncated_array_with_trailing_comma():
+    text = '[{"id":0,"categoria":"Produtivo",}, {"id":1'
+
+    assert parse_json_output(text, opener="[") == ([{"id": 0, "categoria": "Produtivo"}], PARSE_PARTIAL)
+    assert parse_json_output(text, opener="[", required=("id", "justificativa")) == (None, PARSE_FAILED)
+
+
+def test_required_fields_from_schema():
+    schema = {"type": "array", "items": {"type": "object", "required": ["id", "categoria"]}}
+
+    assert required_fields(schema) == ("id", "categoria")
+    assert required_fields(schema["items"]) == ("id", "categoria")
+
+
+def test_unusable_output_fails():
+    assert parse_json_output("Não consegui classificar este email.") == (None, PARSE_FAILED)
+    assert parse_json_output('[{"id": 0, "categ', opener="[") == (None, PARSE_FAILED)
+
+
+def test_stream_parser_across_chunks():
+    parser = JsonStreamParser("{")
+    for chunk in ['Resposta: {"resposta_sugerida": "Olá', ', tudo bem? \\"ok\\" }', '"} e mais texto {}']:
+        parser.feed(chunk)
+
+    assert parser.done
+    assert parser.text() == '{"resposta_sugerida": "Olá, tudo bem? \\"ok\\" }"}'
+
+
+def test_stream_parser_drops_open_string():
+    parser = JsonStreamParser("{")
+    parser.feed('{"categoria": "Produtivo", "justificativa": "pedido')
+
+    assert not parser.done
+    assert parser.closed_text() == '{"categoria": "Produtivo"}'
+
+
+def test_valid_classification():
+    assert valid_classification({"categoria": "Produtivo"})
+    assert not valid_classification({"categoria": "Spam"})
+    assert not valid_classification({"categoria": "Produtivo", "resposta_sugerida": "  "}, with_reply=True)
+    assert valid_classification({"categoria": "Improdutivo", "resposta_sugerida": "Obrigado!"}, with_reply=True)
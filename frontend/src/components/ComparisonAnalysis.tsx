@@ -31,6 +31,11 @@ const ComparisonAnalysis: React.FC<ComparisonAnalysisProps> = ({
 }) => {
   const { nlp_resultado, gemini_resultado, concordancia } = analysis;
   
+  // Atalho NLP: não há resultado do Gemini para comparar
+  if (!gemini_resultado) {
+    return null;
+  }
+  
   // Função para obter cor baseada na categoria
   const getCategoryColor = (category: string): 'success' | 'warning' => {
     return category === 'Produtivo' ? 'success' : 'warning';
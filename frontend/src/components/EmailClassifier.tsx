@@ -321,7 +321,7 @@ const EmailClassifier: React.FC = () => {
                   size="small"
                   variant="outlined"
                 />
-                {result.detalhes.analise_comparativa && (
+                {result.detalhes.analise_comparativa?.gemini_resultado && (
                   <Chip
                     icon={<CompareIcon />}
                     label="Análise Comparativa Disponível"
@@ -335,7 +335,7 @@ const EmailClassifier: React.FC = () => {
           </Card>
 
           {/* Componente de Análise Comparativa */}
-          {result.detalhes.analise_comparativa && (
+          {result.detalhes.analise_comparativa?.gemini_resultado && (
             <ComparisonAnalysis
               analysis={result.detalhes.analise_comparativa}
               chosenMethod={result.metodo_usado as 'nlp' | 'gemini'}
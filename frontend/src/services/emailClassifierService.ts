@@ -1,7 +1,7 @@
 // Serviço para comunicação com a API de Classificação de Emails
 
 import axios from 'axios';
-import { EmailClassificationResponse, ApiError } from '../types';
+import { EmailClassificationResponse, ApiError, ClassificationStreamHandlers } from '../types';
 
 // Configuração base da API
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
@@ -76,6 +76,84 @@ export class EmailClassifierService {
     }
   }
 
+  // Classificar com eventos (SSE): classificação primeiro, resposta sugerida em trechos
+  static async classifyEmailStream(
+    input: { text?: string; file?: File },
+    handlers: ClassificationStreamHandlers = {}
+  ): Promise<EmailClassificationResponse> {
+    const formData = new FormData();
+    if (input.file) {
+      formData.append('file', input.file);
+    } else {
+      formData.append('text', (input.text || '').trim());
+    }
+
+    const response = await fetch(`${API_BASE_URL}/process_email/events`, {
+      method: 'POST',
+      body: formData,
+    });
+    if (!response.ok || !response.body) {
+      const body = await response.json().catch(() => ({}));
+      const apiError: ApiError = { message: body.detail || response.statusText, detail: response.statusText };
+      throw apiError;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let reply = '';
+    let result: EmailClassificationResponse | null = null;
+
+    const handleEvent = (event: string, data: any) => {
+      switch (event) {
+        case 'nlp':
+          handlers.onNlp?.(data);
+          break;
+        case 'classificacao':
+          handlers.onClassification?.(data);
+          break;
+        case 'resposta':
+          reply += data.texto;
+          handlers.onReply?.(reply);
+          break;
+        case 'resposta_reiniciada':
+          reply = '';
+          handlers.onReply?.(reply);
+          break;
+        case 'resultado':
+          result = data;
+          break;
+        case 'erro':
+          throw { message: data.detail || 'Erro ao processar email' } as ApiError;
+      }
+    };
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      // Eventos são separados por linha em branco
+      let separator = buffer.indexOf('\n\n');
+      while (separator !== -1) {
+        const block = buffer.slice(0, separator);
+        buffer = buffer.slice(separator + 2);
+        let event = 'message';
+        let data = '';
+        for (const line of block.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        }
+        if (data) handleEvent(event, JSON.parse(data));
+        separator = buffer.indexOf('\n\n');
+      }
+    }
+
+    if (!result) {
+      throw { message: 'Conexão encerrada antes do resultado' } as ApiError;
+    }
+    return result;
+  }
+
   // Verificar saúde da API
   static async checkHealth(): Promise<any> {
     try {
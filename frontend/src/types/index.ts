@@ -26,12 +26,13 @@ export interface GeminiResult {
 
 export interface ComparativeAnalysis {
   nlp_resultado: NLPResult;
-  gemini_resultado: GeminiResult;
+  gemini_resultado: GeminiResult | null;  // null quando o atalho NLP dispensou o Gemini
   concordancia: {
     concordam: boolean;
     status: string;
     metodo_escolhido: 'nlp' | 'gemini';
     criterio_decisao: string;
+    caminho?: 'gemini' | 'atalho_nlp';
   };
 }
 
@@ -49,6 +50,27 @@ export interface EmailClassificationResponse {
   };
 }
 
+// Eventos de POST /process_email/events (Server-Sent Events)
+export interface StreamClassification {
+  categoria: 'Produtivo' | 'Improdutivo';
+  confianca: number;
+  metodo_usado: string;
+  justificativa: string;
+}
+
+export interface StreamNLPResult {
+  categoria: 'Produtivo' | 'Improdutivo' | 'Incerto';
+  confianca: number;
+  raciocinio: string;
+}
+
+export interface ClassificationStreamHandlers {
+  onNlp?: (nlp: StreamNLPResult) => void;
+  onClassification?: (classificacao: StreamClassification) => void;
+  // Texto acumulado da resposta sugerida até o momento
+  onReply?: (respostaParcial: string) => void;
+}
+
 export interface ApiError {
   message: string;
   detail?: string;